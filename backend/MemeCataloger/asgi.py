@@ -3,6 +3,15 @@ ASGI config for MemeCataloger project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+In production, serve it with an ASGI server rather than runserver:
+
+    python manage.py run_asgi --workers 4
+
+(or, equivalently, ``uvicorn MemeCataloger.asgi:application --workers 4
+--lifespan off``).  Media, exports and ZIP downloads are then streamed
+by the event loop, so slow clients hold no worker thread while they
+download; see api.media.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
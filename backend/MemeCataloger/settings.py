@@ -46,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so it times the rest (see api.metrics)
+    'api.metrics.RequestMetricsMiddleware',
+    'api.query_watch.QueryWatchMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -54,10 +57,28 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.routing.PrimaryPinMiddleware',
 ]
 
 ROOT_URLCONF = 'MemeCataloger.urls'
 
+# Record the latency, queries and response size of each request, report
+# them in a Server-Timing header and serve the totals at /metrics
+# (see api.metrics); API_METRICS=0 turns this off
+
+API_METRICS = os.getenv('API_METRICS', '1') == '1'
+
+# In development and CI, watch the SQL of each request: warn of repeated
+# (N+1) and slow queries, and of views running more queries than their
+# budget in api.urls, or with QUERY_WATCH_STRICT, fail them (see
+# api.query_watch).  Always on, and strict, when testing.
+
+QUERY_WATCH = os.getenv('QUERY_WATCH', '') == '1' or 'test' in sys.argv
+QUERY_WATCH_STRICT = os.getenv('QUERY_WATCH_STRICT', '') == '1' \
+    or 'test' in sys.argv
+QUERY_WATCH_REPEATS = int(os.getenv('QUERY_WATCH_REPEATS', 5))
+QUERY_WATCH_SLOW_MS = float(os.getenv('QUERY_WATCH_SLOW_MS', 100))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -86,26 +107,104 @@ def get_secret(key, default):
             return f.read()
     return value
 
+# Connections are closed at the end of each request unless kept for
+# DB_CONN_MAX_AGE seconds, or taken from a pool shared by the threads
+# of each process (see api.db_pool) with DB_POOL=1.  Under ASGI, where
+# each request runs in a thread of its own, prefer the pool (with
+# DB_CONN_MAX_AGE left at 0) to connections kept per thread.
+
+DB_POOL = os.getenv('DB_POOL', '') == '1'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'api.backends.mysql' if DB_POOL else 'django.db.backends.mysql',
         'NAME': 'memecataloger',
         'USER': 'django',
         'PASSWORD': get_secret("DB_PW_FILE", "cannot obtain secret!"),
         'HOST': 'db',
-        'PORT': '3306'
+        'PORT': '3306',
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        # check kept connections before each request reuses them
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        # used by api.backends.mysql only
+        'POOL': {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'CHECK_AFTER': float(os.getenv('DB_POOL_CHECK_AFTER', 1)),
+            'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', 300)),
+            'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+        },
     }
 }
 
+# Read replicas of the database, as a comma-separated list of hosts in
+# DB_REPLICA_HOSTS; the read-only views read from these, and clients
+# are pinned to the primary for DB_REPLICA_PIN_SECONDS after changing
+# anything, so they never miss their own changes (see api.routing).
+# Set the pin above the replication lag.
+
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    host for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host
+):
+    DATABASES[f'replica_{index + 1}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index + 1}')
+
+REPLICA_PIN_SECONDS = float(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+DATABASE_ROUTERS = ['api.routing.ReplicaRouter']
+
 # If testing, use an in-memory database,
 # as the default one will not be available.
 # Thanks StackOverflow user Sam Dolan for this suggestion!
 # https://stackoverflow.com/questions/4650509/different-db-for-testing-in-django
 if 'test' in sys.argv:
-    DATABASES['default'] = {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': 'mydatabase'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'mydatabase'
+        },
+        # a stand-in replica, only used by tests that ask for it
+        # (see api.tests.test_routing)
+        'replica': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': 'myreplica'
+        },
     }
+    DATABASE_REPLICAS = []
+
+
+# Caches; rendered list responses are kept here (see api.response_cache).
+# A process-local cache by default; point CACHE_BACKEND and CACHE_LOCATION
+# at a shared one (e.g. django.core.cache.backends.redis.RedisCache and
+# redis://cache:6379) to share cached responses between processes
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memecataloger'),
+    }
+}
+
+if 'test' in sys.argv:
+    # tests never depend on a shared cache being available
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'memecataloger-test',
+    }
+
+# Seconds a rendered list response is kept; entries are never served
+# once the catalog has changed, so this only bounds how long unused
+# ones take up space
+API_LIST_CACHE_TIMEOUT = int(os.getenv('API_LIST_CACHE_TIMEOUT', 300))
 
 
 # Password validation
@@ -149,6 +248,20 @@ STATIC_URL = 'static/'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Resized variants of images (see api.thumbnails), and the size in bytes
+# the cache of them may grow to before least recently used are evicted
+
+THUMBNAIL_CACHE_ROOT = os.path.join(MEDIA_ROOT, 'variants')
+THUMBNAIL_CACHE_MAX_BYTES = int(
+    os.getenv('THUMBNAIL_CACHE_MAX_BYTES', 1024 * 1024 * 1024)
+)
+
+# Use time-ordered primary keys for api models, stored in 16 bytes on
+# MySQL (see api.fields); run the convert_uuid_keys management command
+# on an existing database before changing this
+
+COMPACT_UUID_KEYS = os.getenv('COMPACT_UUID_KEYS', '') == '1'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
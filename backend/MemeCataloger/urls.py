@@ -18,8 +18,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from api.query_watch import query_budget
+from api.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('api.urls'))
+    path('api/', include('api.urls')),
+    # scraped by Prometheus; see api.metrics
+    path('metrics', query_budget(0)(metrics_view))
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
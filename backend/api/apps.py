@@ -7,3 +7,16 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # connect signal handlers, and register background job handlers
+        from . import signals, tasks  # noqa: F401
+
+        # count the queries of each request (see api.metrics), and in
+        # development and CI, check them (see api.query_watch)
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from . import metrics, query_watch
+        connection_created.connect(metrics.install_query_hook)
+        if settings.QUERY_WATCH:
+            connection_created.connect(query_watch.install_query_hook)
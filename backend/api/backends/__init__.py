@@ -0,0 +1,6 @@
+"""Database backends whose connections are pooled; see api.db_pool.
+
+Set a database's ENGINE to api.backends.mysql (or, for local use and
+tests, api.backends.sqlite3) in place of Django's own backend of the
+same name.
+"""
@@ -0,0 +1,13 @@
+"""Django's MySQL backend, with connections taken from a pool.
+See api.db_pool.
+"""
+
+from django.db.backends.mysql import base
+from api.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    @staticmethod
+    def check_raw(connection) -> None:
+        # a round trip without running a statement
+        connection.ping()
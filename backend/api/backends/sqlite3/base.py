@@ -0,0 +1,13 @@
+"""Django's SQLite backend, with connections taken from a pool.
+See api.db_pool.
+
+Meant for local use and tests: SQLite connections are cheap to open,
+and an in-memory database lives only as long as its connections.
+"""
+
+from django.db.backends.sqlite3 import base
+from api.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,72 @@
+"""Conditional GET support for API-delivered lists.
+Used by api.views.
+
+Functions
+---------
+
+owner_from_request
+    Reads the optional "owner" query parameter of a request.
+
+condition_on_catalog
+    Decorates a list view so that its responses carry validators
+    (a weak ETag and Last-Modified) derived from the catalog revision,
+    and requests presenting current validators get a 304 response
+    before the view runs.  Other responses are served from the
+    response cache where possible (see api.response_cache).
+"""
+
+from functools import wraps
+from uuid import UUID
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from . import response_cache, revisions
+
+
+def owner_from_request(request) -> UUID | None:
+    """Returns the UUID given in the "owner" query parameter, if any.
+    Raises ValueError if the parameter is present but not a UUID.
+    """
+
+    owner: str | None = request.GET.get('owner')
+    return UUID(owner) if owner else None
+
+
+def condition_on_catalog(view_method):
+    """Decorates the get method of a list view with conditional GET.
+    The validators describe the catalog of the owner given by the
+    request's "owner" query parameter, or all catalogs without one.
+    Full responses are cached per revision of that catalog.
+    """
+
+    @wraps(view_method)
+    def inner(self, request, *args, **kwargs):
+        try:
+            owner_id: UUID | None = owner_from_request(request)
+        except ValueError:
+            # let the view itself reject the request
+            return view_method(self, request, *args, **kwargs)
+
+        token, modified = revisions.current(owner_id)
+        etag: str = f'W/"{token}"'
+        last_modified: int | None = \
+            int(modified.timestamp()) if modified else None
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = response_cache.fetch(request, token)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+            response_cache.store(request, token, response)
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            if last_modified is not None:
+                response.headers['Last-Modified'] = http_date(last_modified)
+            # clients may keep a copy, but must check it is still current
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    return inner
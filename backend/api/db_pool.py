@@ -0,0 +1,347 @@
+"""A pool of database connections, shared by the threads of a process.
+Used by the pooled database backends in api.backends.
+
+Django opens a connection per thread, and (with CONN_MAX_AGE = 0)
+closes it at the end of each request; on MySQL, every request then
+pays for a TCP connection, authentication and session set-up before
+its first query.  With a pooled backend, "closing" a connection hands
+it back to the pool instead, and the next request (in any thread)
+takes it from there, its session already set up.
+
+The pool:
+
+ - holds at most MAX_SIZE connections, idle or in use; a thread asking
+   for one when all are in use waits up to TIMEOUT seconds for one to
+   be handed back, then fails with PoolTimeout;
+ - checks a connection that has been idle for over CHECK_AFTER seconds
+   before handing it out, and replaces it if the check fails (say the
+   server timed it out, or restarted);
+ - closes connections idle for over MAX_IDLE seconds, or open for over
+   MAX_LIFETIME seconds, as it is next used;
+ - only takes back connections in a clean state (autocommit on, outside
+   any transaction, no errors since the last query); others are closed.
+
+Connections are never shared between processes: a process forked from
+one holding a pool starts with an empty pool of its own (and leaves the
+parent's connections alone).
+
+Settings are read from the POOL entry of the database's settings; see
+MemeCataloger.settings.
+
+Classes
+-------
+
+PoolTimeout
+    Raised when no connection becomes free in time.
+    Extends django.db.utils.OperationalError.
+
+ConnectionPool
+    A bounded pool of connections, checked before reuse.
+
+PooledDatabaseWrapperMixin
+    Makes a database backend take connections from a pool.
+
+Functions
+---------
+
+pool_for
+    Returns the (process-wide) pool of a database alias.
+
+discard_pool
+    Closes the idle connections of a database alias, and forgets its pool.
+"""
+
+import os
+import threading
+import time
+from django.db.utils import OperationalError
+
+# Defaults for the POOL settings of a database
+DEFAULT_MAX_SIZE: int = 10
+DEFAULT_TIMEOUT: float = 10.0
+DEFAULT_CHECK_AFTER: float = 1.0
+DEFAULT_MAX_IDLE: float = 300.0
+DEFAULT_MAX_LIFETIME: float = 3600.0
+
+_pools_lock = threading.Lock()
+_pools: dict = {}
+
+
+class PoolTimeout(OperationalError):
+    """Raised when no connection becomes free in time."""
+
+
+class _Entry:
+    """A connection of a pool, with when it was opened and last used."""
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.opened: float = time.monotonic()
+        self.last_used: float = self.opened
+
+
+class ConnectionPool:
+    """A bounded pool of connections, checked before reuse.
+
+    Attributes
+    ----------
+    check: callable
+        Takes a connection and raises if it can no longer be used.
+    max_size: int
+        Greatest number of connections open at once.
+    timeout: float
+        Seconds to wait for a free connection when all are in use.
+    check_after: float
+        Seconds a connection may be idle before it is checked.
+    max_idle: float
+        Seconds a connection may be idle before it is closed.
+    max_lifetime: float
+        Seconds a connection may be open before it is closed.
+    """
+
+    def __init__(
+        self,
+        check,
+        max_size: int = DEFAULT_MAX_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        check_after: float = DEFAULT_CHECK_AFTER,
+        max_idle: float = DEFAULT_MAX_IDLE,
+        max_lifetime: float = DEFAULT_MAX_LIFETIME
+    ) -> None:
+        self.check = check
+        self.max_size: int = max_size
+        self.timeout: float = timeout
+        self.check_after: float = check_after
+        self.max_idle: float = max_idle
+        self.max_lifetime: float = max_lifetime
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid: int = os.getpid()
+        self._idle: list = []  # least recently used first
+        self._in_use: dict = {}  # by id() of the connection
+        self._size: int = 0
+
+    def _check_process(self) -> None:
+        # connections inherited over a fork belong to the parent, whose
+        # sessions closing them would end; they are dropped instead
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.last_used > self.max_idle \
+            or now - entry.opened > self.max_lifetime
+
+    def _reap(self, now: float) -> list:
+        """Takes expired connections out of the pool (to be closed)."""
+
+        expired: list = [
+            entry for entry in self._idle if self._expired(entry, now)
+        ]
+        if expired:
+            self._idle = [entry for entry in self._idle if entry not in expired]
+            self._size -= len(expired)
+            self._condition.notify(len(expired))
+        return expired
+
+    @staticmethod
+    def _close(entries: list) -> None:
+        for entry in entries:
+            try:
+                entry.connection.close()
+            except Exception:
+                pass  # gone already
+
+    def _take(self, deadline: float) -> _Entry | None:
+        """Returns an idle connection, or None having made room for a
+        new one; waits until deadline if neither can be had.
+        """
+
+        with self._condition:
+            while True:
+                self._check_process()
+                expired: list = self._reap(time.monotonic())
+                if expired:
+                    self._close(expired)
+                if self._idle:
+                    return self._idle.pop()  # the most recently used
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+                remaining: float = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No database connection became free within "
+                        f"{self.timeout}s ({self.max_size} in use)."
+                    )
+                self._condition.wait(remaining)
+
+    def _give_up(self, entry: _Entry | None) -> None:
+        """Frees the room of a connection that was closed or never opened."""
+
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        if entry is not None:
+            self._close([entry])
+
+    def acquire(self, connect) -> tuple:
+        """Returns (connection, fresh): an idle connection that passes its
+        check, or (if there is none, and room for another) a new one
+        made by calling connect.  fresh tells which.  Raises PoolTimeout
+        if none becomes free within the timeout.
+        """
+
+        deadline: float = time.monotonic() + self.timeout
+        while True:
+            entry: _Entry | None = self._take(deadline)
+            if entry is None:
+                try:
+                    entry = _Entry(connect())
+                except BaseException:
+                    self._give_up(None)
+                    raise
+                fresh: bool = True
+            else:
+                fresh = False
+                if time.monotonic() - entry.last_used > self.check_after:
+                    try:
+                        self.check(entry.connection)
+                    except Exception:
+                        self._give_up(entry)
+                        continue
+            with self._condition:
+                self._in_use[id(entry.connection)] = entry
+            return entry.connection, fresh
+
+    def release(self, connection, reusable: bool = True) -> None:
+        """Hands a connection back to the pool; closes it instead if it is
+        not reusable, has expired, or was not taken from this pool.
+        """
+
+        with self._condition:
+            self._check_process()
+            entry: _Entry | None = self._in_use.pop(id(connection), None)
+            to_close: list = []
+            if entry is None:
+                to_close.append(_Entry(connection))
+            else:
+                now: float = time.monotonic()
+                entry.last_used = now
+                if reusable and not self._expired(entry, now):
+                    self._idle.append(entry)
+                    self._condition.notify()
+                else:
+                    self._size -= 1
+                    self._condition.notify()
+                    to_close.append(entry)
+                to_close += self._reap(now)
+        self._close(to_close)
+
+    def close_idle(self) -> None:
+        """Closes every idle connection."""
+
+        with self._condition:
+            self._check_process()
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._condition.notify(len(idle))
+        self._close(idle)
+
+    def stats(self) -> dict:
+        """Returns the numbers of connections open, idle and in use."""
+
+        with self._condition:
+            self._check_process()
+            return {
+                'open': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use)
+            }
+
+
+def pool_for(alias: str, settings: dict, check) -> ConnectionPool:
+    """Returns the pool of the database alias, made on first use from
+    settings (the POOL entry of the database's settings).
+    """
+
+    with _pools_lock:
+        pool: ConnectionPool | None = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                check,
+                max_size=int(settings.get('MAX_SIZE', DEFAULT_MAX_SIZE)),
+                timeout=float(settings.get('TIMEOUT', DEFAULT_TIMEOUT)),
+                check_after=float(
+                    settings.get('CHECK_AFTER', DEFAULT_CHECK_AFTER)
+                ),
+                max_idle=float(settings.get('MAX_IDLE', DEFAULT_MAX_IDLE)),
+                max_lifetime=float(
+                    settings.get('MAX_LIFETIME', DEFAULT_MAX_LIFETIME)
+                )
+            )
+        return pool
+
+
+def discard_pool(alias: str) -> None:
+    """Closes the idle connections of the pool of the database alias, if
+    it has one, and forgets the pool; connections in use are closed as
+    they are handed back.
+    """
+
+    with _pools_lock:
+        pool: ConnectionPool | None = _pools.pop(alias, None)
+    if pool is not None:
+        pool.close_idle()
+
+
+class PooledDatabaseWrapperMixin:
+    """Makes a database backend take connections from a pool.
+    Mixed into the DatabaseWrapper of each backend in api.backends.
+
+    Opening a connection takes one from the pool of the database's
+    alias, and closing it hands it back; connections taken from the
+    pool keep the session state they were set up with, so are not set
+    up again.
+    """
+
+    _reused_connection: bool = False
+
+    def pool(self) -> ConnectionPool:
+        return pool_for(
+            self.alias, self.settings_dict.get('POOL') or {}, self.check_raw
+        )
+
+    @staticmethod
+    def check_raw(connection) -> None:
+        """Raises if a connection (as made by the driver) is unusable."""
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def get_new_connection(self, conn_params):
+        connection, fresh = self.pool().acquire(
+            lambda: super(PooledDatabaseWrapperMixin, self)
+            .get_new_connection(conn_params)
+        )
+        self._reused_connection = not fresh
+        return connection
+
+    def init_connection_state(self) -> None:
+        if not self._reused_connection:
+            super().init_connection_state()
+
+    def _close(self) -> None:
+        if self.connection is None:
+            return
+        # only connections in autocommit mode, outside any transaction,
+        # are left as a new one would be
+        reusable: bool = not self.in_atomic_block \
+            and not self.errors_occurred \
+            and self.autocommit == self.settings_dict['AUTOCOMMIT']
+        with self.wrap_database_errors:
+            self.pool().release(self.connection, reusable)
@@ -0,0 +1,142 @@
+"""Streams catalogs as newline-delimited JSON (NDJSON).
+Used by api.views (see export_view) and the export_catalog management
+command.
+
+An export is one JSON object per line, each naming the kind of record
+and holding its data as the list endpoints would present it:
+
+{"type":"user","data":{"id":...,"username":...}}
+{"type":"tag","data":{...}}
+{"type":"image","data":{...}}
+{"type":"image-tag","data":{...}}
+
+Users come first, then Tags and Images, then the ImageTags between
+them, so that every record only refers to ones before it.
+
+Rows are read in batches ordered by primary key, each batch starting
+after the last key of the one before, and are written out as they are
+read; memory use does not grow with the size of the catalog.  (A plain
+QuerySet.iterator would not do on MySQL, whose driver reads the whole
+result set into memory before returning the first row.)
+
+Each batch is a query of its own, outside any transaction: a streamed
+export can take as long as the client takes to read it, and a
+transaction held open that long would hold back purging on MySQL (and
+vacuuming on PostgreSQL) for all of it.  The export is therefore not
+a snapshot.  Rows changed while it runs may be exported as they were
+or as they are, and rows added or deleted may be left out; in
+particular, an ImageTag added meanwhile may refer to a Tag or Image
+read before it existed, which import_catalog reports as missing and
+skips.  Export a catalog while it is not being changed, for an exact
+copy.
+
+Functions
+---------
+
+export_records
+    Yields the records of a catalog, as dicts.
+
+ndjson_chunks
+    Yields records as NDJSON text, in chunks of bytes.
+
+gzip_chunks
+    Compresses a stream of chunks of bytes as they are produced.
+"""
+
+import zlib
+from uuid import UUID
+from rest_framework.utils.encoders import JSONEncoder
+from .fast_serialization import row_converter
+from .serializers import AppUserSerializer, ImageSerializer
+from .serializers import ImageTagSerializer, TagSerializer
+
+# Formats an export can be made in
+EXPORT_FORMATS: tuple = ('ndjson',)
+
+# Rows read from the database per query
+CHUNK_SIZE: int = 2000
+
+# Bytes of NDJSON gathered before a chunk is passed on
+OUTPUT_CHUNK_BYTES: int = 64 * 1024
+
+# Record types, with the serializer presenting each and the lookup from
+# its model to the owning AppUser; in the order they are exported
+RECORD_TYPES: tuple = (
+    ('user', AppUserSerializer, 'id'),
+    ('tag', TagSerializer, 'owner'),
+    ('image', ImageSerializer, 'owner'),
+    ('image-tag', ImageTagSerializer, 'tag__owner')
+)
+
+
+def _batches(queryset, columns: list):
+    """Yields lists of values_list rows of columns from queryset, in
+    primary key order, reading CHUNK_SIZE rows per query.
+    """
+
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows: list = list(batch.values_list('pk', *columns)[:CHUNK_SIZE])
+        if rows:
+            yield [row[1:] for row in rows]
+        if len(rows) < CHUNK_SIZE:
+            return
+        last_pk = rows[-1][0]
+
+
+def export_records(owner_id: UUID | None = None, request=None):
+    """Yields the records of the catalog of the given owner (or of every
+    catalog, without one) as dicts of "type" and "data".  With a
+    request, file URLs are absolute, as in API responses.
+    """
+
+    for record_type, serializer_class, owner_field in RECORD_TYPES:
+        queryset = serializer_class.Meta.model.objects.all()
+        if owner_id is not None:
+            queryset = queryset.filter(**{owner_field: owner_id})
+        columns, convert = row_converter(
+            serializer_class, request, read_raw=True
+        )
+        for batch in _batches(queryset, columns):
+            for data in convert(batch):
+                yield {'type': record_type, 'data': data}
+
+
+def ndjson_chunks(records):
+    """Yields records as NDJSON, encoded as the API encodes JSON, in
+    chunks of about OUTPUT_CHUNK_BYTES bytes.
+    """
+
+    encoder = JSONEncoder(
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(',', ':')
+    )
+    lines: list = []
+    size: int = 0
+    for record in records:
+        text: str = encoder.encode(record) \
+            .replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+        line: bytes = (text + '\n').encode()
+        lines.append(line)
+        size += len(line)
+        if size >= OUTPUT_CHUNK_BYTES:
+            yield b''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b''.join(lines)
+
+
+def gzip_chunks(chunks):
+    """Yields the gzip compression of a stream of chunks of bytes,
+    compressing each chunk as it arrives.
+    """
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed: bytes = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,200 @@
+"""Read-only fast path for serializing catalog lists.
+Used by api.views (see CatalogListMixin) and the benchmark_serialization
+management command.
+
+A ModelSerializer builds a model instance per row, then runs each of
+its fields' to_representation on it.  On long lists that dominates the
+time spent answering the request.  For serializers made only of plain
+model fields, the same data can be read with values_list and converted
+column by column instead; the result is then rendered by the same
+JSONRenderer as before, so the response is byte-for-byte the same.
+
+Serializers with anything else (method fields, nested serializers,
+custom field formats) are not handled here, and the caller falls back
+to the serializer itself.
+
+Functions
+---------
+
+row_converter
+    Returns the columns to read for a serializer, and a function making
+    its representation from rows of them; None if it is not supported.
+"""
+
+import re
+from uuid import UUID
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Serializer fields whose representation of a (non-null) database value
+# is the value itself
+_IDENTITY_FIELDS: tuple = (serializers.CharField, serializers.IntegerField)
+
+# File names that storage URLs and absolute URIs carry over unchanged
+# (no characters to quote, no "." or ".." segments), so that their URL
+# is that of any other such name with the name itself swapped in
+_PLAIN_NAME = re.compile(
+    r'[A-Za-z0-9_-][A-Za-z0-9_.-]*(/[A-Za-z0-9_-][A-Za-z0-9_.-]*)*'
+)
+
+
+def _uuid_text(value) -> str:
+    """Spells a UUID as str(UUID) does, given it as a UUID, or as stored
+    in the database: 32 hexadecimal digits, or 16 bytes.
+    """
+
+    if isinstance(value, str) and len(value) == 32:
+        value = value.lower()
+        return f'{value[:8]}-{value[8:12]}-{value[12:16]}-' \
+            f'{value[16:20]}-{value[20:]}'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return str(UUID(bytes=bytes(value)))
+    return str(value if isinstance(value, UUID) else UUID(value))
+
+
+def _datetime_converter(field):
+    """Returns a function representing datetimes as field would, or None
+    if field is set up in a way not handled here.
+    """
+
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return None
+    field_timezone = field.timezone if hasattr(field, 'timezone') \
+        else field.default_timezone()
+    if field_timezone is None:
+        return None
+
+    def convert(value):
+        # as DateTimeField.to_representation, for aware datetimes
+        text: str = value.astimezone(field_timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+    return convert
+
+
+def _file_converter(field, model_field, request):
+    """Returns a function representing stored file names as field
+    would, or None if field is set up in a way not handled here.
+    """
+
+    if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+        return None
+    storage = model_field.storage
+
+    def url_of(name: str) -> str:
+        # as FileField.to_representation, given the name of the file
+        url: str = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    # joining and quoting URLs per row is slow; plain names are instead
+    # appended to the URL prefix shared by all of them
+    prefix: str | None = None
+    if type(storage).url is FileSystemStorage.url:
+        probe: str = url_of('a')
+        if probe.endswith('/a'):
+            prefix = probe[:-1]
+
+    def convert(name: str):
+        if not name:
+            return None
+        if prefix is not None and _PLAIN_NAME.fullmatch(name):
+            return prefix + name
+        return url_of(name)
+
+    return convert
+
+
+def _field_converter(field, model_field, request):
+    """Returns (converter, supported) for one serializer field; converter
+    is None where values are represented as they are.
+    """
+
+    field_type = type(field)
+    if field_type is serializers.PrimaryKeyRelatedField:
+        if field.pk_field is not None:
+            return None, False
+        if isinstance(model_field.target_field, models.UUIDField):
+            return _uuid_text, True
+        return None, True
+    if field_type in _IDENTITY_FIELDS:
+        return None, True
+    if field_type is serializers.UUIDField:
+        return _uuid_text, field.uuid_format == 'hex_verbose'
+    if field_type is serializers.DateTimeField:
+        converter = _datetime_converter(field)
+        return converter, converter is not None
+    if field_type in (serializers.FileField, serializers.ImageField):
+        converter = _file_converter(field, model_field, request)
+        return converter, converter is not None
+    return None, False
+
+
+def row_converter(
+    serializer_class,
+    request=None,
+    read_raw: bool = False
+) -> tuple | None:
+    """Returns (columns, convert) for serializing the model of
+    serializer_class from values_list rows: columns are the attribute
+    names (or expressions) to read, in order, and convert(rows) returns
+    the list a serializer would, given rows of those columns.  Returns
+    None if any field of the serializer cannot be handled this way.
+
+    With read_raw, UUIDs are read as the database stores them, sparing
+    a UUID object per value only to be turned back into text.  Rows
+    are then no use to anything else expecting model values (such as a
+    paginator reading their sort key).
+    """
+
+    serializer = serializer_class(context={'request': request})
+    opts = serializer.Meta.model._meta
+    names: list = []
+    columns: list = []
+    converters: list = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        converter, supported = _field_converter(field, model_field, request)
+        if not supported:
+            return None
+        names.append(field.field_name)
+        if read_raw and converter is _uuid_text:
+            columns.append(ExpressionWrapper(
+                F(model_field.attname), output_field=models.TextField()
+            ))
+        else:
+            columns.append(model_field.attname)
+        converters.append(converter)
+
+    # the columns needing no conversion are copied as they are
+    converted: list = [
+        (position, converter)
+        for position, converter in enumerate(converters)
+        if converter is not None
+    ]
+
+    def convert(rows) -> list:
+        data: list = []
+        for row in rows:
+            values: list = list(row)
+            for position, converter in converted:
+                value = values[position]
+                if value is not None:
+                    values[position] = converter(value)
+            data.append(dict(zip(names, values)))
+        return data
+
+    return columns, convert
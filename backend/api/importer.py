@@ -0,0 +1,141 @@
+"""Reads catalogs and media files for bulk import.
+Used by the import_catalog management command.
+
+Catalogs are read as written by api.export.  Media files, whether
+found by walking a directory or referred to by a catalog, are hashed,
+probed and copied into content-addressed storage by ingest_file, which
+is meant to be run in a pool of worker processes: it does not touch
+the database, and takes and returns only picklable values.
+
+Functions
+---------
+
+read_records
+    Yields the records of an NDJSON catalog, with their line numbers.
+
+media_files
+    Yields the paths of the files under a directory, in a stable order.
+
+source_name
+    Returns the storage name behind the file URL of an exported Image.
+
+ingest_file
+    Probes a media file and stores it; for worker processes.
+
+prepare_record
+    Ingests the media file of a catalog record; for worker processes.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from urllib.parse import unquote, urlsplit
+from django.conf import settings
+from PIL import Image as PillowImage
+from .media import probe_file
+from .models import Image
+
+# MIME types (by prefix) of the files imported from media directories
+MEDIA_TYPES: tuple = ('image/', 'video/')
+
+# Leading bytes of a gzip file
+GZIP_MAGIC: bytes = b'\x1f\x8b'
+
+
+def read_records(path: str, start: int = 0):
+    """Yields (line number, record) for each record of the NDJSON
+    catalog at path, which may be gzipped, after the first start lines.
+    Line numbers count from 1.  Raises ValueError for malformed lines.
+    """
+
+    with open(path, 'rb') as file:
+        compressed: bool = file.read(len(GZIP_MAGIC)) == GZIP_MAGIC
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt', encoding='utf-8') as lines:
+        for number, line in enumerate(lines, 1):
+            if number <= start or not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                raise ValueError(f"{path}, line {number}: not valid JSON.")
+
+
+def media_files(root: str, start: int = 0):
+    """Yields the paths of the files under the directory root, sorted
+    by directory and then name, leaving out hidden files and the first
+    start files.
+    """
+
+    count: int = 0
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories[:] = sorted(
+            name for name in subdirectories if not name.startswith('.')
+        )
+        for name in sorted(names):
+            if name.startswith('.'):
+                continue
+            count += 1
+            if count > start:
+                yield os.path.join(directory, name)
+
+
+def source_name(url: str | None) -> str | None:
+    """Returns the storage name of the file behind the (absolute or
+    site-relative) URL of an exported Image, or None if the URL is not
+    under MEDIA_URL.
+    """
+
+    if not url:
+        return None
+    path: str = urlsplit(url).path
+    prefix: str = urlsplit(settings.MEDIA_URL).path
+    if not path.startswith(prefix):
+        return None
+    return unquote(path[len(prefix):])
+
+
+def ingest_file(path: str) -> dict | None:
+    """Probes the media file at path (see api.media.probe_file) and
+    stores it in the storage of Image.source.  Returns its metadata,
+    with its storage name as "source", its modification time as
+    "modified" and path as "path"; or {"path", "error"} if it could not
+    be read.  Returns None for files that are not images or videos.
+    """
+
+    try:
+        metadata: dict = probe_file(path)
+        if not metadata['mime_type'].startswith(MEDIA_TYPES):
+            return None
+        storage = Image._meta.get_field('source').storage
+        metadata['source'] = storage.store_file(path, metadata['sha256'])
+        metadata['modified'] = datetime.fromtimestamp(
+            os.stat(path).st_mtime, tz=timezone.utc
+        )
+    except (OSError, ValueError, PillowImage.DecompressionBombError) as error:
+        return {'path': path, 'error': str(error) or type(error).__name__}
+    metadata['path'] = path
+    return metadata
+
+
+def prepare_record(item: tuple, media_root: str) -> tuple:
+    """Takes (line number, record) from a catalog; for Image records,
+    ingests the file their source refers to under media_root, and adds
+    the result to the record as "file".  Returns (line number, record).
+    """
+
+    number, record = item
+    if record.get('type') == 'image' and isinstance(record.get('data'), dict):
+        name: str | None = source_name(record['data'].get('source'))
+        path: str | None = None
+        if name is not None:
+            path = os.path.realpath(os.path.join(media_root, name))
+            if not path.startswith(os.path.realpath(media_root) + os.sep):
+                path = None  # not under media_root
+        if path is None or not os.path.isfile(path):
+            record['file'] = {'path': path, 'error': "File not found."}
+        else:
+            record['file'] = ingest_file(path) \
+                or {'path': path, 'error': "Not an image or video."}
+    return number, record
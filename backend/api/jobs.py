@@ -0,0 +1,198 @@
+"""A small, database-backed job queue for background work.
+See api.models.Job for details of a job.
+
+Work is queued with enqueue, naming a handler registered with the
+handler decorator (see api.tasks for the handlers themselves).  Worker
+processes, started by the run_workers management command, claim queued
+jobs and run them.  Jobs that raise are retried with exponential
+backoff, up to MAX_ATTEMPTS times.
+
+Jobs are claimed with a compare-and-set update, so any number of
+workers may share the queue without a job being run twice at once.
+A job whose worker died mid-run is claimed again once LEASE has passed.
+
+Functions
+---------
+
+handler
+    Decorator registering a function as the handler of a kind of job.
+
+enqueue
+    Queues a job, unless one with the same key already exists.
+
+claim_next
+    Claims the next job that is due, on behalf of a worker.
+
+run_job
+    Runs a claimed job, recording its success or scheduling a retry.
+
+run_pending
+    Claims and runs due jobs until there are none left.
+
+work
+    Runs due jobs as they arrive, until asked to stop.
+"""
+
+import json
+import os
+import random
+import socket
+import traceback
+from collections.abc import Callable
+from datetime import timedelta
+from django.db import close_old_connections
+from django.utils import timezone
+from .models import Job
+
+# Times a job is attempted before it is marked as failed
+MAX_ATTEMPTS: int = 5
+
+# Delay before the first retry; doubled for each retry after
+RETRY_BASE_DELAY = timedelta(seconds=10)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+# How long a running job may go before its worker is presumed dead
+LEASE = timedelta(minutes=15)
+
+_handlers: dict = {}
+
+
+def handler(kind: str) -> Callable:
+    """Registers the decorated function as the handler of kind jobs.
+    The function is called with the payload of the job; it should be
+    idempotent, as a job may be retried after partially completing.
+    """
+
+    def register(function: Callable) -> Callable:
+        _handlers[kind] = function
+        return function
+
+    return register
+
+
+def enqueue(
+    kind: str,
+    payload: dict | None = None,
+    key: str | None = None,
+    run_after=None
+) -> Job:
+    """Queues a job of the given kind, unless one with the same key is
+    already queued (or has already run).  The key defaults to the kind
+    and payload together.  Returns the (new or existing) Job.
+    """
+
+    payload = payload or {}
+    if key is None:
+        key = f'{kind}:{json.dumps(payload, sort_keys=True)}'
+    job, _ = Job.objects.get_or_create(
+        key=key,
+        defaults={
+            'kind': kind,
+            'payload': payload,
+            'run_after': run_after or timezone.now()
+        }
+    )
+    return job
+
+
+def worker_name() -> str:
+    """Identifies the current process, for Job.locked_by."""
+
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next(worker: str) -> Job | None:
+    """Claims the next due job for worker; returns None if none are due.
+    Jobs are pending ones whose run_after has passed, or running ones
+    whose lease has expired.
+    """
+
+    now = timezone.now()
+    due = (
+        Job.objects.filter(status=Job.Status.PENDING, run_after__lte=now)
+        | Job.objects.filter(
+            status=Job.Status.RUNNING,
+            locked_at__lt=now - LEASE
+        )
+    )
+    for job in due.order_by('run_after')[:10]:
+        # only one worker can move the job on from the state it was
+        # read in; the rest update nothing, and try the next job
+        claimed: int = Job.objects.filter(
+            id=job.id,
+            status=job.status,
+            attempts=job.attempts
+        ).update(
+            status=Job.Status.RUNNING,
+            attempts=job.attempts + 1,
+            locked_by=worker,
+            locked_at=now
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Returns the delay before retrying a job that has been attempted
+    the given number of times: exponential, capped, and jittered so
+    that jobs failing together do not all retry together.
+    """
+
+    # compare the exponent rather than the delay, which could overflow
+    doublings: int = min(attempts - 1, 32)
+    delay = min(RETRY_BASE_DELAY * 2 ** doublings, RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def run_job(job: Job) -> bool:
+    """Runs a job claimed with claim_next; returns True if it succeeded.
+    On failure, the job is queued again after a delay (see retry_delay)
+    or, after MAX_ATTEMPTS, marked as failed.
+    """
+
+    try:
+        _handlers[job.kind](job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = Job.Status.FAILED
+        else:
+            job.status = Job.Status.PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+        succeeded = False
+    else:
+        job.status = Job.Status.DONE
+        job.last_error = ''
+        succeeded = True
+
+    job.locked_by = ''
+    job.save(update_fields=['status', 'run_after', 'last_error', 'locked_by'])
+    return succeeded
+
+
+def run_pending(worker: str | None = None) -> int:
+    """Claims and runs due jobs until there are none; returns how many
+    were run (whether or not they succeeded).
+    """
+
+    worker = worker or worker_name()
+    count: int = 0
+    while (job := claim_next(worker)) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+def work(stop, poll_interval: float = 1.0, worker: str | None = None) -> None:
+    """Runs due jobs as they arrive, until stop (a threading or
+    multiprocessing Event) is set.  Sleeps for poll_interval seconds
+    whenever the queue is empty.
+    """
+
+    worker = worker or worker_name()
+    while not stop.is_set():
+        close_old_connections()
+        if not run_pending(worker):
+            stop.wait(poll_interval)
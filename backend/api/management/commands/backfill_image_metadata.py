@@ -0,0 +1,113 @@
+"""Management command to store file metadata on existing Images.
+See api.media.probe_file for the metadata found.
+
+Files are read and probed in parallel by a pool of processes; results
+are written back to the database in batches.
+
+Usage: python manage.py backfill_image_metadata [--processes N]
+       [--batch-size N] [--all]
+"""
+
+import os
+from multiprocessing import Pool
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from api import revisions
+from api.media import probe_file
+from api.models import Image
+
+METADATA_FIELDS: list = [
+    'sha256', 'byte_size', 'mime_type', 'width', 'height', 'perceptual_hash'
+]
+
+
+def probe(task: tuple) -> tuple:
+    """Probes one file, in a pool process.
+    Takes and returns (image id, path, metadata or error message).
+    """
+
+    image_id, path = task
+    try:
+        return image_id, path, probe_file(path)
+    except OSError as error:
+        return image_id, path, str(error)
+
+
+class Command(BaseCommand):
+    help = "Finds and stores the content hash, size, MIME type, " \
+        "dimensions and perceptual hash of the media file of each Image."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of processes probing files (default: number of CPUs)."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Number of Images updated per database transaction."
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="Probe every Image, not just those missing metadata."
+        )
+
+    def handle(self, *args, **options):
+        images = Image.objects.order_by('id')
+        if not options['all']:
+            images = images.filter(
+                Q(sha256='') | Q(byte_size__isnull=True) | Q(mime_type='')
+                # images probed before perceptual hashes were stored
+                | Q(width__isnull=False, perceptual_hash__isnull=True)
+            )
+
+        updated: int = 0
+        failed: int = 0
+        last_id = None
+        with Pool(options['processes']) as pool:
+            while True:
+                # read the next batch by keyset, so that no cursor is
+                # held open while the previous batch is written
+                batch = images if last_id is None \
+                    else images.filter(id__gt=last_id)
+                tasks: list = [
+                    (image_id, Image(source=source).source.path)
+                    for image_id, source in
+                    batch.values_list('id', 'source')[:options['batch_size']]
+                ]
+                if not tasks:
+                    break
+                last_id = tasks[-1][0]
+
+                probed: list = []
+                for image_id, path, result in pool.imap_unordered(
+                    probe, tasks, chunksize=16
+                ):
+                    if isinstance(result, str):
+                        self.stderr.write(f"Skipped {path}: {result}")
+                        failed += 1
+                    else:
+                        probed.append(Image(id=image_id, **result))
+                updated += self.save_batch(probed)
+
+        self.stdout.write(f"Updated {updated} image(s); skipped {failed}.")
+
+    @staticmethod
+    def save_batch(batch: list) -> int:
+        if not batch:
+            return 0
+        with transaction.atomic():
+            Image.objects.bulk_update(batch, METADATA_FIELDS)
+            # bulk updates send no signals, so bump revisions here
+            owner_ids = set(
+                Image.objects.filter(id__in=[image.id for image in batch])
+                .values_list('owner_id', flat=True)
+            )
+            for owner_id in owner_ids:
+                revisions.bump(owner_id, hashes=True)
+        return len(batch)
@@ -0,0 +1,147 @@
+"""Management command to time requests with and without pooled connections.
+See api.db_pool for the pool.
+
+Runs --requests request cycles against the default database, as Django
+runs them (old connections are closed as a request starts and ends),
+each making one query: the catalog revision lookup behind conditional
+GETs.  Cycles are run in --threads threads at once, for each of three
+ways of handling connections:
+
+ - closed after each request (CONN_MAX_AGE = 0, Django's default);
+ - kept per thread between requests (CONN_MAX_AGE = None), checked
+   before reuse (CONN_HEALTH_CHECKS);
+ - taken from, and handed back to, a pool (api.backends).
+
+Mean, median and 99th percentile times per request are reported, with
+the number of connections each way opened.  With --connect-delay,
+opening a connection takes that many seconds longer, as a stand-in for
+the network round trips of a remote server (with SQLite, say).
+
+Usage: python manage.py benchmark_connections [--requests N]
+       [--threads N] [--connect-delay S]
+"""
+
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.utils import load_backend
+from api import db_pool
+from api.models import CatalogRevision
+
+# Pooled backends standing in for Django's own
+POOLED_ENGINES: dict = {
+    'django.db.backends.mysql': 'api.backends.mysql',
+    'django.db.backends.sqlite3': 'api.backends.sqlite3',
+}
+
+
+class Command(BaseCommand):
+    help = "Times requests with and without persistent or pooled connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help="Number of requests per way (default: 2000)."
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help="Threads making requests at once (default: 4)."
+        )
+        parser.add_argument(
+            '--connect-delay',
+            type=float,
+            default=0.0,
+            help="Seconds added to opening each connection (default: 0)."
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError("--requests and --threads must be at least 1.")
+        engine: str = connection.settings_dict['ENGINE']
+        pooled_engine: str = POOLED_ENGINES.get(engine, engine)
+        if pooled_engine not in POOLED_ENGINES.values():
+            raise CommandError(f"No pooled backend stands in for {engine}.")
+        self.options: dict = options
+
+        base_settings: dict = {**connection.settings_dict, 'ATOMIC_REQUESTS': False}
+        pool_settings: dict = {
+            **(base_settings.get('POOL') or {}),
+            'MAX_SIZE': options['threads']
+        }
+        ways: list = [
+            ("closed per request", engine, {'CONN_MAX_AGE': 0}),
+            ("kept per thread", engine, {
+                'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': True
+            }),
+            ("pooled", pooled_engine, {'CONN_MAX_AGE': 0, 'POOL': pool_settings}),
+        ]
+        for name, way_engine, overrides in ways:
+            times, opened = self.run(
+                way_engine,
+                {**base_settings, 'ENGINE': way_engine, **overrides},
+                f'benchmark-{name.replace(" ", "-")}'
+            )
+            times.sort()
+            self.stdout.write(
+                f"{name:<20} mean {statistics.mean(times) * 1000:7.3f}ms  "
+                f"median {statistics.median(times) * 1000:7.3f}ms  "
+                f"p99 {times[int(len(times) * 0.99) - 1] * 1000:7.3f}ms  "
+                f"{opened} connection(s) opened"
+            )
+
+    def run(self, engine: str, settings_dict: dict, alias: str) -> tuple:
+        """Runs the request cycles with connections of the given backend
+        and settings; returns the time of each, and the number of
+        connections opened.
+        """
+
+        backend = load_backend(engine)
+        opened: list = []
+        database = backend.DatabaseWrapper.Database  # the driver
+        connect = database.connect
+
+        def slow_connect(*args, **kwargs):
+            opened.append(True)
+            time.sleep(self.options['connect_delay'])
+            return connect(*args, **kwargs)
+
+        per_thread = threading.local()
+        wrappers: list = []
+        wrappers_lock = threading.Lock()
+
+        def request() -> float:
+            wrapper = getattr(per_thread, 'wrapper', None)
+            if wrapper is None:
+                wrapper = per_thread.wrapper = \
+                    backend.DatabaseWrapper(settings_dict, alias)
+                wrapper.inc_thread_sharing()  # to be closed at the end
+                with wrappers_lock:
+                    wrappers.append(wrapper)
+            start: float = time.perf_counter()
+            wrapper.close_if_unusable_or_obsolete()  # as a request starts
+            sql, params = CatalogRevision.objects.filter(owner_id=None) \
+                .values_list('revision').query \
+                .get_compiler(connection=wrapper).as_sql()
+            with wrapper.cursor() as cursor:
+                cursor.execute(sql, params)
+                cursor.fetchall()
+            wrapper.close_if_unusable_or_obsolete()  # as it ends
+            return time.perf_counter() - start
+
+        with patch.object(database, 'connect', slow_connect):
+            with ThreadPoolExecutor(max_workers=self.options['threads']) as pool:
+                times: list = list(pool.map(
+                    lambda _: request(), range(self.options['requests'])
+                ))
+            for wrapper in wrappers:
+                wrapper.close()
+            db_pool.discard_pool(alias)
+        return times, len(opened)
@@ -0,0 +1,163 @@
+"""Management command to compare the two ways of serializing lists.
+See api.fast_serialization for the fast path.
+
+For each row count, that many Images, Tags and ImageTags are created
+for a throwaway AppUser, in a transaction that is rolled back at the
+end.  Each model is then serialized and rendered to JSON both by its
+serializer and by the fast path, checking the output is identical.
+Times are the best of --repeat runs, database reads included.
+
+Usage: python manage.py benchmark_serialization [--rows N [N ...]]
+       [--repeat N]
+"""
+
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from api.fast_serialization import row_converter
+from api.models import AppUser, Image, ImageTag, Tag
+from api.serializers import ImageSerializer, ImageTagSerializer, TagSerializer
+
+# Rows are inserted this many at a time
+BATCH_SIZE: int = 2000
+
+
+class Rollback(Exception):
+    """Raised to roll back the benchmark data."""
+
+
+class Command(BaseCommand):
+    help = "Times list serialization by serializer and by the fast path."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[10_000, 100_000],
+            help="Numbers of rows to time (default: 10000 100000)."
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help="Times each measurement is taken (default: 3)."
+        )
+
+    def handle(self, *args, **options):
+        # Image sources are listed as absolute URLs on the request's host
+        request = RequestFactory().get(
+            '/api/image/', SERVER_NAME=settings.ALLOWED_HOSTS[0]
+        )
+        for rows in options['rows']:
+            try:
+                with transaction.atomic():
+                    self.create_rows(rows)
+                    for serializer_class in (
+                        ImageSerializer, TagSerializer, ImageTagSerializer
+                    ):
+                        self.compare(
+                            serializer_class, rows, request, options['repeat']
+                        )
+                    raise Rollback
+            except Rollback:
+                pass
+
+    @staticmethod
+    def create_rows(rows: int) -> None:
+        """Creates an AppUser with the given number of Images and Tags,
+        each Image tagged with one Tag.  Signals are not sent.
+        """
+
+        owner: AppUser = AppUser.objects.create(
+            username=f"bench-{uuid.uuid4().hex[:19]}"
+        )
+        images: list = Image.objects.bulk_create(
+            (
+                Image(
+                    source=f"cas/00/00/{index:064x}.png",
+                    owner=owner,
+                    description=f"Benchmark image {index}",
+                    sha256=f"{index:064x}",
+                    width=640,
+                    height=480,
+                    byte_size=100_000 + index,
+                    mime_type='image/png'
+                )
+                for index in range(rows)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        tags: list = Tag.objects.bulk_create(
+            (Tag(name=f"tag-{index}", owner=owner) for index in range(rows)),
+            batch_size=BATCH_SIZE
+        )
+        ImageTag.objects.bulk_create(
+            (ImageTag(image=image, tag=tag) for image, tag in zip(images, tags)),
+            batch_size=BATCH_SIZE
+        )
+
+    def compare(
+        self,
+        serializer_class,
+        rows: int,
+        request,
+        repeat: int
+    ) -> None:
+        """Times both ways of rendering every row of the serializer's
+        model, and reports the speedup.
+        """
+
+        model = serializer_class.Meta.model
+        renderer = JSONRenderer()
+        fast_path: tuple | None = row_converter(
+            serializer_class, request, read_raw=True
+        )
+        if fast_path is None:
+            raise CommandError(
+                f"{serializer_class.__name__} is not handled by the fast path."
+            )
+        columns, convert = fast_path
+
+        def by_serializer() -> bytes:
+            data = serializer_class(
+                model.objects.order_by('pk'),
+                many=True,
+                context={'request': request}
+            ).data
+            return renderer.render(data)
+
+        def by_fast_path() -> bytes:
+            return renderer.render(convert(
+                model.objects.order_by('pk').values_list(*columns)
+            ))
+
+        slow_time, slow_output = self.best_of(by_serializer, repeat)
+        fast_time, fast_output = self.best_of(by_fast_path, repeat)
+        if slow_output != fast_output:
+            raise CommandError(
+                f"{serializer_class.__name__}: the fast path output differs."
+            )
+        self.stdout.write(
+            f"{model.__name__:<8} {rows:>7} rows: "
+            f"serializer {slow_time * 1000:8.1f} ms, "
+            f"fast path {fast_time * 1000:8.1f} ms "
+            f"({slow_time / fast_time:.1f}x)"
+        )
+
+    @staticmethod
+    def best_of(function, repeat: int) -> tuple:
+        """Returns (the shortest time taken by function, its output)."""
+
+        best: float | None = None
+        output = None
+        for _ in range(max(repeat, 1)):
+            start: float = time.perf_counter()
+            output = function()
+            elapsed: float = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
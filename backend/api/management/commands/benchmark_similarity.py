@@ -0,0 +1,91 @@
+"""Management command to time near-duplicate lookups against a full scan.
+See api.similarity for the index.
+
+Indexes --images random 64-bit hashes, as an owner's perceptual hashes
+would be, then looks up --lookups targets (each a few bits off one of
+the indexed hashes, so that every lookup has a match) at each distance
+up to MAX_DISTANCE_LIMIT, both in the index and by comparing against
+every hash.  For each distance, reports the mean number of candidates
+the index checked (and their share of the index), and the mean time
+per lookup each way.  No database is used.
+
+Usage: python manage.py benchmark_similarity [--images N] [--lookups N]
+       [--seed N]
+"""
+
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from api.similarity import HashIndex, hamming_distance
+from api.similarity import DEFAULT_MAX_DISTANCE, MAX_DISTANCE_LIMIT
+
+# Distances looked up at
+DISTANCES: tuple = (0, 4, 6, 8, DEFAULT_MAX_DISTANCE, 12, MAX_DISTANCE_LIMIT)
+
+
+class Command(BaseCommand):
+    help = "Times near-duplicate lookups in the hash index and by full scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=100000,
+            help="Number of hashes indexed (default: 100000)."
+        )
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=100,
+            help="Number of lookups per distance (default: 100)."
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Seed of the random hashes (default: 0)."
+        )
+
+    def handle(self, *args, **options):
+        if options['images'] < 1 or options['lookups'] < 1:
+            raise CommandError("--images and --lookups must be at least 1.")
+        generator = random.Random(options['seed'])
+        hashes: list = [
+            generator.getrandbits(64) for _ in range(options['images'])
+        ]
+        index = HashIndex()
+        for position, value in enumerate(hashes):
+            index.add(value, position)
+
+        targets: list = []
+        for _ in range(options['lookups']):
+            target: int = generator.choice(hashes)
+            for bit in generator.sample(range(64), generator.randint(0, 4)):
+                target ^= 1 << bit
+            targets.append(target)
+
+        self.stdout.write(
+            f"{len(index)} hashes, {len(targets)} lookups per distance"
+        )
+        for max_distance in DISTANCES:
+            candidates: int = 0
+            start: float = time.perf_counter()
+            for target in targets:
+                candidates += len(index.candidates(target, max_distance))
+                index.search(target, max_distance)
+            indexed: float = (time.perf_counter() - start) / len(targets)
+
+            start = time.perf_counter()
+            for target in targets:
+                [
+                    position for position, value in enumerate(hashes)
+                    if hamming_distance(target, value) <= max_distance
+                ]
+            scanned: float = (time.perf_counter() - start) / len(targets)
+
+            mean: float = candidates / len(targets)
+            self.stdout.write(
+                f"distance {max_distance:2}: {mean:10.1f} candidates "
+                f"({mean / len(index):6.2%} of the index); "
+                f"indexed {indexed * 1000:8.3f}ms, scan {scanned * 1000:8.3f}ms"
+            )
@@ -0,0 +1,220 @@
+"""Management command to compare WSGI and ASGI serving of slow clients.
+See api.media for how media is streamed under each.
+
+A throwaway Image with a random file of --file-size bytes is created,
+then downloaded through image_view by --clients clients at once, each
+reading a block and pausing for --delay seconds before the next (a
+slow connection).  The downloads are served in turn:
+
+ - over WSGI, by a pool of --threads threads, as by a threaded WSGI
+   server: each download holds a thread until the client has it all;
+ - over ASGI, by one event loop with a pool of --threads threads for
+   file reads, as by a worker of run_asgi.
+
+For each, the most downloads in progress at once and the time until
+every client is done are reported.  The Image and its file are
+deleted afterwards.  No server or sockets are involved: requests are
+handed to Django's own WSGI and ASGI handlers.
+
+Usage: python manage.py benchmark_slow_clients [--clients N]
+       [--threads N] [--file-size BYTES] [--delay S]
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from api.models import AppUser, Image, Job
+
+
+class Downloads:
+    """Counts downloads in progress, and the most at once."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.current: int = 0
+        self.peak: int = 0
+        self.failed: int = 0
+
+    def started(self) -> None:
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def finished(self, complete: bool) -> None:
+        with self.lock:
+            self.current -= 1
+            self.failed += not complete
+
+
+class Command(BaseCommand):
+    help = "Times concurrent slow downloads of a file over WSGI and ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=200,
+            help="Number of clients downloading at once (default: 200)."
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help="Threads serving requests (default: 8)."
+        )
+        parser.add_argument(
+            '--file-size',
+            type=int,
+            default=1024 * 1024,
+            help="Size in bytes of the file downloaded (default: 1 MiB)."
+        )
+        parser.add_argument(
+            '--delay',
+            type=float,
+            default=0.02,
+            help="Seconds each client waits between blocks (default: 0.02)."
+        )
+
+    def handle(self, *args, **options):
+        if min(options['clients'], options['threads'], options['file_size']) < 1:
+            raise CommandError(
+                "--clients, --threads and --file-size must be at least 1."
+            )
+        self.options: dict = options
+        self.host: str = settings.ALLOWED_HOSTS[0]
+
+        # committed, so that every serving thread can read it
+        owner: AppUser = AppUser.objects.create(
+            username=f"benchmark-{os.urandom(6).hex()}"
+        )
+        image: Image = Image.objects.create(
+            source=ContentFile(os.urandom(options['file_size']), name='benchmark'),
+            owner=owner
+        )
+        try:
+            path: str = f'/api/image/{image.id}'
+            for name, run in (('WSGI', self.run_wsgi), ('ASGI', self.run_asgi)):
+                downloads = Downloads()
+                start: float = time.perf_counter()
+                run(path, downloads)
+                elapsed: float = time.perf_counter() - start
+                self.stdout.write(
+                    f"{name}: {downloads.peak} download(s) at once, "
+                    f"all {options['clients']} done in {elapsed:.2f}s, "
+                    f"{downloads.failed} failed."
+                )
+        finally:
+            Job.objects.filter(key=f'process_image:{image.id}').delete()
+            image.source.delete(save=False)
+            owner.delete()
+
+    def run_wsgi(self, path: str, downloads: Downloads) -> None:
+        application = WSGIHandler()
+
+        def download() -> None:
+            statuses: list = []
+            environ: dict = {
+                'REQUEST_METHOD': 'GET',
+                'SCRIPT_NAME': '',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': self.host,
+                'SERVER_PORT': '80',
+                'HTTP_HOST': self.host,
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': sys.stderr,
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False
+            }
+            body = application(
+                environ, lambda status, headers: statuses.append(status)
+            )
+            downloads.started()
+            received: int = 0
+            try:
+                for block in body:
+                    received += len(block)
+                    time.sleep(self.options['delay'])
+            finally:
+                body.close()
+                downloads.finished(
+                    statuses == ['200 OK']
+                    and received == self.options['file_size']
+                )
+
+        with ThreadPoolExecutor(max_workers=self.options['threads']) as pool:
+            for result in [
+                pool.submit(download) for _ in range(self.options['clients'])
+            ]:
+                result.result()
+
+    def run_asgi(self, path: str, downloads: Downloads) -> None:
+        application = ASGIHandler()
+        scope: dict = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', self.host.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80)
+        }
+
+        async def download() -> None:
+            done = asyncio.Event()
+            requested: list = []
+            status: list = []
+            received: list = [0]
+
+            async def receive() -> dict:
+                if not requested:
+                    requested.append(True)
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message: dict) -> None:
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                    downloads.started()
+                    return
+                received[0] += len(message.get('body', b''))
+                if message.get('more_body', False):
+                    await asyncio.sleep(self.options['delay'])
+                else:
+                    done.set()
+
+            try:
+                await application(dict(scope), receive, send)
+            finally:
+                done.set()
+                downloads.finished(
+                    status == [200] and received[0] == self.options['file_size']
+                )
+
+        async def download_all() -> None:
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=self.options['threads'])
+            )
+            await asyncio.gather(*(
+                download() for _ in range(self.options['clients'])
+            ))
+
+        asyncio.run(download_all())
@@ -0,0 +1,149 @@
+"""Management command to convert the UUID keys of api tables on MySQL
+between CHAR(32) and BINARY(16) storage.  See api.fields for details.
+
+Run this (after backing up the database) while the app is stopped,
+then change settings.COMPACT_UUID_KEYS to match:
+
+    python manage.py convert_uuid_keys --to binary
+    COMPACT_UUID_KEYS=1 (in the environment of the app)
+
+Every primary key and foreign key column holding an api UUID is
+converted in place.  Foreign key constraints between them are dropped
+for the conversion and added back afterwards.  Columns already in the
+target format are skipped.
+
+Usage: python manage.py convert_uuid_keys [--to {binary,char}] [--dry-run]
+"""
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.fields import CompactUUIDField
+
+# Column types for each storage format, and the SQL converting a
+# (VARBINARY) column's values into that format
+FORMATS: dict = {
+    'binary': ('BINARY(16)', 'UNHEX({column})'),
+    'char': ('CHAR(32)', 'LOWER(HEX({column}))')
+}
+
+
+def uuid_columns() -> list:
+    """Lists (table, column, null) for each column of an api table that
+    holds a UUID key: primary keys, and foreign keys to them.
+    """
+
+    columns: list = []
+    for model in apps.get_app_config('api').get_models():
+        for field in model._meta.concrete_fields:
+            target = field.target_field if field.is_relation else field
+            if isinstance(target, CompactUUIDField):
+                columns.append((model._meta.db_table, field.column, field.null))
+    return columns
+
+
+class Command(BaseCommand):
+    help = "Converts the UUID keys of api tables on MySQL between " \
+        "CHAR(32) and BINARY(16) storage."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to',
+            choices=list(FORMATS),
+            default='binary',
+            help="Storage format to convert to (default: binary)."
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Print the SQL statements, without running them."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'mysql' and not options['dry_run']:
+            raise CommandError(
+                "Only MySQL stores UUIDs in either format; "
+                f"nothing to convert on {connection.vendor}."
+            )
+
+        statements: list = self.plan(options['to'])
+        for statement in statements:
+            if options['dry_run']:
+                self.stdout.write(f"{statement};")
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(statement)
+
+        if not options['dry_run']:
+            setting: str = '1' if options['to'] == 'binary' else ''
+            self.stdout.write(
+                f"Ran {len(statements)} statement(s).  "
+                f"Now set COMPACT_UUID_KEYS={setting} for the app."
+            )
+
+    def plan(self, target: str) -> list:
+        """Returns the SQL statements converting the UUID columns of api
+        tables to the target format.
+        """
+
+        quote = connection.ops.quote_name
+        column_type, convert = FORMATS[target]
+        columns: list = [
+            (table, column, null) for table, column, null in uuid_columns()
+            if not self.is_converted(table, column, target)
+        ]
+        tables: set = {table for table, _, _ in columns}
+
+        # foreign keys between converted columns: (table, name, column,
+        # referenced table, referenced column)
+        foreign_keys: list = []
+        with connection.cursor() as cursor:
+            for table in sorted(tables):
+                constraints: dict = \
+                    connection.introspection.get_constraints(cursor, table)
+                for name, constraint in constraints.items():
+                    if constraint['foreign_key'] \
+                            and constraint['foreign_key'][0] in tables:
+                        foreign_keys.append((
+                            table, name, constraint['columns'][0],
+                            *constraint['foreign_key']
+                        ))
+
+        statements: list = [
+            f"ALTER TABLE {quote(table)} DROP FOREIGN KEY {quote(name)}"
+            for table, name, _, _, _ in foreign_keys
+        ]
+        for table, column, null in columns:
+            nullity: str = 'NULL' if null else 'NOT NULL'
+            statements += [
+                # through VARBINARY, whose bytes convert either way
+                f"ALTER TABLE {quote(table)} MODIFY {quote(column)} "
+                f"VARBINARY(32) {nullity}",
+                f"UPDATE {quote(table)} SET {quote(column)} = "
+                + convert.format(column=quote(column)),
+                f"ALTER TABLE {quote(table)} MODIFY {quote(column)} "
+                f"{column_type} {nullity}"
+            ]
+        statements += [
+            f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} "
+            f"FOREIGN KEY ({quote(column)}) "
+            f"REFERENCES {quote(to_table)} ({quote(to_column)})"
+            for table, name, column, to_table, to_column in foreign_keys
+        ]
+        return statements
+
+    @staticmethod
+    def is_converted(table: str, column: str, target: str) -> bool:
+        """Whether the column is already stored in the target format."""
+
+        if connection.vendor != 'mysql':
+            return False  # planning only (see --dry-run)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT DATA_TYPE FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() "
+                "AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+                [table, column]
+            )
+            row = cursor.fetchone()
+        return row is not None and row[0].lower() == target
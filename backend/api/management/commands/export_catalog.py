@@ -0,0 +1,69 @@
+"""Management command to export catalogs as newline-delimited JSON.
+See api.export for the records an export holds.
+
+Writes to standard output unless given a file; a compressed export
+needs a file (which may be /dev/stdout).  Rows are read and
+written in batches, so memory use does not grow with the catalog.
+File URLs in the export are relative to the site (e.g. /media/...).
+
+Usage: python manage.py export_catalog [--owner UUID] [--output FILE]
+       [--gzip]
+"""
+
+from uuid import UUID
+from django.core.management.base import BaseCommand, CommandError
+from api.export import export_records, gzip_chunks, ndjson_chunks
+from api.models import AppUser
+
+
+class Command(BaseCommand):
+    help = "Exports catalogs as newline-delimited JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--owner',
+            help="Only export the catalog of the AppUser with this id."
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help="File to write the export to (default: standard output)."
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help="Compress the export with gzip."
+        )
+
+    def handle(self, *args, **options):
+        owner_id: UUID | None = None
+        if options['owner']:
+            try:
+                owner_id = UUID(options['owner'])
+            except ValueError:
+                raise CommandError("--owner must be a valid UUID.")
+            if not AppUser.objects.filter(id=owner_id).exists():
+                raise CommandError(f"No AppUser with id {owner_id}.")
+
+        chunks = ndjson_chunks(export_records(owner_id))
+        if options['gzip']:
+            chunks = gzip_chunks(chunks)
+
+        if options['output'] != '-':
+            with open(options['output'], 'wb') as output:
+                self.write_chunks(chunks, output)
+            return
+
+        if options['gzip']:
+            raise CommandError(
+                "Compressed exports need --output (e.g. --output /dev/stdout)."
+            )
+        for chunk in chunks:  # chunks end at line ends
+            self.stdout.write(chunk.decode(), ending='')
+        self.stdout.flush()
+
+    @staticmethod
+    def write_chunks(chunks, output) -> None:
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
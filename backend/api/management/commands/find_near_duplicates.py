@@ -0,0 +1,105 @@
+"""Management command to report groups of near-duplicate Images.
+See api.similarity for how near duplicates are found.
+
+Each owner's Images are looked up in that owner's hash index, and
+Images within the given distance of each other are grouped together
+(transitively, so a chain of close copies forms one group).
+
+Usage: python manage.py find_near_duplicates [--max-distance N]
+       [--owner UUID]
+"""
+
+from uuid import UUID
+from django.core.management.base import BaseCommand, CommandError
+from api.models import AppUser, Image
+from api.similarity import DEFAULT_MAX_DISTANCE, MAX_DISTANCE_LIMIT
+from api.similarity import owner_index
+
+
+class Command(BaseCommand):
+    help = "Reports groups of Images whose perceptual hashes are close."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-distance',
+            type=int,
+            default=DEFAULT_MAX_DISTANCE,
+            help="Greatest number of differing hash bits between near " \
+                f"duplicates (default: {DEFAULT_MAX_DISTANCE})."
+        )
+        parser.add_argument(
+            '--owner',
+            help="Only report on the Images of the AppUser with this id."
+        )
+
+    def handle(self, *args, **options):
+        max_distance: int = options['max_distance']
+        if not 0 <= max_distance <= MAX_DISTANCE_LIMIT:
+            raise CommandError(
+                f"--max-distance must be from 0 to {MAX_DISTANCE_LIMIT}."
+            )
+
+        owners = AppUser.objects.order_by('username')
+        if options['owner']:
+            try:
+                owner_id: UUID = UUID(options['owner'])
+            except ValueError:
+                raise CommandError("--owner must be a valid UUID.")
+            owners = owners.filter(id=owner_id)
+            if not owners.exists():
+                raise CommandError(f"No AppUser with id {owner_id}.")
+
+        total: int = 0
+        for owner in owners:
+            groups: list = self.find_groups(owner, max_distance)
+            for group in groups:
+                self.stdout.write(f"{owner.username}: {len(group)} images")
+                for image_id, source in group:
+                    self.stdout.write(f"  {image_id} {source}")
+            total += len(groups)
+
+        self.stdout.write(f"Found {total} group(s) of near duplicates.")
+
+    @staticmethod
+    def find_groups(owner: AppUser, max_distance: int) -> list:
+        """Groups the owner's near-duplicate Images; returns a list of
+        groups of (id, source), leaving out Images with no near duplicate.
+        """
+
+        index = owner_index(owner.id)
+        hashes: dict = dict(
+            Image.objects.filter(owner=owner, perceptual_hash__isnull=False)
+            .values_list('id', 'perceptual_hash')
+        )
+
+        # union-find over Image ids, joining each Image to its matches
+        parents: dict = {}
+
+        def root(image_id):
+            while parents.get(image_id, image_id) != image_id:
+                image_id = parents[image_id]
+            return image_id
+
+        for image_id, perceptual_hash in hashes.items():
+            for _, match_id in index.search(perceptual_hash, max_distance):
+                image_root, match_root = root(image_id), root(match_id)
+                if image_root != match_root:
+                    parents[match_root] = image_root
+
+        members: dict = {}
+        for image_id in parents:
+            members.setdefault(root(image_id), set()).add(image_id)
+        for group_root, group in members.items():
+            group.add(group_root)
+
+        grouped: set = set().union(*members.values())
+        sources: dict = dict(
+            Image.objects.filter(id__in=grouped).values_list('id', 'source')
+        )
+        return [
+            sorted(
+                (str(image_id), sources.get(image_id, ''))
+                for image_id in group
+            )
+            for group in members.values()
+        ]
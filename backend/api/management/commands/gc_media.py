@@ -0,0 +1,82 @@
+"""Management command to delete media files no Image refers to.
+See api.storage for how media files are stored.
+
+Content-addressed files are shared by every Image with the same
+content, so they are not deleted along with an Image; instead, this
+command removes those left with no Image at all.  Files modified
+within the grace period are kept, so that a file saved for an Image
+that is not yet in the database is not collected from under it.
+
+Usage: python manage.py gc_media [--min-age SECONDS] [--dry-run]
+"""
+
+import os
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand
+from api.models import Image
+from api.storage import CAS_PREFIX
+
+
+class Command(BaseCommand):
+    help = "Deletes content-addressed media files that no Image refers to."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help="Only delete files unmodified for this many seconds " \
+                "(default: 3600)."
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report the files that would be deleted, without deleting."
+        )
+
+    def handle(self, *args, **options):
+        storage = Image._meta.get_field('source').storage
+        root = Path(storage.path(CAS_PREFIX))
+        cutoff: float = time.time() - options['min_age']
+
+        # names are lowercase hex digests, so sort the same in Python
+        # as in any collation; walking the shards in order, they are
+        # merged against a single ordered read of the referenced names
+        referenced = iter(
+            Image.objects.filter(
+                source__gte=f'{CAS_PREFIX}/', source__lt=f'{CAS_PREFIX}0'
+            ).order_by('source').values_list('source', flat=True)
+            .iterator()
+        )
+        next_referenced: str | None = next(referenced, None)
+
+        deleted: int = 0
+        freed: int = 0
+        for shard in sorted(root.glob('??/??')):
+            prefix: str = f'{CAS_PREFIX}/{shard.parent.name}/{shard.name}/'
+            for entry in sorted(os.scandir(shard), key=lambda entry: entry.name):
+                name: str = prefix + entry.name
+                while next_referenced is not None and next_referenced < name:
+                    next_referenced = next(referenced, None)
+                if entry.name.endswith('.tmp') or name == next_referenced:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    continue
+
+                if options['dry_run']:
+                    self.stdout.write(f"Would delete {name}")
+                else:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        continue
+                deleted += 1
+                freed += stat.st_size
+
+        verb: str = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(f"{verb} {deleted} file(s), {freed} byte(s).")
@@ -0,0 +1,553 @@
+"""Management command to import catalogs and media files in bulk.
+See api.importer for how inputs are read.
+
+Imports any number of catalogs (NDJSON, plain or gzipped, as written
+by export_catalog) and media directories (every image and video under
+them, for the AppUser given by --owner).  With --media-root, the files
+an exported catalog refers to are copied in from that directory (for
+instance the MEDIA_ROOT of the exporting deployment); otherwise they
+are assumed to be in MEDIA_ROOT already.
+
+Files are hashed, probed and copied into storage by a pool of worker
+processes, while rows are inserted with bulk_create, in batches of
+--batch-size per transaction.  Nothing is imported twice: AppUsers are
+matched by username, Tags by owner and name, and Images by owner and
+content hash, to existing rows or earlier ones in the import; records
+referring to a matched row are pointed at it instead.
+
+With --checkpoint, progress through each input is saved to a file
+after every batch, and a repeated run with the same checkpoint file
+resumes where the last one stopped.  The ids of records matched to
+existing rows, which later records may refer to, are appended to a
+journal beside it (FILE.remapped).
+
+Rows made by bulk_create send no signals, so the catalog (and hash)
+revision of each affected owner is bumped here, as is the full-text index of new
+Images' descriptions (see api.search), and no process_image jobs are
+queued: metadata is found during the import, and thumbnails are
+rendered when first asked for.
+
+Usage: python manage.py import_catalog [--catalog FILE ...]
+       [--media DIR ... --owner USER] [--media-root DIR]
+       [--workers N] [--batch-size N] [--checkpoint FILE]
+"""
+
+import json
+import multiprocessing
+import os
+from functools import partial
+from uuid import UUID
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from api import revisions, search
+from api.fields import new_uuid
+from api.importer import ingest_file, media_files, prepare_record
+from api.importer import read_records, source_name
+from api.models import AppUser, CatalogRevision, Image, ImageTag, Tag
+
+# Fields of exported Images copied onto imported ones
+IMAGE_METADATA_FIELDS: tuple = (
+    'sha256', 'width', 'height', 'byte_size', 'mime_type', 'perceptual_hash'
+)
+
+# Files handed to a worker process at a time
+WORKER_CHUNK_SIZE: int = 16
+
+
+class Command(BaseCommand):
+    help = "Imports catalogs and media directories in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--catalog',
+            action='append',
+            default=[],
+            help="NDJSON catalog to import (may be repeated)."
+        )
+        parser.add_argument(
+            '--media',
+            action='append',
+            default=[],
+            help="Directory of media files to import (may be repeated)."
+        )
+        parser.add_argument(
+            '--owner',
+            help="Id or username of the AppUser to import media for."
+        )
+        parser.add_argument(
+            '--media-root',
+            help="Directory holding the files catalogs refer to."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Worker processes handling files; 0 handles them in " \
+                "this process (default: one per CPU)."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Rows inserted per transaction (default: 1000)."
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="File to save progress to, and resume from."
+        )
+
+    def handle(self, *args, **options):
+        if not options['catalog'] and not options['media']:
+            raise CommandError("Give at least one --catalog or --media.")
+        if options['batch_size'] < 1 or options['workers'] < 0:
+            raise CommandError("--batch-size must be positive, and " \
+                "--workers not negative.")
+        owner: AppUser | None = None
+        if options['media']:
+            owner = self.find_owner(options['owner'])
+        for path in options['catalog'] + options['media']:
+            if not os.path.exists(path):
+                raise CommandError(f"{path} does not exist.")
+
+        self.batch_size: int = options['batch_size']
+        self.checkpoint_path: str | None = options['checkpoint']
+        self.remapped: list = []  # (record id, row id) not yet journaled
+        self.checkpoint: dict = self.load_checkpoint()
+        self.counts: dict = dict.fromkeys(
+            ['user', 'tag', 'image', 'image-tag', 'duplicate', 'error'], 0
+        )
+
+        pool = None
+        if options['workers'] > 0:
+            # workers only read and store files; they never use the
+            # database connections inherited from this process
+            pool = multiprocessing.Pool(
+                options['workers'], initializer=django.setup
+            )
+        try:
+            for path in options['catalog']:
+                self.import_catalog(path, options['media_root'], pool)
+            for path in options['media']:
+                self.import_media(path, owner, pool)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        counts: dict = self.counts
+        self.stdout.write(
+            f"Imported {counts['user']} user(s), {counts['tag']} tag(s), "
+            f"{counts['image']} image(s), {counts['image-tag']} image-tag(s); "
+            f"skipped {counts['duplicate']} duplicate(s) and "
+            f"{counts['error']} error(s)."
+        )
+
+    @staticmethod
+    def find_owner(owner: str | None) -> AppUser:
+        """Returns the AppUser with the given id or username."""
+
+        if not owner:
+            raise CommandError("--media requires --owner.")
+        try:
+            return AppUser.objects.get(id=UUID(owner))
+        except (ValueError, AppUser.DoesNotExist):
+            pass
+        try:
+            return AppUser.objects.get(username=owner)
+        except AppUser.DoesNotExist:
+            raise CommandError(f"No AppUser with id or username {owner}.")
+
+    # Checkpoints
+
+    def load_checkpoint(self) -> dict:
+        """Reads the checkpoint file, if there is one, and its journal.
+        Checkpoints hold the number of lines or files done per input;
+        the ids of records pointed at matching rows instead of imported
+        are appended to the journal as they are found, so that saving a
+        checkpoint costs the same however many there are.
+        """
+
+        checkpoint: dict = {'inputs': {}, 'remapped': {}}
+        if not self.checkpoint_path:
+            return checkpoint
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as file:
+                checkpoint.update(json.load(file))
+            # (checkpoints once held these too; journal them from now on)
+            self.remapped.extend(checkpoint['remapped'].items())
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as file:
+                for line in file:
+                    # a line cut short by a crash is written again, as
+                    # its batch is imported again
+                    if line.endswith('\n'):
+                        record_id, row_id = json.loads(line)
+                        checkpoint['remapped'][record_id] = row_id
+        return checkpoint
+
+    @property
+    def journal_path(self) -> str:
+        return f'{self.checkpoint_path}.remapped'
+
+    def save_checkpoint(self, key: str, done: int) -> None:
+        """Records that the first done lines or files of the input named
+        by key have been imported, journaling the ids remapped since the
+        last checkpoint first.
+        """
+
+        self.checkpoint['inputs'][key] = done
+        remapped: list = self.remapped
+        self.remapped = []
+        if not self.checkpoint_path:
+            return
+        if remapped:
+            with open(self.journal_path, 'a') as file:
+                file.writelines(
+                    json.dumps(pair) + '\n' for pair in remapped
+                )
+        temporary_path: str = f'{self.checkpoint_path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'inputs': self.checkpoint['inputs']}, file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def resolve(self, record_id) -> str | None:
+        """Returns the id a record id now refers to: the id of the row it
+        was matched to, if it was, or itself.
+        """
+
+        if record_id is None:
+            return None
+        record_id = str(record_id)
+        return self.checkpoint['remapped'].get(record_id, record_id)
+
+    def remap(self, record_id, row_id) -> None:
+        if str(record_id) != str(row_id):
+            self.checkpoint['remapped'][str(record_id)] = str(row_id)
+            self.remapped.append((str(record_id), str(row_id)))
+
+    # Inputs
+
+    def import_catalog(self, path: str, media_root: str | None, pool) -> None:
+        """Imports the records of the catalog at path, a batch of records
+        of one type at a time.
+        """
+
+        key: str = f'catalog:{os.path.abspath(path)}'
+        items = read_records(path, self.checkpoint['inputs'].get(key, 0))
+        if media_root is not None:
+            prepare = partial(prepare_record, media_root=media_root)
+            items = pool.imap(prepare, items, WORKER_CHUNK_SIZE) \
+                if pool is not None else map(prepare, items)
+
+        inserters: dict = {
+            'user': self.insert_users,
+            'tag': self.insert_tags,
+            'image': self.insert_images,
+            'image-tag': self.insert_imagetags
+        }
+        batch: list = []
+        batch_type: str | None = None
+        last_line: int = 0
+        try:
+            for number, record in items:
+                record_type = record.get('type') if isinstance(record, dict) \
+                    else None
+                if record_type not in inserters \
+                        or not isinstance(record.get('data'), dict):
+                    raise CommandError(f"{path}, line {number}: not a record.")
+                if batch and (
+                    record_type != batch_type or len(batch) >= self.batch_size
+                ):
+                    self.insert(inserters[batch_type], batch, key, last_line)
+                    batch = []
+                batch_type = record_type
+                batch.append(record)
+                last_line = number
+        except ValueError as error:
+            raise CommandError(str(error))
+        if batch:
+            self.insert(inserters[batch_type], batch, key, last_line)
+
+    def import_media(self, root: str, owner: AppUser, pool) -> None:
+        """Imports the images and videos under the directory root."""
+
+        key: str = f'media:{os.path.abspath(root)}:{owner.id}'
+        done: int = self.checkpoint['inputs'].get(key, 0)
+        paths = media_files(root, done)
+        results = pool.imap(ingest_file, paths, WORKER_CHUNK_SIZE) \
+            if pool is not None else map(ingest_file, paths)
+
+        batch: list = []
+        for result in results:
+            done += 1
+            if result is not None:
+                batch.append(result)
+            if len(batch) >= self.batch_size:
+                self.insert(
+                    partial(self.insert_files, owner=owner), batch, key, done
+                )
+                batch = []
+        self.insert(partial(self.insert_files, owner=owner), batch, key, done)
+
+    def insert(self, inserter, batch: list, key: str, done: int) -> None:
+        """Inserts a batch in one transaction, along with bumping the
+        revisions of the catalogs it changes, then saves the checkpoint.
+        """
+
+        with transaction.atomic():
+            owner_ids: set = inserter(batch)
+            for owner_id in owner_ids:
+                revisions.bump(owner_id)
+        self.save_checkpoint(key, done)
+
+    def report_error(self, path, error: str) -> None:
+        self.counts['error'] += 1
+        self.stderr.write(f"Skipped {path}: {error}")
+
+    # Inserts; each returns the ids of the owners whose catalogs changed,
+    # and counts only the rows it inserted
+
+    def insert_users(self, records: list) -> set:
+        by_username: dict = {}
+        for record in records:
+            data: dict = record['data']
+            username: str | None = data.get('username')
+            if not username or not data.get('id'):
+                self.report_error(data.get('id'), "Id or username missing.")
+            elif username in by_username:
+                self.remap(data['id'], by_username[username])
+                self.counts['duplicate'] += 1
+            else:
+                by_username[username] = data['id']
+
+        existing: dict = dict(
+            AppUser.objects.filter(username__in=by_username)
+            .values_list('username', 'id')
+        )
+        new_users: list = []
+        for username, user_id in by_username.items():
+            if username in existing:
+                self.remap(user_id, existing[username])
+                self.counts['duplicate'] += 1
+            else:
+                new_users.append(AppUser(id=user_id, username=username))
+        new_users = self.bulk_insert(AppUser, new_users)
+        CatalogRevision.objects.bulk_create(
+            [CatalogRevision(owner_id=user.id) for user in new_users],
+            ignore_conflicts=True
+        )
+        self.counts['user'] += len(new_users)
+        return set()
+
+    @staticmethod
+    def bulk_insert(model, rows: list) -> list:
+        """Inserts rows with bulk_create, skipping those that conflict
+        with rows already there (say, inserted meanwhile by another
+        import); returns the rows inserted.  bulk_create does not tell
+        which those are, so they are found by id before and after.
+        """
+
+        if not rows:
+            return rows
+
+        def present() -> set:
+            return {
+                str(row_id) for row_id in model.objects.filter(
+                    id__in=[row.id for row in rows]
+                ).values_list('id', flat=True)
+            }
+
+        before: set = present()
+        model.objects.bulk_create(rows, ignore_conflicts=True)
+        inserted: set = present() - before
+        to_python = model._meta.pk.to_python
+        return [row for row in rows if str(to_python(row.id)) in inserted]
+
+    def existing_owners(self, owner_ids) -> set:
+        return {
+            str(owner_id) for owner_id in
+            AppUser.objects.filter(id__in=owner_ids).values_list('id', flat=True)
+        }
+
+    def insert_tags(self, records: list) -> set:
+        owners: set = self.existing_owners(
+            {self.resolve(record['data'].get('owner')) for record in records}
+            - {None}
+        )
+        # (owner id, name) -> Tag id, for this batch and existing Tags
+        wanted: dict = {}
+        for record in records:
+            data: dict = record['data']
+            owner_id: str | None = self.resolve(data.get('owner'))
+            if owner_id not in owners or not data.get('name'):
+                self.report_error(data.get('id'), "Owner or name missing.")
+                continue
+            # as for Images and ImageTags, a Tag without an id is given
+            # one (though no record can refer to it)
+            tag_id = data.get('id') or new_uuid()
+            key: tuple = (owner_id, data['name'])
+            if key in wanted:
+                self.remap(tag_id, wanted[key])
+                self.counts['duplicate'] += 1
+            else:
+                wanted[key] = tag_id
+
+        existing: dict = {
+            (str(owner_id), name): tag_id
+            for tag_id, owner_id, name in Tag.objects.filter(
+                owner_id__in=owners,
+                name__in={name for _, name in wanted}
+            ).values_list('id', 'owner_id', 'name')
+        }
+        new_tags: list = []
+        for key, tag_id in wanted.items():
+            if key in existing:
+                self.remap(tag_id, existing[key])
+                self.counts['duplicate'] += 1
+            else:
+                new_tags.append(Tag(id=tag_id, owner_id=key[0], name=key[1]))
+        new_tags = self.bulk_insert(Tag, new_tags)
+        self.counts['tag'] += len(new_tags)
+        return {tag.owner_id for tag in new_tags}
+
+    def insert_images(self, records: list) -> set:
+        owners: set = self.existing_owners(
+            {self.resolve(record['data'].get('owner')) for record in records}
+            - {None}
+        )
+        images: list = []
+        for record in records:
+            data: dict = record['data']
+            owner_id: str | None = self.resolve(data.get('owner'))
+            file: dict | None = record.get('file')
+            if owner_id not in owners:
+                self.report_error(data.get('id'), "Owner missing.")
+                continue
+            if file is not None and 'error' in file:
+                self.report_error(file['path'], file['error'])
+                continue
+
+            image = Image(
+                id=data.get('id') or new_uuid(),
+                owner_id=owner_id,
+                description=data.get('description') or '',
+                uploaded_at=parse_datetime(data.get('uploaded_at') or '')
+                    or timezone.now()
+            )
+            if file is not None:  # copied in, and probed, just now
+                image.source = file['source']
+                for field in IMAGE_METADATA_FIELDS:
+                    setattr(image, field, file[field])
+            else:
+                image.source = source_name(data.get('source')) or ''
+                for field in IMAGE_METADATA_FIELDS:
+                    if data.get(field) is not None:
+                        setattr(image, field, data[field])
+            images.append(image)
+        return self.create_images(images)
+
+    def insert_files(self, results: list, owner: AppUser) -> set:
+        images: list = []
+        for result in results:
+            if 'error' in result:
+                self.report_error(result['path'], result['error'])
+                continue
+            image = Image(
+                id=new_uuid(),
+                owner=owner,
+                source=result['source'],
+                uploaded_at=result['modified']
+            )
+            for field in IMAGE_METADATA_FIELDS:
+                setattr(image, field, result[field])
+            images.append(image)
+        return self.create_images(images)
+
+    def create_images(self, images: list) -> set:
+        """Inserts those of images whose content their owner has no
+        Image of yet.
+        """
+
+        if not images:
+            return set()
+        existing: dict = {
+            (str(owner_id), sha256): image_id
+            for image_id, owner_id, sha256 in Image.objects.filter(
+                owner_id__in={str(image.owner_id) for image in images},
+                sha256__in={image.sha256 for image in images if image.sha256}
+            ).values_list('id', 'owner_id', 'sha256')
+        }
+        new_images: list = []
+        for image in images:
+            key: tuple = (str(image.owner_id), image.sha256)
+            if image.sha256 and key in existing:
+                self.remap(image.id, existing[key])
+                self.counts['duplicate'] += 1
+                continue
+            if image.sha256:
+                existing[key] = image.id
+            new_images.append(image)
+        new_images = self.bulk_insert(Image, new_images)
+        search.index_images([image.id for image in new_images])
+        self.counts['image'] += len(new_images)
+        owner_ids: set = {str(image.owner_id) for image in new_images}
+        for owner_id in owner_ids:
+            revisions.bump_hashes(owner_id)
+        return owner_ids
+
+    def insert_imagetags(self, records: list) -> set:
+        pairs: dict = {}
+        for record in records:
+            data: dict = record['data']
+            pair: tuple = (
+                self.resolve(data.get('image')),
+                self.resolve(data.get('tag'))
+            )
+            if pair in pairs:
+                self.counts['duplicate'] += 1
+            else:
+                pairs[pair] = data.get('id') or new_uuid()
+
+        image_owners: dict = {
+            str(image_id): owner_id for image_id, owner_id in Image.objects.filter(
+                id__in={image_id for image_id, _ in pairs if image_id}
+            ).values_list('id', 'owner_id')
+        }
+        tag_owners: dict = {
+            str(tag_id): owner_id for tag_id, owner_id in Tag.objects.filter(
+                id__in={tag_id for _, tag_id in pairs if tag_id}
+            ).values_list('id', 'owner_id')
+        }
+        existing: set = {
+            (str(image_id), str(tag_id))
+            for image_id, tag_id in ImageTag.objects.filter(
+                image_id__in=image_owners, tag_id__in=tag_owners
+            ).values_list('image_id', 'tag_id')
+        }
+
+        new_imagetags: list = []
+        for (image_id, tag_id), imagetag_id in pairs.items():
+            if image_id not in image_owners or tag_id not in tag_owners:
+                self.report_error(imagetag_id, "Image or tag missing.")
+            elif image_owners[image_id] != tag_owners[tag_id]:
+                self.report_error(
+                    imagetag_id, "Image and tag have different owners."
+                )
+            elif (image_id, tag_id) in existing:
+                self.counts['duplicate'] += 1
+            else:
+                new_imagetags.append(
+                    ImageTag(id=imagetag_id, image_id=image_id, tag_id=tag_id)
+                )
+        new_imagetags = self.bulk_insert(ImageTag, new_imagetags)
+        self.counts['image-tag'] += len(new_imagetags)
+        # (the same owners, the pairs being checked above)
+        return {
+            tag_owners[str(imagetag.tag_id)] for imagetag in new_imagetags
+        } | {
+            image_owners[str(imagetag.image_id)] for imagetag in new_imagetags
+        }
+
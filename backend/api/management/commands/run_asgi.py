@@ -0,0 +1,66 @@
+"""Management command to serve the app over ASGI, with uvicorn.
+See MemeCataloger.asgi for the application served.
+
+Unlike runserver, this is meant for production: each worker process
+runs an event loop that streams responses (media files above all) to
+any number of clients at once, however slowly they read.  Synchronous
+views still run in threads, but are done with them once the response
+is built.
+
+Usage: python manage.py run_asgi [--host HOST] [--port PORT]
+       [--workers N] [--keep-alive S]
+"""
+
+import os
+from django.core.management.base import BaseCommand, CommandError
+
+# The ASGI application, as uvicorn imports it in each worker process
+APPLICATION: str = 'MemeCataloger.asgi:application'
+
+
+class Command(BaseCommand):
+    help = "Serves the app over ASGI with uvicorn."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='0.0.0.0',
+            help="Address to listen on (default: 0.0.0.0)."
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8000,
+            help="Port to listen on (default: 8000)."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=int(os.getenv('ASGI_WORKERS', os.cpu_count() or 1)),
+            help="Number of worker processes (default: number of CPUs, "
+                 "or the ASGI_WORKERS environment variable)."
+        )
+        parser.add_argument(
+            '--keep-alive',
+            type=int,
+            default=5,
+            help="Seconds an idle connection is kept open (default: 5)."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("uvicorn is not installed; see requirements.txt.")
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1.")
+
+        # Django applications do not handle ASGI lifespan events
+        uvicorn.run(
+            APPLICATION,
+            host=options['host'],
+            port=options['port'],
+            workers=options['workers'],
+            timeout_keep_alive=options['keep_alive'],
+            lifespan='off'
+        )
@@ -0,0 +1,92 @@
+"""Management command to run background job workers.
+See api.jobs for details of the job queue.
+
+Usage: python manage.py run_workers [--processes N] [--poll-interval S] [--once]
+"""
+
+import multiprocessing
+import os
+import signal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from api import jobs
+
+# Seconds between checks that all worker processes are still alive
+SUPERVISE_INTERVAL: float = 5.0
+
+
+def worker_process(stop, poll_interval: float) -> None:
+    """Entry point of each worker process."""
+
+    # connections inherited from the parent process must not be shared
+    connections.close_all()
+    # leave shutdown to the parent, which sets stop on SIGINT/SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    jobs.work(stop, poll_interval)
+
+
+class Command(BaseCommand):
+    help = "Runs worker processes that carry out queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=int(os.getenv('JOB_WORKER_PROCESSES', os.cpu_count() or 1)),
+            help="Number of worker processes (default: number of CPUs, "
+                 "or the JOB_WORKER_PROCESSES environment variable)."
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help="Seconds to wait before checking an empty queue again."
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run the jobs that are due in this process, then exit."
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            count: int = jobs.run_pending()
+            self.stdout.write(f"Ran {count} job(s).")
+            return
+
+        if options['processes'] < 1:
+            raise CommandError("--processes must be at least 1.")
+
+        stop = multiprocessing.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        connections.close_all()
+
+        def start_worker(index: int) -> multiprocessing.Process:
+            worker = multiprocessing.Process(
+                target=worker_process,
+                args=(stop, options['poll_interval']),
+                name=f'job-worker-{index}'
+            )
+            worker.start()
+            return worker
+
+        workers: list = [
+            start_worker(index) for index in range(options['processes'])
+        ]
+        self.stdout.write(f"Started {len(workers)} worker process(es).")
+
+        # replace any worker that dies, until asked to stop
+        try:
+            while not stop.wait(SUPERVISE_INTERVAL):
+                for index, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        self.stderr.write(
+                            f"{worker.name} exited ({worker.exitcode}); "
+                            "restarting."
+                        )
+                        workers[index] = start_worker(index)
+        except KeyboardInterrupt:
+            stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write("Workers stopped.")
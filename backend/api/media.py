@@ -0,0 +1,366 @@
+"""Helpers to deliver media files (images, GIFs, videos) over HTTP.
+Used by api.views to serve the files behind Image objects.
+
+Files are streamed from disk in fixed-size blocks rather than read
+into memory, and HTTP Range requests are honored so that clients
+(for instance, browsers seeking through a video) can fetch just the
+part of a file they need.
+
+Served over ASGI, streamed content is read in worker threads, a block
+at a time, while the event loop sends it; a slow client then holds no
+thread between blocks (and Django, given a synchronous iterator, would
+read the whole of it into memory before sending any).
+
+Functions
+---------
+
+guess_content_type
+    Detects the MIME type of a file from its leading bytes.
+
+parse_range_header
+    Parses an HTTP Range header against a file of known size.
+
+file_sha256
+    Computes the SHA-256 hex digest of a file, reading it in blocks.
+
+dhash
+    Computes a 64-bit perceptual (difference) hash of an image file.
+
+probe_file
+    Finds the content hash, size, MIME type and dimensions of a file.
+
+serves_async
+    Tells whether a request is being served over ASGI.
+
+async_chunks
+    Reads chunks from a synchronous iterator in worker threads.
+
+stream_chunks
+    Prepares chunks to stream to a client, however it is served.
+
+stream_file
+    Prepares a FileResponse to stream to a client, however it is served.
+
+file_response
+    Builds a streaming (and Range-aware) response for a file on disk.
+
+zip_chunks
+    Streams a ZIP archive of files on disk, built as it is sent.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import zipfile
+import filetype
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse
+from PIL import Image as PillowImage
+from PIL import ImageOps
+from PIL import UnidentifiedImageError
+
+# Bytes read from disk per chunk of a streamed response
+MEDIA_BLOCK_SIZE: int = 64 * 1024
+
+# EXIF orientations in which an image is displayed rotated a quarter turn,
+# and so with its stored width and height swapped
+EXIF_ORIENTATION_TAG: int = 0x0112
+TRANSPOSED_ORIENTATIONS: tuple = (5, 6, 7, 8)
+
+# Side of the grid of brightness gradients a difference hash is made
+# from; 8 gives a 64-bit hash
+DHASH_SIZE: int = 8
+
+# Only single byte ranges are supported, e.g. "bytes=0-499",
+# "bytes=500-" (to the end) or "bytes=-500" (the last 500 bytes)
+RANGE_HEADER_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _ZipOutput:
+    """A write-only, unseekable file-like object for zipfile to write an
+    archive to; whatever was written is taken out again by drain.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: list = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data: bytes = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a requested byte range lies outside of the file."""
+
+
+class _FileRange:
+    """A read-only, file-like window over part of an open file.
+    FileResponse reads from this in blocks until it is exhausted.
+    """
+
+    def __init__(self, file, start: int, length: int) -> None:
+        self.file = file
+        self.file.seek(start)
+        self.remaining: int = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data: bytes = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def guess_content_type(path: str) -> str:
+    """Detects the MIME type of the file at path.
+    Magic numbers at the start of the file are checked first, so that
+    files with a missing or misleading extension are still labeled
+    correctly; failing that, the extension is used.
+    """
+
+    kind = filetype.guess(path)
+    if kind is not None:
+        return kind.mime
+    content_type, _ = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def file_sha256(path: str) -> str:
+    """Computes the SHA-256 hex digest of the file at path."""
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(MEDIA_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dhash(path: str) -> int:
+    """Computes the difference hash of the image at path: the image is
+    shrunk to a 9x8 grid of grey levels, and each bit of the hash tells
+    whether a cell is brighter than its right-hand neighbour.
+
+    Re-encoded, rescaled or lightly edited copies of an image have
+    hashes only a few bits apart.  The hash is returned as a signed
+    64-bit integer, as stored on Image.perceptual_hash.
+    Raises PIL.UnidentifiedImageError if the file is not an image.
+    """
+
+    with PillowImage.open(path) as original:
+        # let JPEGs decode at reduced scale; the detail is thrown away
+        original.draft('L', (DHASH_SIZE * 8, DHASH_SIZE * 8))
+        image = ImageOps.exif_transpose(original).convert('L')
+        grid: bytes = image.resize(
+            (DHASH_SIZE + 1, DHASH_SIZE),
+            PillowImage.Resampling.BOX
+        ).tobytes()
+
+    value: int = 0
+    for row in range(DHASH_SIZE):
+        for column in range(DHASH_SIZE):
+            cell: int = row * (DHASH_SIZE + 1) + column
+            value = (value << 1) | (grid[cell] > grid[cell + 1])
+    # two's complement, to fit a signed 64-bit database column
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def probe_file(path: str) -> dict:
+    """Finds the metadata of the file at path that is stored on an Image:
+    {sha256, byte_size, mime_type, width, height, perceptual_hash}.
+    width and height are as displayed (i.e. after EXIF rotation); they
+    and perceptual_hash are None for media Pillow cannot read, such as
+    videos.
+    """
+
+    width = height = perceptual_hash = None
+    try:
+        # only the header is read here, not the image data
+        with PillowImage.open(path) as image:
+            width, height = image.size
+            orientation = image.getexif().get(EXIF_ORIENTATION_TAG)
+            if orientation in TRANSPOSED_ORIENTATIONS:
+                width, height = height, width
+        perceptual_hash = dhash(path)
+    except UnidentifiedImageError:
+        pass
+
+    return {
+        'sha256': file_sha256(path),
+        'byte_size': os.path.getsize(path),
+        'mime_type': guess_content_type(path),
+        'width': width,
+        'height': height,
+        'perceptual_hash': perceptual_hash
+    }
+
+
+def parse_range_header(header: str, size: int) -> tuple[int, int] | None:
+    """Parses an HTTP Range header for a file of size bytes.
+    Returns an inclusive (start, end) pair of byte offsets, or None if
+    the header should be ignored and the full file served (which is
+    permitted for malformed or multi-part ranges; see RFC 9110 14.2).
+    Raises RangeNotSatisfiable if the range lies outside of the file.
+    """
+
+    match = RANGE_HEADER_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the final N bytes of the file
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, min(end, size - 1)
+
+
+def serves_async(request) -> bool:
+    """Tells whether request is being served over ASGI."""
+
+    return isinstance(request, ASGIRequest)
+
+
+async def async_chunks(chunks, thread_sensitive: bool = True):
+    """Yields the chunks of a synchronous iterator, each read in a
+    worker thread, so that reading does not block the event loop.
+
+    With thread_sensitive, every chunk is read in the thread the
+    request's synchronous code runs in, as needed by iterators that
+    use the database (whose connections belong to a thread); without,
+    chunks are read in any thread of the shared pool.
+    """
+
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=thread_sensitive)
+    try:
+        while (chunk := await next_chunk(iterator, None)) is not None:
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=thread_sensitive)()
+
+
+def stream_chunks(request, chunks, thread_sensitive: bool = True):
+    """Returns chunks to stream to the client of request: as they are
+    when served over WSGI, or read by async_chunks over ASGI.
+    """
+
+    if serves_async(request):
+        return async_chunks(chunks, thread_sensitive)
+    return chunks
+
+
+def stream_file(request, response: FileResponse) -> FileResponse:
+    """Returns response, its file read in worker threads (any of them)
+    if request is served over ASGI.  Over WSGI, the file is left to the
+    server's wsgi.file_wrapper, if it has one.
+    """
+
+    if serves_async(request):
+        response.streaming_content = async_chunks(
+            response.streaming_content, thread_sensitive=False
+        )
+    return response
+
+
+def file_response(request, path: str, etag: str | None = None) -> HttpResponse:
+    """Builds a streaming response for the file at path.
+    Serves the whole file (200), the byte range asked for by the
+    request's Range header (206), or an error if that range cannot
+    be satisfied (416).
+
+    If etag (the file's current strong ETag) is given, a Range request
+    made conditional by If-Range is only honored while that ETag still
+    matches; otherwise the whole, changed, file is served.
+    """
+
+    size: int = os.path.getsize(path)
+    content_type: str = guess_content_type(path)
+
+    byte_range = None
+    range_header: str | None = request.headers.get('Range')
+    if_range: str | None = request.headers.get('If-Range')
+    if if_range is not None and if_range != etag:
+        range_header = None
+    if range_header:
+        try:
+            byte_range = parse_range_header(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{size}'
+            response.headers['Accept-Ranges'] = 'bytes'
+            return response
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        length: int = end - start + 1
+        response = FileResponse(
+            _FileRange(file, start, length),
+            status=206,
+            content_type=content_type
+        )
+        response.headers['Content-Length'] = str(length)
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response.block_size = MEDIA_BLOCK_SIZE
+    response.headers['Accept-Ranges'] = 'bytes'
+    return stream_file(request, response)
+
+
+def zip_chunks(entries):
+    """Yields a ZIP archive, chunk by chunk, of the files given by entries:
+    (name in the archive, path on disk, modification datetime) triples.
+    Files are stored uncompressed (media formats are compressed already)
+    and read in blocks, so no more than a block is held at once.  Files
+    missing from disk are left out.
+
+    As the archive is never seeked back into, each file's CRC and size
+    follow its data (in a data descriptor) rather than its header.
+    """
+
+    output = _ZipOutput()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for name, path, modified in entries:
+            try:
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with file:
+                info = zipfile.ZipInfo(name, modified.timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                # known up front, so that large files get ZIP64 headers
+                info.file_size = os.fstat(file.fileno()).st_size
+                with archive.open(info, 'w') as member:
+                    for block in iter(lambda: file.read(MEDIA_BLOCK_SIZE), b''):
+                        member.write(block)
+                        yield output.drain()
+    # the data descriptor of the last file, and the central directory
+    yield output.drain()
@@ -0,0 +1,351 @@
+"""Measures each request: its latency, SQL queries and response size.
+Used by Django as middleware (see settings.MIDDLEWARE), by api.views
+(see metrics_view, and CatalogListMixin for serializer time) and by
+api.apps, which installs the query hook.
+
+For every request, RequestMetricsMiddleware records:
+
+ - the time taken to build the response (for a streamed response, to
+   start it);
+ - the number of SQL queries run, and the time spent in them, counted
+   by a hook every database connection runs its queries through (see
+   Django's connection.execute_wrapper);
+ - the time spent serializing, excluding any queries run meanwhile;
+ - the size in bytes of the response body (for a streamed response
+   without a Content-Length, counted as it is sent).
+
+Each response reports its own figures in a Server-Timing header, for
+browser developer tools; totals per route (the URL pattern matched,
+so ids do not multiply the series) are kept in memory and served in
+the Prometheus text format by metrics_view.  Totals are per process:
+with several workers, each reports its own.
+
+Recording costs a few microseconds per request and per query.  Set
+API_METRICS = False to leave the middleware out altogether.
+
+Classes
+-------
+
+Histogram
+    Counts observations into cumulative buckets, as Prometheus does.
+
+RequestMetricsMiddleware
+    Records the metrics of each request, and adds a Server-Timing header.
+
+Functions
+---------
+
+install_query_hook
+    Makes a database connection count the queries it runs.
+
+serializing
+    Counts the time spent within it as serializer time.
+
+exposition
+    Returns the recorded metrics in the Prometheus text format.
+
+reset
+    Forgets every recorded metric.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+# Upper bounds of the buckets of each histogram
+DURATION_BUCKETS: tuple = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS: tuple = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS: tuple = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216
+)
+
+# Content type of the Prometheus text format
+EXPOSITION_CONTENT_TYPE: str = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_responses: dict = {}  # counts, by (route, method, status)
+_routes: dict = {}  # _RouteMetrics, by (route, method)
+
+# Metrics of the request being handled, if any
+_current: ContextVar = ContextVar('request_metrics', default=None)
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, as Prometheus does.
+
+    Attributes
+    ----------
+    bounds: tuple
+        Upper bounds of the buckets, ascending.
+    counts: list
+        Observations in each bucket (not cumulative), and above them all.
+    sum: float
+        Sum of the observations.
+    """
+
+    def __init__(self, bounds: tuple) -> None:
+        self.bounds: tuple = bounds
+        self.counts: list = [0] * (len(bounds) + 1)
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> list:
+        """Returns the exposition lines of the histogram, with labels."""
+
+        lines: list = []
+        total: int = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {total}')
+        return lines
+
+
+class _RouteMetrics:
+    """The totals of one route and method."""
+
+    def __init__(self) -> None:
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.db_seconds: float = 0.0
+        self.serialize_seconds: float = 0.0
+
+
+class _RequestMetrics:
+    """The figures of the request being handled."""
+
+    __slots__ = ('started', 'queries', 'db_seconds', 'serialize_seconds')
+
+    def __init__(self) -> None:
+        self.started: float = time.perf_counter()
+        self.queries: int = 0
+        self.db_seconds: float = 0.0
+        self.serialize_seconds: float = 0.0
+
+
+def _route_metrics(key: tuple) -> _RouteMetrics:
+    # with _lock held
+    metrics: _RouteMetrics | None = _routes.get(key)
+    if metrics is None:
+        metrics = _routes[key] = _RouteMetrics()
+    return metrics
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics: _RequestMetrics | None = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start: float = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_seconds += time.perf_counter() - start
+
+
+def install_query_hook(sender, connection, **kwargs) -> None:
+    """Makes a database connection count the queries it runs, towards
+    the request being handled.  Connected to the connection_created
+    signal; connections are wrapper objects kept per thread and
+    reconnected as needed, so this is a no-op after the first time.
+    """
+
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def serializing():
+    """Counts the time spent within the block, but not in the queries
+    run meanwhile, as serializer time of the request being handled.
+    """
+
+    metrics: _RequestMetrics | None = _current.get()
+    if metrics is None:
+        yield
+        return
+    start: float = time.perf_counter()
+    db_seconds: float = metrics.db_seconds
+    try:
+        yield
+    finally:
+        metrics.serialize_seconds += time.perf_counter() - start \
+            - (metrics.db_seconds - db_seconds)
+
+
+def _route(request) -> str:
+    match = request.resolver_match
+    return f'/{match.route}' if match is not None else 'unmatched'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _record_size(key: tuple, size: int) -> None:
+    with _lock:
+        _route_metrics(key).size.observe(size)
+
+
+class RequestMetricsMiddleware:
+    """Records the metrics of each request, and adds a Server-Timing
+    header to its response.  Runs synchronously or asynchronously, as
+    the rest of the chain does, so async views stay async under ASGI.
+    Should come first in MIDDLEWARE, to count the time of the rest.
+    """
+
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response) -> None:
+        if not getattr(settings, 'API_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async: bool = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = _RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = _RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics: _RequestMetrics):
+        elapsed: float = time.perf_counter() - metrics.started
+        key: tuple = (_route(request), request.method)
+
+        size: int | None = None
+        if not response.streaming:
+            size = len(response.content)
+        elif response.has_header('Content-Length'):
+            size = int(response['Content-Length'])
+        else:
+            response.streaming_content = self.counted(response, key)
+
+        with _lock:
+            status_key: tuple = key + (response.status_code,)
+            _responses[status_key] = _responses.get(status_key, 0) + 1
+            route_metrics: _RouteMetrics = _route_metrics(key)
+            route_metrics.duration.observe(elapsed)
+            route_metrics.queries.observe(metrics.queries)
+            route_metrics.db_seconds += metrics.db_seconds
+            route_metrics.serialize_seconds += metrics.serialize_seconds
+            if size is not None:
+                route_metrics.size.observe(size)
+
+        timings: list = [
+            f'db;dur={metrics.db_seconds * 1000:.3f};'
+            f'desc="{metrics.queries} queries"'
+        ]
+        if metrics.serialize_seconds:
+            timings.append(f'serialize;dur={metrics.serialize_seconds * 1000:.3f}')
+        timings.append(f'total;dur={elapsed * 1000:.3f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+    @staticmethod
+    def counted(response, key: tuple):
+        """Returns the streaming content of the response, counting the
+        bytes of it sent; the size is recorded once it is all sent.
+        """
+
+        content = response.streaming_content
+        if response.is_async:
+            async def count():
+                sent: int = 0
+                try:
+                    async for part in content:
+                        sent += len(part)
+                        yield part
+                finally:
+                    _record_size(key, sent)
+        else:
+            def count():
+                sent: int = 0
+                try:
+                    for part in content:
+                        sent += len(part)
+                        yield part
+                finally:
+                    _record_size(key, sent)
+        return count()
+
+
+def exposition() -> str:
+    """Returns the recorded metrics in the Prometheus text format."""
+
+    with _lock:
+        responses: list = sorted(_responses.items())
+        routes: list = sorted(_routes.items())
+        lines: list = [
+            '# HELP http_responses_total Responses sent, by route and status.',
+            '# TYPE http_responses_total counter',
+        ]
+        for (route, method, status), count in responses:
+            lines.append(
+                f'http_responses_total{{route="{_escape(route)}",'
+                f'method="{method}",status="{status}"}} {count}'
+            )
+        families: list = [
+            ('http_request_duration_seconds', 'histogram',
+             'Time to build each response.',
+             lambda metrics: metrics.duration),
+            ('http_request_db_queries', 'histogram',
+             'SQL queries run per request.',
+             lambda metrics: metrics.queries),
+            ('http_response_size_bytes', 'histogram',
+             'Size of each response body.',
+             lambda metrics: metrics.size),
+            ('http_request_db_seconds_total', 'counter',
+             'Time spent in SQL queries.',
+             lambda metrics: metrics.db_seconds),
+            ('http_request_serialize_seconds_total', 'counter',
+             'Time spent serializing, queries excluded.',
+             lambda metrics: metrics.serialize_seconds),
+        ]
+        for name, kind, description, read in families:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (route, method), metrics in routes:
+                labels: str = f'route="{_escape(route)}",method="{method}"'
+                value = read(metrics)
+                if kind == 'histogram':
+                    lines += value.lines(name, labels)
+                else:
+                    lines.append(f'{name}{{{labels}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset() -> None:
+    """Forgets every recorded metric."""
+
+    with _lock:
+        _responses.clear()
+        _routes.clear()
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:18
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppUser',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('username', models.CharField(max_length=25, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Image',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.ImageField(max_length=1000, upload_to='')),
+                ('description', models.CharField(default='', max_length=1400)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.appuser')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=25)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.appuser')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ImageTag',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.image')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.tag')),
+            ],
+        ),
+    ]
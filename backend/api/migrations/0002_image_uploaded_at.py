@@ -0,0 +1,23 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='uploaded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['uploaded_at', 'id'], name='api_image_upload_order_idx'),
+        ),
+    ]
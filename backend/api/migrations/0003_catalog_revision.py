@@ -0,0 +1,40 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_revisions(apps, schema_editor):
+    # Existing users need a revision to count their changes against;
+    # new users are given one when created (see api.signals)
+    AppUser = apps.get_model('api', 'AppUser')
+    CatalogRevision = apps.get_model('api', 'CatalogRevision')
+    CatalogRevision.objects.bulk_create(
+        CatalogRevision(owner_id=user_id)
+        for user_id in AppUser.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_image_uploaded_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogRevision',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='api.appuser')),
+                ('revision', models.PositiveBigIntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(create_revisions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='byte_size',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='mime_type',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='image',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+    ]
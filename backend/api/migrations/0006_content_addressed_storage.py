@@ -0,0 +1,19 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:26
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_image_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='image',
+            name='source',
+            field=models.ImageField(max_length=1000, storage=api.storage.ContentAddressedStorage(), upload_to=''),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='perceptual_hash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
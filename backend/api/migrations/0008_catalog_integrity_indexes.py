@@ -0,0 +1,48 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:35
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_imagetags(apps, schema_editor):
+    # Keep one ImageTag per (image, tag) pair, so the unique constraint
+    # below can be added; which one is kept makes no difference
+    ImageTag = apps.get_model('api', 'ImageTag')
+    duplicates = ImageTag.objects.values('image_id', 'tag_id') \
+        .annotate(count=Count('id'), keep=Min('id')) \
+        .filter(count__gt=1)
+    for duplicate in duplicates.iterator():
+        ImageTag.objects.filter(
+            image_id=duplicate['image_id'],
+            tag_id=duplicate['tag_id']
+        ).exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_image_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['owner', 'uploaded_at', 'id'], name='api_image_owner_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagetag',
+            index=models.Index(fields=['tag', 'image'], name='api_imagetag_tag_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['owner', 'name'], name='api_tag_owner_name_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_imagetags,
+            migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='imagetag',
+            constraint=models.UniqueConstraint(fields=('image', 'tag'), name='api_imagetag_unique_image_tag'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.16 on 2026-10-17 19:37
+
+import api.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_catalog_integrity_indexes'),
+    ]
+
+    # The columns are left as they are: CompactUUIDField stores values
+    # as UUIDField does until settings.COMPACT_UUID_KEYS is enabled, and
+    # existing data must then be converted with convert_uuid_keys
+    # (converting here would truncate the existing CHAR(32) keys)
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='appuser',
+                name='id',
+                field=api.fields.CompactUUIDField(default=api.fields.new_uuid, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='image',
+                name='id',
+                field=api.fields.CompactUUIDField(default=api.fields.new_uuid, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='imagetag',
+                name='id',
+                field=api.fields.CompactUUIDField(default=api.fields.new_uuid, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='job',
+                name='id',
+                field=api.fields.CompactUUIDField(default=api.fields.new_uuid, editable=False, primary_key=True, serialize=False),
+            ),
+            migrations.AlterField(
+                model_name='tag',
+                name='id',
+                field=api.fields.CompactUUIDField(default=api.fields.new_uuid, editable=False, primary_key=True, serialize=False),
+            ),
+        ]),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.16 on 2026-10-17 20:12
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # The full-text index of Image.description (see api.search); a
+    # FULLTEXT index on MySQL, or an FTS5 table on SQLite, filled from
+    # the existing rows.  Other databases are left without one
+    connection = schema_editor.connection
+    if connection.vendor == 'mysql':
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX api_image_description_ft "
+            "ON api_image (description)"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_image_search USING fts5("
+            "description, image_id UNINDEXED, owner_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        schema_editor.execute(
+            "INSERT INTO api_image_search (description, image_id, owner_id) "
+            "SELECT description, id, owner_id FROM api_image"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'mysql':
+        schema_editor.execute(
+            "DROP INDEX api_image_description_ft ON api_image"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE api_image_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_compact_uuid_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
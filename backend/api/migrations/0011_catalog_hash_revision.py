@@ -0,0 +1,18 @@
+# Generated by Django 5.2.16 on 2026-10-17 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_image_description_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogrevision',
+            name='hashes',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
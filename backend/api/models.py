@@ -31,10 +31,28 @@ ImageTag
     Objects of this class represent an association between an Image
     and a Tag; in other words, any time a Tag is assigned to an Image,
     and ImageTag is created to signify this relationship.
+
+CatalogRevision
+    Counts changes to the Images, Tags and ImageTags of an AppUser.
+    Extends Django's model.Model class.
+
+    The revision is bumped (see api.signals) whenever any of an owner's
+    catalog data changes, so API responses can be validated against it
+    cheaply rather than by re-reading the data itself.
+
+Job
+    Identifies a unit of background work, such as processing an Image.
+    Extends Django's model.Model class.
+
+    Jobs are queued in the database and carried out by worker processes
+    (see api.jobs and the run_workers management command), so that slow
+    work need not hold up the request that caused it.
 """
 
-import uuid
 from django.db import models
+from django.utils import timezone
+from .fields import CompactUUIDField, new_uuid
+from .storage import ContentAddressedStorage
 
 
 # Create your models here.
@@ -48,7 +66,7 @@ class AppUser(models.Model):
         The user-defined screen name.
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=new_uuid, editable=False)
     username = models.CharField(max_length=25, unique=True)
 
 
@@ -66,15 +84,79 @@ class Image(models.Model):
     ----------
     source: str
         The path on persistent storage of the Image.
+        New files are stored by content (see api.storage), so Images
+        with identical media share a single file.
     owner: AppUser
     description: str
         A user-defined text description of the media.
+    uploaded_at: datetime
+        When the media was added to the app.  Together with id, this
+        forms the (indexed) sort key used to paginate Image listings.
+    sha256: str
+        Hex digest of the media file's contents; empty until computed.
+    width: int
+        Width of the media in pixels, as displayed; None if unknown.
+    height: int
+        Height of the media in pixels, as displayed; None if unknown.
+    byte_size: int
+        Size of the media file in bytes; None if unknown.
+    mime_type: str
+        MIME type detected from the media file's contents.
+    perceptual_hash: int
+        64-bit difference hash of the image (see api.media.dhash),
+        stored signed; None for media that is not a still image.  Near
+        duplicates have hashes a small Hamming distance apart.
+
+    Content hash, dimensions, size, type and perceptual hash are found when the media is
+    ingested (see api.tasks), or by the backfill_image_metadata command.
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    source = models.ImageField(max_length=1000)
+    id = CompactUUIDField(primary_key=True, default=new_uuid, editable=False)
+    source = models.ImageField(
+        max_length=1000,
+        storage=ContentAddressedStorage()
+    )
     owner = models.ForeignKey(AppUser, on_delete=models.CASCADE)
     description = models.CharField(max_length=1400, default='')
+    uploaded_at = models.DateTimeField(default=timezone.now, editable=False)
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        editable=False,
+        db_index=True
+    )
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    byte_size = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        editable=False
+    )
+    mime_type = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False
+    )
+    perceptual_hash = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['uploaded_at', 'id'],
+                name='api_image_upload_order_idx'
+            ),
+            # owner-scoped listings, in the same order
+            models.Index(
+                fields=['owner', 'uploaded_at', 'id'],
+                name='api_image_owner_order_idx'
+            )
+        ]
 
 
 class Tag(models.Model):
@@ -91,10 +173,16 @@ class Tag(models.Model):
     owner: AppUser
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=new_uuid, editable=False)
     name = models.CharField(max_length=25)
     owner = models.ForeignKey(AppUser, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # finding an owner's Tag by name
+            models.Index(fields=['owner', 'name'], name='api_tag_owner_name_idx')
+        ]
+
 
 class ImageTag(models.Model):
     """Identifies an association between an Image object and a Tag object.
@@ -102,7 +190,8 @@ class ImageTag(models.Model):
 
     Objects of this class represent an association between an Image
     and a Tag; in other words, any time a Tag is assigned to an Image,
-    and ImageTag is created to signify this relationship.
+    and ImageTag is created to signify this relationship.  A Tag is
+    assigned to a given Image at most once.
 
     Attributes
     ----------
@@ -110,6 +199,112 @@ class ImageTag(models.Model):
     tag_id: Tag
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = CompactUUIDField(primary_key=True, default=new_uuid, editable=False)
     image = models.ForeignKey(Image, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            # also serves as the index from an Image to its Tags
+            models.UniqueConstraint(
+                fields=['image', 'tag'],
+                name='api_imagetag_unique_image_tag'
+            )
+        ]
+        indexes = [
+            # from a Tag to its Images
+            models.Index(fields=['tag', 'image'], name='api_imagetag_tag_image_idx')
+        ]
+
+
+class CatalogRevision(models.Model):
+    """Counts changes to the Images, Tags and ImageTags of an AppUser.
+    Extends Django's model.Model class.
+
+    The revision is bumped (see api.signals) whenever any of an owner's
+    catalog data changes, so API responses can be validated against it
+    cheaply rather than by re-reading the data itself.
+
+    Attributes
+    ----------
+    owner: AppUser
+    revision: int
+        Incremented on every change to the owner's catalog.
+    modified: datetime
+        When the owner's catalog last changed.
+    hashes: int
+        Incremented whenever the owner's Images are added, removed or
+        given a perceptual hash (see api.similarity).
+    """
+
+    owner = models.OneToOneField(
+        AppUser,
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    revision = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+    hashes = models.PositiveBigIntegerField(default=0)
+
+
+class Job(models.Model):
+    """Identifies a unit of background work, such as processing an Image.
+    Extends Django's model.Model class.
+
+    Jobs are queued in the database and carried out by worker processes
+    (see api.jobs and the run_workers management command), so that slow
+    work need not hold up the request that caused it.
+
+    Attributes
+    ----------
+    kind: str
+        Name of the handler that carries out the job (see api.jobs).
+    key: str
+        Identifies the work itself; queueing the same key twice
+        results in a single job.
+    payload: dict
+        Arguments passed to the handler.
+    status: str
+        One of pending, running, done or failed.
+    attempts: int
+        Times the job has been started.
+    run_after: datetime
+        The job is not started before this time (used to back off
+        between retries).
+    locked_by: str
+        Identifies the worker running the job, if any.
+    locked_at: datetime
+        When the job was last started.
+    last_error: str
+        Traceback of the latest failed attempt.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    id = CompactUUIDField(primary_key=True, default=new_uuid, editable=False)
+    kind = models.CharField(max_length=50)
+    key = models.CharField(max_length=255, unique=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'],
+                name='api_job_queue_idx'
+            )
+        ]
@@ -0,0 +1,189 @@
+"""Pagination for API-delivered lists.
+
+Classes
+-------
+
+KeysetPagination
+    Paginates a queryset by an opaque cursor over a unique, indexed
+    sort key (for instance Image.uploaded_at plus Image.id).
+    Extends restframework's pagination.BasePagination.
+
+    Unlike offset pagination, fetching a page never requires the
+    database to count or skip over earlier rows, so page N costs the
+    same as page 1.
+"""
+
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginates a queryset by an opaque cursor over a unique sort key.
+    Extends restframework's pagination.BasePagination.
+
+    The cursor encodes the sort key values of the row at the edge of the
+    current page, and the direction to read in.  Each page is then a
+    single indexed range scan: "rows ordered after this position,
+    limit page_size".
+
+    Responses are of the form:
+    {
+      "next": URL of the following page, or null,
+      "previous": URL of the preceding page, or null,
+      "results": [...]
+    }
+
+    Attributes
+    ----------
+    ordering: tuple[str]
+        Model fields to order by, as accepted by QuerySet.order_by.
+        The combination of fields must be unique; the last field should
+        be a tie-breaker such as the primary key.
+    page_size: int
+        Number of results returned when the client does not specify.
+    max_page_size: int
+        Upper bound on the page size a client can request.
+    """
+
+    ordering: tuple = ('-uploaded_at', '-id')
+    page_size: int = 50
+    max_page_size: int = 500
+    cursor_query_param: str = 'cursor'
+    page_size_query_param: str = 'page_size'
+    invalid_cursor_message: str = 'Invalid cursor.'
+
+    def read_window(self, request, model) -> tuple:
+        """Returns (reverse, position, limit) for the page the request
+        asks for: whether it is read backwards, the sort key values it
+        is read from (None for the first page), and the most rows read.
+        For views that narrow their queryset to a page's worth of rows
+        before it is paginated.  Raises NotFound for invalid cursors.
+        """
+
+        self.page_size = self.get_page_size(request)
+        self.fields: list = [
+            model._meta.get_field(name.lstrip('-')) for name in self.ordering
+        ]
+        reverse, position = self.decode_cursor(request)
+        return reverse, position, self.page_size + 1
+
+    def paginate_queryset(self, queryset, request, view=None) -> list:
+        self.request = request
+        self.base_url: str = request.build_absolute_uri()
+        reverse, position, _ = self.read_window(request, queryset.model)
+        ordering: list = [
+            self._invert(name) if reverse else name for name in self.ordering
+        ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        # fetch one extra row to find out whether there is another page
+        results: list = list(queryset[:self.page_size + 1])
+        has_more: bool = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        # rows beyond the first or last result only exist if we either
+        # found an extra row, or arrived here from the other direction
+        if reverse:
+            has_next, has_previous = position is not None, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        self.next_position = \
+            self._position(results[-1]) if has_next and results else None
+        self.previous_position = \
+            self._position(results[0]) if has_previous and results else None
+        return results
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
+
+    def get_next_link(self) -> str | None:
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(False, self.next_position)
+
+    def get_previous_link(self) -> str | None:
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(True, self.previous_position)
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, reverse: bool, position: list) -> str:
+        """Builds the URL for a page, given the position to read from."""
+
+        payload: bytes = json.dumps({'r': int(reverse), 'p': position}).encode()
+        cursor: str = b64encode(payload, altchars=b'-_').decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request) -> tuple:
+        """Returns (reverse, position) from the request's cursor param.
+        position is None when no cursor was given (i.e. the first page).
+        Raises NotFound for cursors that cannot be decoded.
+        """
+
+        encoded: str | None = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            payload: dict = json.loads(
+                b64decode(encoded.encode('ascii'), altchars=b'-_')
+            )
+            reverse = bool(payload['r'])
+            position: list = [
+                field.to_python(value)
+                for field, value in zip(self.fields, payload['p'], strict=True)
+            ]
+        except (
+            BinasciiError, UnicodeError, ValueError, KeyError, TypeError,
+            ValidationError
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def _position(self, instance) -> list:
+        return [field.value_to_string(instance) for field in self.fields]
+
+    def _after(self, ordering: list, position: list) -> Q:
+        """Filters rows sorted after position, for the given ordering.
+        For ordering (a, b) that is: a > a0 OR (a = a0 AND b > b0)
+        (with "<" in place of ">" for descending fields).
+        """
+
+        condition = Q()
+        for index, name in enumerate(ordering):
+            lookup: str = 'lt' if name.startswith('-') else 'gt'
+            field_name: str = name.lstrip('-')
+            clause = Q(**{f'{field_name}__{lookup}': position[index]})
+            for earlier, value in zip(ordering[:index], position[:index]):
+                clause &= Q(**{earlier.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    @staticmethod
+    def _invert(name: str) -> str:
+        return name[1:] if name.startswith('-') else f'-{name}'
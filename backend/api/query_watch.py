@@ -0,0 +1,199 @@
+"""Watches the SQL each request runs, for development and CI.
+Used by Django as middleware (see settings.MIDDLEWARE), by api.urls to
+declare query budgets, and by api.apps, which installs the query hook.
+
+With QUERY_WATCH on, QueryWatchMiddleware records every query a
+request runs (through a hook on each database connection, as
+api.metrics counts them) and, once the view has returned:
+
+ - warns of queries of the same shape run REPEATS times or more, the
+   mark of an N+1 pattern (a query per row, often a lazily loaded
+   related object such as tag.owner);
+ - warns of queries that took SLOW_MS milliseconds or more;
+ - checks the number of queries against the budget declared for the
+   view with query_budget, if any.
+
+Queries of the same shape differ only in their parameters: literals,
+and the number of items in IN (...) lists, are ignored.
+
+A view over its budget is logged, or with QUERY_WATCH_STRICT (as when
+testing) fails the request with QueryBudgetExceeded, which the test
+client raises in the test; so a change that makes a view run more
+queries fails the suite until it is fixed, or the budget raised.
+
+Queries run while a streamed response is being sent are not counted.
+Warnings go to the "api.query_watch" logger.
+
+Classes
+-------
+
+QueryBudgetExceeded
+    Raised when a view runs more queries than its budget.
+    Extends AssertionError, so tests report it as a failure.
+
+QueryWatchMiddleware
+    Records the queries of each request, and checks them.
+
+Functions
+---------
+
+query_budget
+    Declares the most queries a view may run per request.
+
+query_shape
+    Returns the SQL of a query with its parameters left out.
+
+install_query_hook
+    Makes a database connection report the queries it runs.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the QUERY_WATCH_REPEATS and QUERY_WATCH_SLOW_MS settings
+DEFAULT_REPEATS: int = 5
+DEFAULT_SLOW_MS: float = 100.0
+
+# Parts of a query that vary with its parameters
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+# Queries of the request being handled, as (sql, seconds), if watched
+_current: ContextVar = ContextVar('watched_queries', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a view runs more queries than its budget."""
+
+
+def query_budget(queries: int):
+    """Declares the most queries a view may run per request; decorates
+    a view function (or the result of as_view).  The budget is kept on
+    the function, so holds wherever it is routed.
+    """
+
+    def declare(view):
+        view.query_budget = queries
+        return view
+
+    return declare
+
+
+def query_shape(sql: str) -> str:
+    """Returns the SQL of a query with its parameters left out, so that
+    queries differing only in those compare equal.
+    """
+
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+def _watch_query(execute, sql, params, many, context):
+    queries: list | None = _current.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start: float = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.append((sql, time.perf_counter() - start))
+
+
+def install_query_hook(sender, connection, **kwargs) -> None:
+    """Makes a database connection report the queries it runs, for the
+    request being handled.  Connected to the connection_created signal
+    while QUERY_WATCH is on; a no-op after the first time.
+    """
+
+    if _watch_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_watch_query)
+
+
+class QueryWatchMiddleware:
+    """Records the queries of each request, and checks them for
+    repeated shapes, slow queries and an overspent budget.  Runs
+    synchronously or asynchronously, as the rest of the chain does.
+    """
+
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response) -> None:
+        if not getattr(settings, 'QUERY_WATCH', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async: bool = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries: list = []
+        token = _current.set(queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.check(request, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries: list = []
+        token = _current.set(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.check(request, queries)
+        return response
+
+    @staticmethod
+    def check(request, queries: list) -> None:
+        """Warns of repeated and slow queries, and fails (or warns of) a
+        view over its query budget.
+        """
+
+        match = request.resolver_match
+        view: str = f'{request.method} /{match.route}' if match is not None \
+            else f'{request.method} {request.path}'
+
+        repeats: int = getattr(settings, 'QUERY_WATCH_REPEATS', DEFAULT_REPEATS)
+        repeated: list = [
+            (shape, count) for shape, count
+            in Counter(query_shape(sql) for sql, _ in queries).most_common()
+            if count >= repeats
+        ]
+        for shape, count in repeated:
+            logger.warning(
+                "%s ran the same query %d times (N+1?): %s", view, count, shape
+            )
+        slow_ms: float = getattr(settings, 'QUERY_WATCH_SLOW_MS', DEFAULT_SLOW_MS)
+        for sql, seconds in queries:
+            if seconds * 1000 >= slow_ms:
+                logger.warning(
+                    "%s ran a query taking %.1fms: %s", view, seconds * 1000, sql
+                )
+
+        budget: int | None = getattr(
+            getattr(match, 'func', None), 'query_budget', None
+        )
+        if budget is None or len(queries) <= budget:
+            return
+        message: str = "\n".join(
+            [f"{view} ran {len(queries)} queries, over its budget of {budget}:"]
+            + [f"{number}. {sql}" for number, (sql, _) in enumerate(queries, 1)]
+        )
+        if getattr(settings, 'QUERY_WATCH_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
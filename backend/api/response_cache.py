@@ -0,0 +1,92 @@
+"""A cache of rendered responses from the catalog list views.
+Used by api.conditional.
+
+Each response body is stored, as the JSON bytes sent to the client,
+under a key made of the endpoint, the query parameters and the token
+of the catalog revision the response was rendered at (see
+api.revisions).  Revisions are bumped by signals whenever an Image,
+Tag or ImageTag of the owner is saved or deleted, so a change to a
+catalog moves every request for it onto new keys; stale entries are
+never looked up again and simply expire.  Requests for one owner's
+catalog are keyed by that owner's revision only, so changes to other
+catalogs leave their cached lists alone.
+
+A cache hit returns the stored bytes without running the view: no
+queryset is evaluated and nothing is serialized.  Only the revision
+token, which the conditional GET check reads anyway, is fetched.
+
+Entries live in Django's default cache (see settings.CACHES): local
+memory per process unless a shared cache is configured.
+
+Functions
+---------
+
+cache_key
+    Returns the cache key of a list request at a catalog revision.
+
+fetch
+    Returns a cached response for a list request, if there is one.
+
+store
+    Caches the body of a list response once it has been rendered.
+"""
+
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+KEY_PREFIX: str = 'api-list'
+
+
+def cache_key(request, token: str) -> str:
+    """Returns the cache key of the list request at the catalog revision
+    described by token.  Responses include absolute links (see
+    api.pagination), so the scheme and host are part of the key.
+    """
+
+    query: list = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+    )
+    identity: str = repr((request.build_absolute_uri(request.path), query))
+    digest: str = hashlib.sha256(identity.encode()).hexdigest()
+    return f'{KEY_PREFIX}:{token}:{digest}'
+
+
+def fetch(request, token: str) -> HttpResponse | None:
+    """Returns the cached response to the list request at the catalog
+    revision described by token, or None if it is not cached.
+    """
+
+    cached: tuple | None = cache.get(cache_key(request, token))
+    if cached is None:
+        return None
+    content_type, content = cached
+    return HttpResponse(content, content_type=content_type)
+
+
+def store(request, token: str, response) -> None:
+    """Caches the body of a successful response to the list request, at
+    the catalog revision described by token.  Responses of Django REST
+    Framework views are rendered after the view returns, so they are
+    stored once rendered.
+    """
+
+    if response.status_code != 200:
+        return
+    key: str = cache_key(request, token)
+    timeout: int = getattr(settings, 'API_LIST_CACHE_TIMEOUT', 300)
+
+    def save(rendered) -> None:
+        cache.set(
+            key,
+            (rendered.headers['Content-Type'], rendered.content),
+            timeout
+        )
+
+    if hasattr(response, 'add_post_render_callback'):
+        response.add_post_render_callback(save)
+    else:
+        save(response)
@@ -0,0 +1,199 @@
+"""Reads and bumps the per-owner catalog revision counters.
+See api.models.CatalogRevision for details.
+
+The revision of an owner's catalog changes whenever any of their
+Images, Tags or ImageTags change, so it can stand in for the data
+itself when checking whether a client's copy is still current.
+
+A second counter, of the owner's perceptual hashes, changes only when
+the set of those does (as Images are added, removed or hashed), so
+the near-duplicate index (see api.similarity) outlives edits to Tags.
+
+Within batch, bumps are collected rather than made, and each owner's
+revision is bumped once as the batch ends: a change made row by row
+(such as a delete, which sends a signal per row it cascades to) then
+costs a query or two, rather than one per row.
+
+Functions
+---------
+
+batch
+    Collects the bumps made within it, to make them once at its end.
+
+bump
+    Marks the catalog of the given owner as changed.
+
+bump_for_tag
+    Marks the catalog of the owner of the given Tag as changed.
+
+bump_hashes
+    Marks the perceptual hashes of the given owner as changed.
+
+current
+    Returns a token and modification time describing a catalog.
+
+revision_of
+    Returns the revision number of the catalog of the given owner.
+
+hash_revision_of
+    Returns the revision number of the perceptual hashes of an owner.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from uuid import UUID
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+from .models import CatalogRevision, Tag
+
+# Bumps collected by the batch in progress, if any
+_batch: ContextVar = ContextVar('revision_batch', default=None)
+
+
+class _Batch:
+    """The owners whose revisions (and hashes) are to be bumped."""
+
+    def __init__(self, tag_owners: dict) -> None:
+        self.owners: set = set()
+        self.hashes: set = set()
+        self.tag_owners: dict = tag_owners
+
+
+@contextmanager
+def batch(tag_owners: dict | None = None):
+    """Collects the bumps made within the block, then bumps the revision
+    of each owner concerned once, in a single query, as it ends (so
+    within any transaction it is in).  Bumps by Tag are resolved to
+    owners as they are made, while the Tag still exists; tag_owners
+    maps the ids of Tags whose owners the caller knows to those,
+    sparing the lookups.  Within another batch, joins it.
+    """
+
+    known: dict = {
+        str(tag_id): owner_id for tag_id, owner_id in (tag_owners or {}).items()
+    }
+    outer: _Batch | None = _batch.get()
+    if outer is not None:
+        outer.tag_owners.update(known)
+        yield
+        return
+    collected = _Batch(known)
+    token = _batch.set(collected)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    # a single query, unless only some owners' hashes changed
+    hashes_too: bool = bool(collected.owners) \
+        and collected.owners <= collected.hashes
+    if collected.owners:
+        changes: dict = {
+            'revision': F('revision') + 1, 'modified': timezone.now()
+        }
+        if hashes_too:
+            changes['hashes'] = F('hashes') + 1
+        CatalogRevision.objects.filter(owner_id__in=collected.owners) \
+            .update(**changes)
+    hashes_only: set = collected.hashes - collected.owners if hashes_too \
+        else collected.hashes
+    if hashes_only:
+        CatalogRevision.objects.filter(owner_id__in=hashes_only).update(
+            hashes=F('hashes') + 1
+        )
+
+
+def bump(owner_id: UUID, hashes: bool = False) -> None:
+    """Marks the catalog of the given owner as changed; with hashes,
+    their perceptual hashes too, within the same query.
+    """
+
+    collected: _Batch | None = _batch.get()
+    if collected is not None:
+        collected.owners.add(str(owner_id))
+        if hashes:
+            collected.hashes.add(str(owner_id))
+        return
+    changes: dict = {'revision': F('revision') + 1, 'modified': timezone.now()}
+    if hashes:
+        changes['hashes'] = F('hashes') + 1
+    CatalogRevision.objects.filter(owner_id=owner_id).update(**changes)
+
+
+def bump_for_tag(tag_id: UUID) -> None:
+    """Marks the catalog of the owner of the given Tag as changed.
+    Resolves the owner within the same query, which saves a lookup
+    when all that is known is the id of a Tag (as with ImageTags).
+    """
+
+    collected: _Batch | None = _batch.get()
+    if collected is not None:
+        if str(tag_id) not in collected.tag_owners:
+            collected.tag_owners[str(tag_id)] = Tag.objects.filter(
+                id=tag_id
+            ).values_list('owner_id', flat=True).first()
+        owner_id = collected.tag_owners[str(tag_id)]
+        if owner_id is not None:
+            collected.owners.add(str(owner_id))
+        return
+    CatalogRevision.objects.filter(owner__tag__id=tag_id).update(
+        revision=F('revision') + 1,
+        modified=timezone.now()
+    )
+
+
+def bump_hashes(owner_id: UUID) -> None:
+    """Marks the perceptual hashes of the given owner as changed, while
+    their catalog (as clients see it) is not.
+    """
+
+    collected: _Batch | None = _batch.get()
+    if collected is not None:
+        collected.hashes.add(str(owner_id))
+        return
+    CatalogRevision.objects.filter(owner_id=owner_id).update(
+        hashes=F('hashes') + 1
+    )
+
+
+def current(owner_id: UUID | None = None) -> tuple[str, datetime | None]:
+    """Returns (token, modified) describing the state of a catalog.
+    The token changes whenever the catalog does; modified is the time
+    of the latest change.  Without an owner_id, describes the combined
+    catalogs of all owners.
+    """
+
+    revisions = CatalogRevision.objects.all()
+    if owner_id is not None:
+        revisions = revisions.filter(owner_id=owner_id)
+    summary: dict = revisions.aggregate(
+        count=Count('pk'),
+        total=Sum('revision'),
+        modified=Max('modified')
+    )
+    modified: datetime | None = summary['modified']
+    stamp: str = f"{modified.timestamp():.6f}" if modified else '0'
+    return f"{summary['count']}-{summary['total'] or 0}-{stamp}", modified
+
+
+def revision_of(owner_id: UUID) -> int:
+    """Returns the revision number of the catalog of the given owner
+    (0 if they have no CatalogRevision).  Unlike the token returned by
+    current, this tells how many changes were made between two reads.
+    """
+
+    revision: int | None = CatalogRevision.objects.filter(
+        owner_id=owner_id
+    ).values_list('revision', flat=True).first()
+    return revision or 0
+
+
+def hash_revision_of(owner_id: UUID) -> int:
+    """Returns the revision number of the perceptual hashes of the given
+    owner's Images (0 if they have no CatalogRevision).
+    """
+
+    revision: int | None = CatalogRevision.objects.filter(
+        owner_id=owner_id
+    ).values_list('hashes', flat=True).first()
+    return revision or 0
@@ -0,0 +1,139 @@
+"""Routes the reads of read-only views to replica databases.
+Used by api.views, and by Django as a database router and middleware
+(see settings.DATABASE_ROUTERS and settings.MIDDLEWARE).
+
+Browsing the catalog is almost all reads, and on the primary database
+those compete with every edit.  Views that only read (the catalog
+lists, and image_view's lookup of an Image) run their queries within
+replica_reads, which sends them to one of settings.DATABASE_REPLICAS,
+picked at random for each request so that all of its reads see the
+same replica.  Everything else reads from the primary, and all writes
+go to the primary.
+
+Replicas lag behind the primary, so a client that has just changed
+something could miss the change on its next read.  To prevent that:
+
+ - a request whose method may change something (anything but GET,
+   HEAD and OPTIONS) and succeeds pins its client to the primary for
+   REPLICA_PIN_SECONDS, by a cookie set by PrimaryPinMiddleware;
+ - once anything has been written within replica_reads, the rest of
+   its reads go to the primary (writes made on the primary by name,
+   as of hashes stored on first use, are exempt).
+
+Without DATABASE_REPLICAS, every query goes to the primary.
+
+Classes
+-------
+
+ReplicaRouter
+    Sends reads within replica_reads to a replica, and writes to the
+    primary.
+
+PrimaryPinMiddleware
+    Pins a client to the primary for a while after it changes something.
+
+Functions
+---------
+
+replica_reads
+    Routes the reads made within it to a replica, unless pinned.
+
+pinned
+    Tells whether a request's client is pinned to the primary.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+# Cookie pinning a client to the primary; holds the time the pin ends
+PIN_COOKIE: str = 'primary_pin'
+
+# Methods that cannot change anything, so never pin a client
+SAFE_METHODS: tuple = ('GET', 'HEAD', 'OPTIONS')
+
+# Replica the reads of the current request go to, if any
+_replica: ContextVar = ContextVar('replica', default=None)
+
+
+def replicas() -> list:
+    """Returns the aliases of the replica databases."""
+
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_seconds() -> float:
+    return float(getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def pinned(request) -> bool:
+    """Tells whether the client of the request is pinned to the primary,
+    having changed something within the last REPLICA_PIN_SECONDS.
+    """
+
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def replica_reads(request):
+    """Routes reads made within the block to a replica, unless there are
+    none or the client of the request is pinned to the primary.
+    """
+
+    aliases: list = replicas()
+    if not aliases or pinned(request):
+        yield
+        return
+    token = _replica.set(random.choice(aliases))
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Sends reads within replica_reads to a replica, and writes to the
+    primary.  Other reads are left to Django (so go to the primary, or
+    wherever the instance they relate to was read from).
+    """
+
+    def db_for_read(self, model, **hints) -> str | None:
+        return _replica.get()
+
+    def db_for_write(self, model, **hints) -> str:
+        # reads after a write see it
+        _replica.set(None)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool | None:
+        # replicas hold the same rows as the primary
+        databases: set = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class PrimaryPinMiddleware(MiddlewareMixin):
+    """Pins a client to the primary for REPLICA_PIN_SECONDS after a
+    request of theirs that may have changed something succeeds.
+    """
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 \
+                and replicas():
+            seconds: float = pin_seconds()
+            response.set_cookie(
+                PIN_COOKIE,
+                f'{time.time() + seconds:.3f}',
+                max_age=seconds,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
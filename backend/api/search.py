@@ -0,0 +1,206 @@
+"""Full-text search of Image descriptions.
+Used by api.views (see search_view).
+
+Searches are answered from an inverted index of the words of each
+description, rather than by scanning every description for the text:
+
+ - On MySQL, a FULLTEXT index on api_image.description, which InnoDB
+   keeps up to date as rows change.  Queries are run in boolean mode.
+ - On SQLite (as used by the tests), an FTS5 table, api_image_search,
+   holding the description, id and owner of each Image.  It is kept up
+   to date through index_images: when an Image is saved or deleted
+   (see api.signals), and after Images are created in bulk.
+
+Both indexes are created by migration 0010_image_description_search.
+
+Each word of a query matches words it is a prefix of ("cat" matches
+"cats" and "category"), and an Image matches if its description holds
+a match for every word.  Matches are ranked by relevance (BM25 on
+SQLite, InnoDB's own score on MySQL), then by id; pages of matches are
+read by keyset over that (score, id) pair, so later pages cost no more
+than the first.
+
+Functions
+---------
+
+query_terms
+    Splits the text of a query into the words to search for.
+
+index_images
+    Updates the index entries of Images (on SQLite).
+
+search
+    Returns a page of the Images matching a query.
+
+encode_cursor
+    Encodes the position of a match as an opaque cursor.
+
+decode_cursor
+    Decodes a cursor made by encode_cursor.
+"""
+
+import json
+import re
+from base64 import b64decode, b64encode
+from uuid import UUID
+from django.db import connection
+from django.db.utils import NotSupportedError
+from .models import Image
+
+# Database vendors with a full-text index
+SEARCH_VENDORS: tuple = ('mysql', 'sqlite')
+
+# Name of the FTS5 table indexing descriptions on SQLite
+SQLITE_INDEX_TABLE: str = 'api_image_search'
+
+# Words of a query beyond this many are ignored
+MAX_QUERY_TERMS: int = 16
+
+# Query words, as both indexes split text into them
+_WORD = re.compile(r'\w+')
+
+
+def query_terms(text: str) -> list:
+    """Splits the text of a query into (lowercased) words, dropping
+    punctuation and any operators of the index's query syntax.
+    """
+
+    return [word.lower() for word in _WORD.findall(text)][:MAX_QUERY_TERMS]
+
+
+def _check_vendor() -> None:
+    if connection.vendor not in SEARCH_VENDORS:
+        raise NotSupportedError(
+            f"Full-text search is not supported on {connection.vendor}."
+        )
+
+
+def _db_value(field_name: str, value):
+    """Returns value as stored in column field_name of api_image."""
+
+    return Image._meta.get_field(field_name) \
+        .get_db_prep_value(value, connection)
+
+
+def index_images(image_ids) -> None:
+    """Updates the index entries of the Images with the given ids to
+    match their rows, removing those of Images that no longer exist.
+    Only needed on SQLite; MySQL keeps its index up to date itself.
+    """
+
+    if connection.vendor != 'sqlite':
+        return
+    keys: list = [_db_value('id', image_id) for image_id in image_ids]
+    table: str = Image._meta.db_table
+    with connection.cursor() as cursor:
+        # SQLite limits the number of parameters to a statement
+        for start in range(0, len(keys), 500):
+            batch: list = keys[start:start + 500]
+            placeholders: str = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f"DELETE FROM {SQLITE_INDEX_TABLE} "
+                f"WHERE image_id IN ({placeholders})",
+                batch
+            )
+            cursor.execute(
+                f"INSERT INTO {SQLITE_INDEX_TABLE} "
+                "(description, image_id, owner_id) "
+                f"SELECT description, id, owner_id FROM {table} "
+                f"WHERE id IN ({placeholders})",
+                batch
+            )
+
+
+def _matches_sql(terms: list) -> tuple:
+    """Returns SQL selecting the id and score of each Image matching
+    terms, lower scores ranking first, and its parameters.
+    """
+
+    table: str = Image._meta.db_table
+    if connection.vendor == 'mysql':
+        # +word* : the description must hold a word starting with word
+        expression: str = ' '.join(f'+{term}*' for term in terms)
+        return (
+            f"SELECT id AS image_id, owner_id, "
+            "-MATCH (description) AGAINST (%s IN BOOLEAN MODE) AS score "
+            f"FROM {table} "
+            "WHERE MATCH (description) AGAINST (%s IN BOOLEAN MODE)",
+            [expression, expression]
+        )
+    # "word"* : a word starting with word; quoted, words are never
+    # read as FTS5 operators (AND, OR, NOT, NEAR)
+    expression = ' '.join(f'"{term}"*' for term in terms)
+    return (
+        f"SELECT image_id, owner_id, bm25({SQLITE_INDEX_TABLE}) AS score "
+        f"FROM {SQLITE_INDEX_TABLE} WHERE {SQLITE_INDEX_TABLE} MATCH %s",
+        [expression]
+    )
+
+
+def search(
+    text: str,
+    owner_id: UUID | None = None,
+    after: tuple | None = None,
+    limit: int = 50
+) -> list:
+    """Returns up to limit Images whose descriptions match the query
+    text, best matches first, each with its "score" (lower is better)
+    as an attribute.  Only Images of owner_id are searched, if given.
+
+    after is the (score, id) of the last Image of the previous page, if
+    any.  Raises django.db.utils.NotSupportedError on databases other
+    than MySQL and SQLite.
+    """
+
+    _check_vendor()
+    terms: list = query_terms(text)
+    if not terms:
+        return []
+
+    matches, params = _matches_sql(terms)
+    conditions: list = []
+    if owner_id is not None:
+        conditions.append("matches.owner_id = %s")
+        params.append(_db_value('owner', owner_id))
+    if after is not None:
+        score, image_id = after
+        conditions.append(
+            "(matches.score > %s OR (matches.score = %s AND image.id > %s))"
+        )
+        params.extend([score, score, _db_value('id', image_id)])
+    where: str = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    params.append(limit)
+
+    # the score is selected in a derived table, as SQLite allows bm25
+    # in the result columns of the MATCH query, but not in its WHERE
+    return list(Image.objects.raw(
+        f"SELECT image.*, matches.score FROM ({matches}) AS matches "
+        f"JOIN {Image._meta.db_table} AS image ON image.id = matches.image_id "
+        f"{where} ORDER BY matches.score, image.id LIMIT %s",
+        params
+    ))
+
+
+def encode_cursor(image: Image) -> str:
+    """Encodes the (score, id) of a matching Image, as returned by
+    search, as an opaque cursor for the page after it.
+    """
+
+    payload: bytes = json.dumps([image.score, str(image.id)]).encode()
+    return b64encode(payload, altchars=b'-_').decode('ascii')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decodes a cursor made by encode_cursor, as (score, id).
+    Raises ValueError for cursors that cannot be decoded.
+    """
+
+    try:
+        score, image_id = json.loads(
+            b64decode(cursor.encode('ascii'), altchars=b'-_')
+        )
+        if not isinstance(score, (int, float)) or isinstance(score, bool):
+            raise ValueError
+        return float(score), UUID(image_id)
+    except (ValueError, TypeError, AttributeError):  # incl. binascii.Error
+        raise ValueError("Invalid cursor.")
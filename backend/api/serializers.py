@@ -8,6 +8,10 @@ Classes
     for instance "ImageSerializer" calls data
     from the Image class (see api.models).
     Extends Django's serializers.ModelSerializer.
+
+ImageWithTagsSerializer
+    Serializes data from the Image class along with its Tags.
+    Extends ImageSerializer.
 """
 
 from rest_framework import serializers
@@ -36,6 +40,27 @@ class ImageSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class ImageWithTagsSerializer(ImageSerializer):
+    """Serializes data from the Image class for API delivery, with the id
+    and name of each of its Tags.
+    Extends ImageSerializer.
+    Used in api.views, on Images with their ImageTags (and the Tags of
+    those) prefetched; otherwise each Image would cost two queries.
+    """
+
+    tags = serializers.SerializerMethodField()
+
+    class Meta(ImageSerializer.Meta):
+        pass
+
+    def get_tags(self, image: Image) -> list:
+        tags: list = [
+            {'id': str(imagetag.tag.id), 'name': imagetag.tag.name}
+            for imagetag in image.imagetag_set.all()
+        ]
+        return sorted(tags, key=lambda tag: tag['name'])
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Serializes data from the Tag class for API delivery.
     Extends Django's serializers.ModelSerializer.
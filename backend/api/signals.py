@@ -0,0 +1,83 @@
+"""Signal handlers for the api app.
+Connected when the app is ready; see api.apps.
+
+Keeps each owner's CatalogRevision (see api.models) current:
+a revision is created alongside each AppUser, and bumped whenever
+any of their Images, Tags or ImageTags are saved or deleted.  Saves of
+an Image's hashes alone leave it be: those are derived from the media
+file, which an Image never changes.  The owner's hash revision is
+bumped as Images are added, removed or given a perceptual hash.
+
+Queues background processing (see api.tasks) for each new Image.
+
+Keeps the full-text index of Image descriptions (see api.search) up to
+date as Images are saved and deleted.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import AppUser, CatalogRevision, Image, ImageTag, Tag
+from . import jobs, revisions, search
+
+# Fields of Image derived from its media file, rather than catalog data
+HASH_FIELDS: frozenset = frozenset({'sha256', 'perceptual_hash'})
+
+
+@receiver(post_save, sender=AppUser)
+def create_catalog_revision(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        CatalogRevision.objects.get_or_create(owner=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_owner_revision(sender, instance, raw=False, **kwargs):
+    if not raw:
+        revisions.bump(instance.owner_id)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+def bump_image_owner_revision(sender, instance, raw=False, update_fields=None,
+                              **kwargs):
+    if raw:
+        return
+    # anything but a save of other fields may change the set of hashes
+    hashes: bool = update_fields is None or 'perceptual_hash' in update_fields
+    if update_fields and update_fields <= HASH_FIELDS:
+        if hashes:
+            revisions.bump_hashes(instance.owner_id)
+        return
+    revisions.bump(instance.owner_id, hashes=hashes)
+
+
+@receiver(post_save, sender=Image)
+def queue_image_processing(sender, instance, created, raw=False, **kwargs):
+    # queued in the same transaction as the Image itself, so workers
+    # never see a job for an Image that was rolled back
+    if created and not raw:
+        jobs.enqueue(
+            'process_image',
+            {'image-id': str(instance.id)},
+            key=f'process_image:{instance.id}'
+        )
+
+
+@receiver(post_save, sender=ImageTag)
+@receiver(post_delete, sender=ImageTag)
+def bump_imagetag_owner_revision(sender, instance, raw=False, **kwargs):
+    if not raw:
+        revisions.bump_for_tag(instance.tag_id)
+
+
+@receiver(post_save, sender=Image)
+def index_image_description(sender, instance, update_fields=None, **kwargs):
+    # indexed even for raw saves (e.g. loaddata): the entry only
+    # mirrors the row itself; saves of other fields leave it as it was
+    if update_fields is None or {'description', 'owner'} & set(update_fields):
+        search.index_images([instance.id])
+
+
+@receiver(post_delete, sender=Image)
+def unindex_image(sender, instance, **kwargs):
+    search.index_images([instance.id])
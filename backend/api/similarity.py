@@ -0,0 +1,187 @@
+"""Finds near-duplicate Images by their perceptual hashes.
+Used by api.views and the find_near_duplicates and benchmark_similarity
+management commands.
+
+Images whose perceptual hashes (see api.media.dhash) are a small
+Hamming distance apart are near duplicates: re-encoded, rescaled or
+lightly edited copies of each other.  Rather than comparing a hash
+against every other, each owner's hashes are indexed by multi-index
+hashing: the 64 bits are split into BANDS bands, and each band is
+indexed in a table of its own.  Two hashes within distance r of each
+other must, by the pigeonhole principle, be within r // BANDS of each
+other in at least one band; so a lookup need only fetch the hashes
+whose band values lie within that distance of the target's (a few
+hundred table lookups at the usual distances), then check those
+candidates in full.  For random hashes and the default distance, that
+is under 1% of an owner's Images (a BK-tree, by comparison, visits
+most of its nodes at such distances); see benchmark_similarity.
+
+Indexes are built on first use and kept in memory, keyed by the
+revision of the owner's perceptual hashes (see api.revisions), which
+changes only as Images are added, removed or hashed; edits to Tags
+leave the index as it is.
+
+Classes
+-------
+
+HashIndex
+    A multi-index of 64-bit hashes, searchable by Hamming distance.
+
+Functions
+---------
+
+hamming_distance
+    Counts the bits that differ between two 64-bit hashes.
+
+owner_index
+    Returns the (cached) HashIndex of an owner's Images.
+
+similar_images
+    Finds the Images of the same owner that are near duplicates of one.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import combinations
+from uuid import UUID
+from . import revisions
+from .models import Image
+
+# Hashes are stored signed; mask them to compare as unsigned
+HASH_MASK: int = (1 << 64) - 1
+
+# Default and greatest distances a lookup may ask for; beyond about a
+# quarter of the bits, matches are no longer near duplicates, and
+# lookups fetch a growing share of the index as candidates
+DEFAULT_MAX_DISTANCE: int = 10
+MAX_DISTANCE_LIMIT: int = 16
+
+# Bands hashes are split into for indexing, and the bits of each
+BANDS: int = 4
+BAND_BITS: int = 64 // BANDS
+BAND_MASK: int = (1 << BAND_BITS) - 1
+
+# Number of owners whose indexes are kept in memory at once
+INDEX_CACHE_SIZE: int = 32
+
+_indexes_lock = threading.Lock()
+_indexes: OrderedDict = OrderedDict()
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """Counts the bits that differ between two 64-bit hashes."""
+
+    return ((first ^ second) & HASH_MASK).bit_count()
+
+
+@lru_cache(maxsize=None)
+def _flips(distance: int) -> tuple:
+    """Returns every band-wide mask with at most distance bits set."""
+
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for count in range(distance + 1)
+        for bits in combinations(range(BAND_BITS), count)
+    )
+
+
+class HashIndex:
+    """A multi-index of 64-bit hashes, searchable by Hamming distance.
+
+    Hashes (unsigned) and their items are kept in parallel lists; each
+    band's table maps the values of that band to the positions, in
+    those lists, of the hashes having them.
+    """
+
+    def __init__(self) -> None:
+        self.hashes: list = []
+        self.items: list = []
+        self.tables: list = [{} for _ in range(BANDS)]
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, value: int, item) -> None:
+        """Adds item to the index under the hash value."""
+
+        value &= HASH_MASK
+        position: int = len(self.hashes)
+        self.hashes.append(value)
+        self.items.append(item)
+        for band, table in enumerate(self.tables):
+            key: int = (value >> (band * BAND_BITS)) & BAND_MASK
+            table.setdefault(key, []).append(position)
+
+    def candidates(self, value: int, max_distance: int) -> set:
+        """Returns the positions of the hashes that may be within
+        max_distance of value: those within max_distance // BANDS of it
+        in some band.  Every hash within max_distance is among them.
+        """
+
+        value &= HASH_MASK
+        flips: tuple = _flips(max_distance // BANDS)
+        found: set = set()
+        for band, table in enumerate(self.tables):
+            key: int = (value >> (band * BAND_BITS)) & BAND_MASK
+            for flip in flips:
+                positions: list | None = table.get(key ^ flip)
+                if positions:
+                    found.update(positions)
+        return found
+
+    def search(self, value: int, max_distance: int) -> list:
+        """Returns (distance, item) for every item whose hash is within
+        max_distance of value, nearest first.
+        """
+
+        matches: list = []
+        for position in self.candidates(value, max_distance):
+            distance: int = hamming_distance(value, self.hashes[position])
+            if distance <= max_distance:
+                matches.append((distance, self.items[position]))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+def owner_index(owner_id: UUID) -> HashIndex:
+    """Returns a HashIndex of the hashed Images of the given owner, whose
+    items are Image ids.  The index is rebuilt whenever the owner's
+    hash revision has changed since it was last built.
+    """
+
+    revision: int = revisions.hash_revision_of(owner_id)
+    with _indexes_lock:
+        cached: tuple | None = _indexes.get(owner_id)
+        if cached is not None and cached[0] == revision:
+            _indexes.move_to_end(owner_id)
+            return cached[1]
+
+    index = HashIndex()
+    hashes = Image.objects.filter(
+        owner_id=owner_id,
+        perceptual_hash__isnull=False
+    ).values_list('id', 'perceptual_hash')
+    for image_id, perceptual_hash in hashes.iterator(chunk_size=2000):
+        index.add(perceptual_hash, image_id)
+
+    with _indexes_lock:
+        _indexes[owner_id] = (revision, index)
+        _indexes.move_to_end(owner_id)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def similar_images(image: Image, max_distance: int) -> list:
+    """Returns (distance, Image id) for each other Image of the same
+    owner whose perceptual hash is within max_distance of image's,
+    nearest first.  image must have a perceptual hash.
+    """
+
+    index: HashIndex = owner_index(image.owner_id)
+    return [
+        (distance, image_id)
+        for distance, image_id in index.search(image.perceptual_hash, max_distance)
+        if image_id != image.id
+    ]
@@ -0,0 +1,119 @@
+"""Content-addressed storage for media files.
+Used as the storage of api.models.Image.source.
+
+Files are stored under their SHA-256 in a sharded directory layout,
+for instance cas/3f/a9/3fa9...e1.jpeg, so identical uploads are stored
+once and shared by every Image referencing them.  A file is referenced
+by as many Images as have it as their source; files no longer
+referenced at all are removed by the gc_media management command.
+
+Classes
+-------
+
+ContentAddressedStorage
+    Stores files by the hash of their content.
+    Extends Django's FileSystemStorage.
+"""
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Directory (under MEDIA_ROOT) holding content-addressed files
+CAS_PREFIX: str = 'cas'
+
+# Mode of files written without FILE_UPLOAD_PERMISSIONS, as open() would
+# create them; read once, since setting the umask is not thread-safe
+_UMASK: int = os.umask(0)
+os.umask(_UMASK)
+
+
+@deconstructible(path='api.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores files by the hash of their content.
+    Extends Django's FileSystemStorage.
+
+    Saving content that is already stored returns the name of the
+    existing file rather than writing a copy.  Files stored elsewhere
+    under MEDIA_ROOT (from before this storage was in use) are read as
+    by FileSystemStorage.
+    """
+
+    def content_name(self, name: str, content) -> str:
+        """Returns the content-addressed name for content, which was
+        uploaded as name (only the extension of which is kept).
+        """
+
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        return self.hashed_name(digest.hexdigest(), name)
+
+    @staticmethod
+    def hashed_name(sha256: str, name: str) -> str:
+        """Returns the content-addressed name for content with the given
+        hash, which was uploaded as name (only the extension is kept).
+        """
+
+        extension: str = Path(name).suffix.lower()
+        return f'{CAS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+    def store_file(self, path: str, sha256: str) -> str:
+        """Stores the file at path, whose hash is already known, sparing
+        the read to hash it again.  Returns its name, as save does.
+        """
+
+        name: str = self.hashed_name(sha256, path)
+        if self.exists(name):
+            os.utime(self.path(name))  # as in save
+            return name
+        with open(path, 'rb') as file:
+            return self._save(name, File(file, name))
+
+    def save(self, name, content, max_length=None) -> str:
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # already stored; mark it as in use, so that gc_media does
+            # not collect it before the new reference is saved
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+    def _save(self, name, content) -> str:
+        # write to a temporary file, then move it into place, so that a
+        # concurrent save of the same content never sees a partial file
+        full_path: str = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        # (a name of its own, so that concurrent saves, from threads as
+        # well as processes, each write their own file)
+        descriptor, temporary_path = tempfile.mkstemp(
+            dir=os.path.dirname(full_path), suffix='.tmp'
+        )
+        try:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            with open(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            # mkstemp creates files readable by their owner only
+            os.chmod(
+                temporary_path,
+                self.file_permissions_mode if self.file_permissions_mode is not None
+                else 0o666 & ~_UMASK
+            )
+            os.replace(temporary_path, full_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return name
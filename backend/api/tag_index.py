@@ -0,0 +1,358 @@
+"""An in-memory inverted index of tags, for searching Images by tag.
+Used by api.views to filter Image listings by tag.
+
+For each owner, every Image is given a position, and every Tag a
+bitset with the bit at each tagged Image's position set.  Queries such
+as "tagged a and b but not c" are then a handful of bitwise operations
+rather than a self-join of api_imagetag per tag.
+
+Bitsets are Python integers, which store only as many machine words as
+the highest set bit needs, and do AND, OR and NOT over whole words.
+
+Positions follow the order Images are listed in (by upload time, then
+id), so the Images matching a query can be read a page at a time from
+any point in that order, and a search never returns more than a page
+of ids (see TagIndex.page).
+
+Indexes are built on first use and kept in memory, keyed by the
+revision of the owner's catalog (see api.revisions).  ImageTags added
+or deleted through the API are applied to the index as they happen
+(see record_tagging); any other change to the catalog leads to a
+rebuild on the next query.
+
+Only a query within one owner's catalog is answered through its index.
+A query over every catalog is answered by the database, within the
+query listing the page: an index per catalog with a match would cost
+queries (and memory) in proportion to the number of catalogs.
+
+Classes
+-------
+
+TagIndex
+    The tag bitsets of one owner's Images.
+
+Functions
+---------
+
+owner_index
+    Returns the (cached) TagIndex of an owner's catalog.
+
+record_tagging
+    Applies ImageTags just added or deleted to the cached index.
+
+search
+    Returns a filter of Images, for a page of those matching a tag query.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+from uuid import UUID
+from django.db.models import Exists, OuterRef, Q
+from . import revisions
+from .models import Image, ImageTag, Tag
+
+# Ways of combining the tags asked for: all of them, or any of them
+SEARCH_MODES: tuple = ('all', 'any')
+
+# Number of owners whose indexes are kept in memory at once
+INDEX_CACHE_SIZE: int = 32
+
+_indexes_lock = threading.Lock()
+_indexes: OrderedDict = OrderedDict()
+
+
+class TagIndex:
+    """The tag bitsets of one owner's Images.
+
+    Attributes
+    ----------
+    revision: int
+        The catalog revision the index reflects.
+    keys: list
+        (uploaded_at, id) of each Image, by position: the order Images
+        are listed in, oldest first.
+    image_ids: list
+        Image ids, by position.
+    positions: dict
+        Positions, by Image id.
+    bitsets: dict
+        Bitsets of tagged positions, by Tag id.
+    """
+
+    def __init__(self, revision: int, keys: list) -> None:
+        self.revision: int = revision
+        self.keys: list = keys
+        self.image_ids: list = [image_id for _, image_id in keys]
+        self.positions: dict = {
+            image_id: position for position, image_id in enumerate(self.image_ids)
+        }
+        self.bitsets: dict = {}
+
+    def everything(self) -> int:
+        """Returns the bitset of all of the owner's Images."""
+
+        return (1 << len(self.image_ids)) - 1
+
+    def tagged(self, tag_ids) -> int:
+        """Returns the bitset of Images with any of the given Tags."""
+
+        bitset: int = 0
+        for tag_id in tag_ids:
+            bitset |= self.bitsets.get(tag_id, 0)
+        return bitset
+
+    def page(
+        self,
+        bitset: int,
+        after: tuple | None = None,
+        reverse: bool = False,
+        limit: int | None = None
+    ) -> list:
+        """Returns (key, id) of up to limit of the Images in bitset, in
+        the order they are listed (newest first, or oldest first with
+        reverse), starting after the Image with key after, if given.
+        """
+
+        if after is not None:
+            if reverse:
+                bitset &= ~((1 << bisect_right(self.keys, after)) - 1)
+            else:
+                bitset &= (1 << bisect_left(self.keys, after)) - 1
+
+        # scanning the binary digits is done in C; shifting out one bit
+        # at a time would copy the whole integer per Image
+        if reverse:
+            digits: str = bin(bitset)[:1:-1]  # lowest position first
+        else:
+            digits = bin(bitset)[2:]  # highest position first
+        top: int = len(digits) - 1
+        found: list = []
+        index: int = digits.find('1')
+        while index >= 0 and (limit is None or len(found) < limit):
+            found.append(self.keys[index if reverse else top - index])
+            index = digits.find('1', index + 1)
+        return found
+
+
+def _build(owner_id: UUID, revision: int) -> TagIndex:
+    """Reads an owner's Images and ImageTags into a new TagIndex."""
+
+    index = TagIndex(
+        revision,
+        list(
+            Image.objects.filter(owner_id=owner_id)
+            .order_by('uploaded_at', 'id').values_list('uploaded_at', 'id')
+        )
+    )
+    # gather positions per tag, then make each bitset in one step
+    tag_positions: dict = {}
+    imagetags = ImageTag.objects.filter(tag__owner_id=owner_id) \
+        .values_list('tag_id', 'image_id')
+    for tag_id, image_id in imagetags.iterator(chunk_size=5000):
+        position: int | None = index.positions.get(image_id)
+        if position is not None:
+            tag_positions.setdefault(tag_id, []).append(position)
+
+    for tag_id, positions in tag_positions.items():
+        bits = bytearray(max(positions) // 8 + 1)
+        for position in positions:
+            bits[position >> 3] |= 1 << (position & 7)
+        index.bitsets[tag_id] = int.from_bytes(bits, 'little')
+    return index
+
+
+def owner_index(owner_id: UUID) -> TagIndex:
+    """Returns the TagIndex of the given owner's catalog, building it if
+    it is not cached or the catalog has changed since it was built.
+    """
+
+    revision: int = revisions.revision_of(owner_id)
+    with _indexes_lock:
+        index: TagIndex | None = _indexes.get(owner_id)
+        if index is not None and index.revision == revision:
+            _indexes.move_to_end(owner_id)
+            return index
+
+    index = _build(owner_id, revision)
+    with _indexes_lock:
+        _indexes[owner_id] = index
+        _indexes.move_to_end(owner_id)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def record_tagging(
+    owner_id: UUID,
+    image_ids,
+    add_tag_ids=(),
+    remove_tag_ids=()
+) -> None:
+    """Applies a change just made to the owner's ImageTags to their
+    cached index, sparing a rebuild on the next query: every one of
+    image_ids was tagged with every one of add_tag_ids, and untagged
+    from every one of remove_tag_ids, in a single catalog revision.
+
+    This is only safe if that change is the sole one since the index
+    was built, i.e. the revision moved on by exactly one; if not (say
+    another process changed the catalog too), the index is left to be
+    rebuilt.  Call it only after a change that bumped the revision
+    exactly once: after one that did not (such as tagging an Image
+    with a Tag it already has), a bump made by anything else would be
+    taken for it, and the index marked current without that change.
+    """
+
+    if owner_id not in _indexes:
+        return  # nothing cached to update
+    revision: int = revisions.revision_of(owner_id)
+    with _indexes_lock:
+        index: TagIndex | None = _indexes.get(owner_id)
+        if index is None or index.revision != revision - 1:
+            return
+        changed: int = 0
+        for image_id in image_ids:
+            position: int | None = index.positions.get(image_id)
+            if position is None:  # not in the index; rebuild instead
+                del _indexes[owner_id]
+                return
+            changed |= 1 << position
+        for tag_id in add_tag_ids:
+            index.bitsets[tag_id] = index.bitsets.get(tag_id, 0) | changed
+        for tag_id in remove_tag_ids:
+            index.bitsets[tag_id] = index.bitsets.get(tag_id, 0) & ~changed
+        index.revision = revision
+
+
+def _search_owner(
+    owner_id: UUID,
+    include: list,
+    exclude: set,
+    mode: str,
+    after: tuple | None,
+    reverse: bool,
+    limit: int | None
+) -> list:
+    """Returns (key, id) of a page of the owner's Images matching a tag
+    query; see TagIndex.page for the page.
+
+    include is a list of groups of Tag ids, one group per term asked
+    for (a tag name may match more than one Tag).  With mode 'all',
+    Images must match every group; with 'any', at least one.  An empty
+    include matches every Image.  Images with any of the Tags in
+    exclude are then left out.
+    """
+
+    index: TagIndex = owner_index(owner_id)
+    if not include:
+        bitset: int = index.everything()
+    elif mode == 'all':
+        bitset = index.everything()
+        for tag_ids in include:
+            bitset &= index.tagged(tag_ids)
+    else:
+        bitset = 0
+        for tag_ids in include:
+            bitset |= index.tagged(tag_ids)
+    bitset &= ~index.tagged(exclude)
+    return index.page(bitset, after, reverse, limit)
+
+
+def _canonical(term: str) -> str:
+    """Spells terms that are UUIDs as Tag ids are spelled (lowercase,
+    hyphenated); leaves tag names as they are.
+    """
+
+    try:
+        return str(UUID(term))
+    except ValueError:
+        return term
+
+
+def _owned_tags(term: str) -> Exists:
+    """Returns a filter of Images with a Tag of their owner's that the
+    term refers to, by id or name.
+    """
+
+    refers = Q(tag__name=term)
+    try:
+        refers |= Q(tag__id=UUID(term))
+    except ValueError:
+        pass
+    return Exists(ImageTag.objects.filter(
+        refers,
+        image_id=OuterRef('pk'),
+        tag__owner_id=OuterRef('owner_id')
+    ))
+
+
+def search(
+    include_terms: list,
+    exclude_terms: list,
+    mode: str = 'all',
+    owner_id: UUID | None = None,
+    after: list | None = None,
+    reverse: bool = False,
+    limit: int | None = None
+) -> Q:
+    """Returns a filter of Images for a tag query: tagged with all (or,
+    by mode, any) of include_terms, and none of exclude_terms.  Terms
+    are Tag ids or names.  Without an owner_id, each owner's catalog is
+    searched for their own Tags matching the terms.
+
+    Within an owner's catalog, as a page of Images is listed, newest
+    first (or oldest first with reverse) from after the (uploaded_at,
+    id) given in after, only the first limit of the matches are let
+    through; a filter of every match can be a great many ids otherwise.
+    Queries over every catalog are filtered by the database instead,
+    in the query listing the page, rather than through an index per
+    catalog with a match.
+    """
+
+    include_terms = [_canonical(term) for term in include_terms]
+    exclude_terms = [_canonical(term) for term in exclude_terms]
+
+    if owner_id is None:
+        found = Q()
+        if include_terms and mode == 'all':
+            for term in include_terms:
+                found &= Q(_owned_tags(term))
+        elif include_terms:
+            found = Q(reduce(or_, (_owned_tags(term) for term in include_terms)))
+        for term in exclude_terms:
+            found &= ~Q(_owned_tags(term))
+        return found
+
+    terms: set = set(include_terms) | set(exclude_terms)
+    tag_ids: list = []
+    for term in terms:
+        try:
+            tag_ids.append(UUID(term))
+        except ValueError:
+            pass
+    # term -> ids of the owner's Tags the term refers to
+    matches: dict = {}
+    for tag_id, name in Tag.objects.filter(
+        Q(id__in=tag_ids) | Q(name__in=terms),
+        owner_id=owner_id
+    ).values_list('id', 'name'):
+        for term in (name, str(tag_id)):
+            if term in terms:
+                matches.setdefault(term, set()).add(tag_id)
+
+    include: list = [
+        matches[term] for term in include_terms if term in matches
+    ]
+    if include_terms and not include \
+            or mode == 'all' and len(include) < len(include_terms):
+        return Q(pk__in=[])  # some tag asked for is not in this catalog
+    exclude: set = set().union(*(
+        matches[term] for term in exclude_terms if term in matches
+    ))
+    found: list = _search_owner(
+        owner_id, include, exclude, mode,
+        tuple(after) if after is not None else None, reverse, limit
+    )
+    return Q(id__in=[image_id for _, image_id in found])
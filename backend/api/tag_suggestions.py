@@ -0,0 +1,300 @@
+"""Suggests Tags by the start of their names, for type-ahead.
+Used by api.views (see tag_suggest_view).
+
+For each owner, the casefolded names of their Tags are kept in a
+sorted array, so the Tags starting with a prefix are a contiguous run
+found by two binary searches, with no scan of api_tag (whose index on
+owner and name cannot serve case-insensitive prefixes).  Matches are
+ranked by how many Images have the Tag, then by name.
+
+When a prefix matches a large share of the Tags (a letter or two, or
+nothing at all), the Tags are instead read in order of rank until
+enough match, from a list kept sorted by rank.  Whichever way is
+expected to visit fewer Tags is taken, so a lookup in ten thousand
+Tags takes tens of microseconds.
+
+Indexes are built on first use and kept in memory, keyed by the
+revision of the owner's catalog (see api.revisions).  Tags created,
+renamed or deleted and ImageTags added or deleted through the API are
+applied to the index as they happen (see record_tag and record_usage);
+any other change to the catalog leads to a rebuild on the next lookup.
+
+The revision is read at most once every REVISION_TTL seconds per
+owner, rather than on every keystroke; changes made other than
+through record_tag and record_usage (as by another process) may so
+take that long to be suggested.
+
+Classes
+-------
+
+TagSuggestions
+    The Tags of one owner, sorted by name and by rank.
+
+Functions
+---------
+
+owner_suggestions
+    Returns the (cached) TagSuggestions of an owner's catalog.
+
+record_tag
+    Applies a Tag just created, renamed or deleted to the cached index.
+
+record_usage
+    Applies ImageTags just added or deleted to the cached index.
+
+record_usages
+    Applies ImageTags just added or deleted, for many Tags at once.
+
+suggest
+    Returns the best-ranked Tags whose names start with a prefix.
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from uuid import UUID
+from django.db.models import Count
+from . import revisions
+from .models import Tag
+
+# Default and greatest numbers of suggestions a lookup may ask for
+DEFAULT_LIMIT: int = 10
+MAX_LIMIT: int = 50
+
+# Number of owners whose indexes are kept in memory at once
+INDEX_CACHE_SIZE: int = 32
+
+# Seconds an index is used for without checking the catalog revision
+REVISION_TTL: float = 1.0
+
+# Sorts after every character, to end the run of keys with a prefix
+_LAST_CHARACTER: str = '\U0010ffff'
+
+_indexes_lock = threading.Lock()
+_indexes: OrderedDict = OrderedDict()
+
+
+def _key(name: str) -> str:
+    return name.casefold()
+
+
+class TagSuggestions:
+    """The Tags of one owner, sorted by name and by rank.
+
+    Attributes
+    ----------
+    revision: int
+        The catalog revision the index reflects.
+    checked: float
+        When the revision was last read (see time.monotonic).
+    keys: list
+        Casefolded Tag names, sorted.
+    tag_ids: list
+        Tag ids, in the order of keys.
+    names: dict
+        Tag names, by Tag id.
+    keys_by_id: dict
+        Casefolded Tag names, by Tag id.
+    counts: dict
+        Numbers of Images with each Tag, by Tag id.
+    """
+
+    def __init__(self, revision: int, tags: list) -> None:
+        self.revision: int = revision
+        self.checked: float = time.monotonic()
+        tags = sorted(tags, key=lambda tag: (_key(tag[1]), tag[0]))
+        self.keys: list = [_key(name) for _, name, _ in tags]
+        self.tag_ids: list = [tag_id for tag_id, _, _ in tags]
+        self.names: dict = {tag_id: name for tag_id, name, _ in tags}
+        self.keys_by_id: dict = dict(zip(self.tag_ids, self.keys))
+        self.counts: dict = {tag_id: count for tag_id, _, count in tags}
+        self._ranked: list | None = None
+
+    def rank(self, tag_id: UUID) -> tuple:
+        """Sort key of a Tag among suggestions: most used first."""
+
+        return -self.counts[tag_id], self.keys_by_id[tag_id], tag_id
+
+    def ranked(self) -> list:
+        """Returns the Tag ids sorted by rank; sorted again only after
+        a change.
+        """
+
+        if self._ranked is None:
+            self._ranked = sorted(self.tag_ids, key=self.rank)
+        return self._ranked
+
+    def _position(self, tag_id: UUID) -> int:
+        position: int = bisect_left(self.keys, self.keys_by_id[tag_id])
+        while self.tag_ids[position] != tag_id:
+            position += 1
+        return position
+
+    def add(self, tag_id: UUID, name: str, count: int = 0) -> None:
+        key: str = _key(name)
+        position: int = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key \
+                and self.tag_ids[position] < tag_id:
+            position += 1
+        self.keys.insert(position, key)
+        self.tag_ids.insert(position, tag_id)
+        self.names[tag_id] = name
+        self.keys_by_id[tag_id] = key
+        self.counts[tag_id] = count
+        self._ranked = None
+
+    def remove(self, tag_id: UUID) -> int:
+        """Removes a Tag, returning its count."""
+
+        position: int = self._position(tag_id)
+        del self.keys[position]
+        del self.tag_ids[position]
+        del self.names[tag_id]
+        del self.keys_by_id[tag_id]
+        self._ranked = None
+        return self.counts.pop(tag_id)
+
+    def count_usage(self, tag_id: UUID, change_in_count: int) -> None:
+        self.counts[tag_id] += change_in_count
+        self._ranked = None
+
+    def matching(self, prefix: str, limit: int) -> list:
+        """Returns the ids of the limit best-ranked Tags whose names
+        start with prefix (ignoring case).
+        """
+
+        prefix = _key(prefix)
+        start: int = bisect_left(self.keys, prefix)
+        end: int = bisect_left(self.keys, prefix + _LAST_CHARACTER, start)
+        if end - start <= limit:
+            return sorted(self.tag_ids[start:end], key=self.rank)
+        # reading by rank visits about limit / (share of Tags matching)
+        # Tags; ranking the run visits all of it
+        if (end - start) ** 2 > limit * len(self.keys):
+            found: list = []
+            for tag_id in self.ranked():
+                if self.keys_by_id[tag_id].startswith(prefix):
+                    found.append(tag_id)
+                    if len(found) == limit:
+                        break
+            return found
+        return heapq.nsmallest(limit, self.tag_ids[start:end], key=self.rank)
+
+
+def _build(owner_id: UUID, revision: int) -> TagSuggestions:
+    """Reads an owner's Tags, with their counts, into a new index."""
+
+    return TagSuggestions(revision, list(
+        Tag.objects.filter(owner_id=owner_id)
+        .annotate(count=Count('imagetag'))
+        .values_list('id', 'name', 'count')
+    ))
+
+
+def owner_suggestions(owner_id: UUID) -> TagSuggestions:
+    """Returns the TagSuggestions of the given owner's catalog, building
+    it if it is not cached or the catalog has changed since it was built.
+    An index checked within the last REVISION_TTL seconds is returned
+    without reading the revision.
+    """
+
+    with _indexes_lock:
+        index: TagSuggestions | None = _indexes.get(owner_id)
+        if index is not None \
+                and time.monotonic() - index.checked < REVISION_TTL:
+            _indexes.move_to_end(owner_id)
+            return index
+
+    checked: float = time.monotonic()
+    revision: int = revisions.revision_of(owner_id)
+    with _indexes_lock:
+        index = _indexes.get(owner_id)
+        if index is not None and index.revision == revision:
+            index.checked = checked
+            _indexes.move_to_end(owner_id)
+            return index
+
+    index = _build(owner_id, revision)
+    with _indexes_lock:
+        _indexes[owner_id] = index
+        _indexes.move_to_end(owner_id)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _apply(owner_id: UUID, change) -> None:
+    """Calls change with the owner's cached index, if the change just
+    made to their catalog is the sole one since the index was built
+    (i.e. the revision moved on by exactly one), and marks the index
+    current.  Otherwise the index is dropped, to be rebuilt.
+    """
+
+    if owner_id not in _indexes:
+        return  # nothing cached to update
+    checked: float = time.monotonic()
+    revision: int = revisions.revision_of(owner_id)
+    with _indexes_lock:
+        index: TagSuggestions | None = _indexes.get(owner_id)
+        if index is None:
+            return
+        if index.revision != revision - 1 or change(index) is False:
+            # changed elsewhere too, or not in the index; rebuild instead
+            del _indexes[owner_id]
+            return
+        index.revision = revision
+        index.checked = checked
+
+
+def record_tag(owner_id: UUID, tag_id: UUID, name: str | None) -> None:
+    """Applies a change just made to one of the owner's Tags to their
+    cached index: the Tag was created or renamed to name, or deleted
+    if name is None.
+    """
+
+    def change(index: TagSuggestions) -> bool:
+        count: int = index.remove(tag_id) if tag_id in index.names else 0
+        if name is not None:
+            index.add(tag_id, name, count)
+        return True
+
+    _apply(owner_id, change)
+
+
+def record_usage(owner_id: UUID, tag_id: UUID, change_in_count: int) -> None:
+    """Applies ImageTags just added (or, with a negative change_in_count,
+    deleted) for one of the owner's Tags to their cached index.
+    """
+
+    record_usages(owner_id, {tag_id: change_in_count})
+
+
+def record_usages(owner_id: UUID, changes_in_count: dict) -> None:
+    """Applies ImageTags just added and deleted for the owner's Tags to
+    their cached index, as one change: changes_in_count maps Tag ids to
+    the number of ImageTags added (or, if negative, deleted) for each.
+    """
+
+    def change(index: TagSuggestions) -> bool:
+        if any(tag_id not in index.counts for tag_id in changes_in_count):
+            return False
+        for tag_id, change_in_count in changes_in_count.items():
+            index.count_usage(tag_id, change_in_count)
+        return True
+
+    _apply(owner_id, change)
+
+
+def suggest(owner_id: UUID, prefix: str, limit: int = DEFAULT_LIMIT) -> list:
+    """Returns (id, name, count) of up to limit of the owner's Tags whose
+    names start with prefix, ignoring case: the most used first, then
+    by name.
+    """
+
+    index: TagSuggestions = owner_suggestions(owner_id)
+    return [
+        (tag_id, index.names[tag_id], index.counts[tag_id])
+        for tag_id in index.matching(prefix, limit)
+    ]
@@ -0,0 +1,51 @@
+"""Handlers for background jobs.
+See api.jobs for how jobs are queued and run.
+
+Handlers
+--------
+
+process_image
+    Per-Image work done after upload: finding the content hash, size,
+    type, dimensions and perceptual hash of the media file, and
+    pre-rendering the thumbnail the image grid asks for.
+"""
+
+from PIL import UnidentifiedImageError
+from .jobs import handler
+from .media import probe_file
+from .models import Image
+from .thumbnails import get_variant
+
+# The variant requested by the frontend's image grid
+# (see frontend/memecataloger/src/app/_components/Thumbnail.tsx)
+DEFAULT_THUMBNAIL_WIDTH: int = 640
+DEFAULT_THUMBNAIL_FORMAT: str = 'webp'
+
+
+@handler('process_image')
+def process_image(payload: dict) -> None:
+    """Stores the metadata of the media file of an Image (see
+    api.media.probe_file), and pre-renders its thumbnail.
+    Payload: {"image-id": uuid of the Image}
+    """
+
+    try:
+        image: Image = Image.objects.get(id=payload['image-id'])
+    except Image.DoesNotExist:
+        return  # deleted since the job was queued; nothing to do
+
+    file_path: str = image.source.path
+    metadata: dict = probe_file(file_path)
+    for field, value in metadata.items():
+        setattr(image, field, value)
+    image.save(update_fields=list(metadata))
+
+    try:
+        get_variant(
+            file_path,
+            image.sha256,
+            DEFAULT_THUMBNAIL_WIDTH,
+            DEFAULT_THUMBNAIL_FORMAT
+        )
+    except UnidentifiedImageError:
+        pass  # videos and such have no thumbnail
@@ -1,5 +1,8 @@
 """Django tests for the api package.
-Includes tests for the models, URLs and views.
+Includes tests for the models, URLs and views, the background
+jobs, near-duplicate search, the list serialization fast path, the
+database connection pool, replica routing, request metrics and query
+budgets, and the management commands.
 Intentionally excludes the following modules:
  - __init__: who tests init?  Is that a thing people do?
  - admin: not currently in use.
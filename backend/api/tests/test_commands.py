@@ -0,0 +1,619 @@
+"""Tests for the management commands of the api package.
+Test classes in this module run their target command and check:
+  - the changes it makes to the database (and media files)
+  - what it reports back
+"""
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from unittest.mock import patch
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from pathlib import Path
+from io import BytesIO, StringIO
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from PIL import Image as PillowImage
+from api.models import AppUser, Image, ImageTag, Tag, CatalogRevision
+from api import search, similarity
+
+
+class BackfillImageMetadataTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.file_names: list = ["backfill_test_1.png", "backfill_test_2.jpg"]
+    PillowImage.new("RGB", (30, 20)).save(
+      f"{settings.MEDIA_ROOT}/{cls.file_names[0]}"
+    )
+    # EXIF orientation 6: stored 30x20, but displayed rotated to 20x30
+    exif = PillowImage.Exif()
+    exif[0x0112] = 6
+    PillowImage.new("RGB", (30, 20)).save(
+      f"{settings.MEDIA_ROOT}/{cls.file_names[1]}",
+      exif=exif
+    )
+    for file_name in cls.file_names:
+      Image.objects.create(source=file_name, owner=cls.test_user)
+    cls.missing_image: Image = Image.objects.create(
+      source="backfill_test_missing.png",
+      owner=cls.test_user
+    )
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    for file_name in cls.file_names:
+      Path(f"{settings.MEDIA_ROOT}/{file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def run_command(self, *args) -> tuple:
+    output, errors = StringIO(), StringIO()
+    call_command(
+      'backfill_image_metadata', '--processes', '2', *args,
+      stdout=output,
+      stderr=errors
+    )
+    return output.getvalue(), errors.getvalue()
+
+  def test_metadata_stored(self) -> None:
+    output, errors = self.run_command('--batch-size', '1')
+    self.assertIn("Updated 2 image(s); skipped 1.", output)
+    self.assertIn("backfill_test_missing.png", errors)
+
+    png: Image = Image.objects.get(source=self.file_names[0])
+    path: Path = Path(f"{settings.MEDIA_ROOT}/{self.file_names[0]}")
+    self.assertEqual(png.sha256, hashlib.sha256(path.read_bytes()).hexdigest())
+    self.assertEqual(png.byte_size, path.stat().st_size)
+    self.assertEqual(png.mime_type, "image/png")
+    self.assertEqual((png.width, png.height), (30, 20))
+    self.assertIsNotNone(png.perceptual_hash)
+
+    jpeg: Image = Image.objects.get(source=self.file_names[1])
+    self.assertEqual(jpeg.mime_type, "image/jpeg")
+    self.assertEqual((jpeg.width, jpeg.height), (20, 30))
+
+  def test_revision_bumped(self) -> None:
+    before: int = CatalogRevision.objects.get(owner=self.test_user).revision
+    self.run_command()
+    after: int = CatalogRevision.objects.get(owner=self.test_user).revision
+    self.assertGreater(after, before)
+
+  def test_only_missing_metadata_probed(self) -> None:
+    self.run_command()
+    output, _ = self.run_command()
+    self.assertIn("Updated 0 image(s); skipped 1.", output)
+    output, _ = self.run_command('--all')
+    self.assertIn("Updated 2 image(s); skipped 1.", output)
+
+
+class GcMediaTestCase(TestCase):
+  def setUp(self) -> None:
+    # keep stored files out of the real MEDIA_ROOT
+    self.media_root: str = tempfile.mkdtemp()
+    media_override = override_settings(MEDIA_ROOT=self.media_root)
+    media_override.enable()
+    self.addCleanup(media_override.disable)
+    self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+    test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    self.kept: Image = Image.objects.create(
+      source=ContentFile(b"still in the catalog", name="kept.png"),
+      owner=test_user
+    )
+    orphan: Image = Image.objects.create(
+      source=ContentFile(b"deleted from the catalog", name="orphan.png"),
+      owner=test_user
+    )
+    self.orphan_path: Path = Path(orphan.source.path)
+    orphan.delete()
+
+  def run_command(self, *args) -> str:
+    output = StringIO()
+    call_command('gc_media', *args, stdout=output)
+    return output.getvalue()
+
+  def age(self, path: Path, seconds: int) -> None:
+    past: float = time.time() - seconds
+    os.utime(path, (past, past))
+
+  def test_orphan_deleted(self) -> None:
+    self.age(self.orphan_path, 7200)
+    self.age(Path(self.kept.source.path), 7200)
+    output: str = self.run_command()
+    self.assertIn("Deleted 1 file(s)", output)
+    self.assertFalse(self.orphan_path.exists())
+    self.assertTrue(Path(self.kept.source.path).exists())
+
+  def test_recent_orphan_kept(self) -> None:
+    # within the grace period, an upload may not be saved to an Image yet
+    output: str = self.run_command()
+    self.assertIn("Deleted 0 file(s)", output)
+    self.assertTrue(self.orphan_path.exists())
+    output = self.run_command('--min-age', '0')
+    self.assertIn("Deleted 1 file(s)", output)
+
+  def test_dry_run(self) -> None:
+    self.age(self.orphan_path, 7200)
+    output: str = self.run_command('--dry-run')
+    self.assertIn("Would delete 1 file(s)", output)
+    self.assertTrue(self.orphan_path.exists())
+
+  def test_single_query(self) -> None:
+    # referenced names are read once, however many shards there are
+    images: list = [self.kept] + [
+      Image.objects.create(
+        source=ContentFile(f"image {index}".encode(), name=f"{index}.png"),
+        owner=self.kept.owner
+      )
+      for index in range(5)
+    ]
+    for image in images:
+      self.age(Path(image.source.path), 7200)
+    self.age(self.orphan_path, 7200)
+    with self.assertNumQueries(1):
+      output: str = self.run_command()
+    self.assertIn("Deleted 1 file(s)", output)
+    self.assertFalse(self.orphan_path.exists())
+    for image in images:
+      self.assertTrue(Path(image.source.path).exists())
+
+  def test_shared_file_kept_while_referenced(self) -> None:
+    # a second Image with the same content shares the file; deleting
+    # one of the two leaves the file in use
+    duplicate: Image = Image.objects.create(
+      source=ContentFile(b"still in the catalog", name="copy.png"),
+      owner=self.kept.owner
+    )
+    self.kept.delete()
+    self.age(Path(duplicate.source.path), 7200)
+    self.run_command()
+    self.assertTrue(Path(duplicate.source.path).exists())
+
+
+class FindNearDuplicatesTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    # a chain of close hashes forms one group: 0 -> 3 bits -> 6 bits
+    for source, perceptual_hash in [
+      ("near_test_a.png", 0),
+      ("near_test_b.png", 0b111),
+      ("near_test_c.png", 0b111111),
+      ("near_test_far.png", -1),  # all 64 bits set
+      ("near_test_video.mp4", None)
+    ]:
+      Image.objects.create(
+        source=source,
+        owner=cls.test_user,
+        perceptual_hash=perceptual_hash
+      )
+    # an identical hash in another catalog is not a duplicate
+    Image.objects.create(
+      source="near_test_other.png",
+      owner=cls.other_user,
+      perceptual_hash=0
+    )
+
+  def setUp(self) -> None:
+    similarity._indexes.clear()
+
+  def run_command(self, *args) -> str:
+    output = StringIO()
+    call_command('find_near_duplicates', *args, stdout=output)
+    return output.getvalue()
+
+  def test_groups_reported(self) -> None:
+    output: str = self.run_command('--max-distance', '3')
+    self.assertIn("Found 1 group(s) of near duplicates.", output)
+    self.assertIn("test_user_1: 3 images", output)
+    for source in ["near_test_a.png", "near_test_b.png", "near_test_c.png"]:
+      self.assertIn(source, output)
+    self.assertNotIn("near_test_far.png", output)
+    self.assertNotIn("near_test_other.png", output)
+
+  def test_distance_respected(self) -> None:
+    output: str = self.run_command('--max-distance', '2')
+    self.assertIn("Found 0 group(s) of near duplicates.", output)
+
+  def test_owner_filter(self) -> None:
+    output: str = self.run_command(
+      '--max-distance', '3',
+      '--owner', str(self.other_user.id)
+    )
+    self.assertIn("Found 0 group(s) of near duplicates.", output)
+
+  def test_unknown_owner(self) -> None:
+    with self.assertRaises(CommandError):
+      self.run_command('--owner', 'not-a-uuid')
+    with self.assertRaises(CommandError):
+      self.run_command('--owner', '00000000-0000-0000-0000-000000000000')
+
+
+class BenchmarkSerializationTestCase(TestCase):
+  def test_reports_each_model(self) -> None:
+    output = StringIO()
+    call_command(
+      'benchmark_serialization', '--rows', '20', '--repeat', '1',
+      stdout=output
+    )
+    for model in ["Image", "Tag", "ImageTag"]:
+      self.assertRegex(output.getvalue(), rf"{model} +20 rows: serializer")
+    # the benchmark rows are rolled back
+    self.assertFalse(AppUser.objects.exists())
+    self.assertFalse(Image.objects.exists())
+
+
+class BenchmarkSlowClientsTestCase(TransactionTestCase):
+  # the serving threads read the Image, so it must be committed
+  def test_reports_both_servers(self) -> None:
+    output = StringIO()
+    call_command(
+      'benchmark_slow_clients', '--clients', '6', '--threads', '2',
+      '--file-size', '200000', '--delay', '0',
+      stdout=output
+    )
+    self.assertIn("WSGI: 2 download(s) at once, all 6 done", output.getvalue())
+    self.assertIn("ASGI: 6 download(s) at once, all 6 done", output.getvalue())
+    self.assertNotRegex(output.getvalue(), r"[1-9]\d* failed")
+    # the benchmark data is deleted
+    self.assertFalse(AppUser.objects.exists())
+    self.assertFalse(Image.objects.exists())
+
+
+class BenchmarkConnectionsTestCase(TestCase):
+  def test_reports_each_way(self) -> None:
+    output = StringIO()
+    call_command(
+      'benchmark_connections', '--requests', '20', '--threads', '2',
+      stdout=output
+    )
+    for way in ["closed per request", "kept per thread", "pooled"]:
+      self.assertRegex(output.getvalue(), rf"{way} +mean")
+    # two threads need no more than two pooled connections
+    self.assertRegex(output.getvalue(), r"pooled .* [12] connection\(s\) opened")
+
+  def test_bad_threads(self) -> None:
+    with self.assertRaises(CommandError):
+      call_command('benchmark_connections', '--threads', '0')
+
+
+class BenchmarkSimilarityTestCase(TestCase):
+  def test_reports_each_distance(self) -> None:
+    output = StringIO()
+    call_command(
+      'benchmark_similarity', '--images', '2000', '--lookups', '5',
+      stdout=output
+    )
+    self.assertIn("2000 hashes, 5 lookups per distance", output.getvalue())
+    self.assertRegex(
+      output.getvalue(), r"distance 10: +[\d.]+ candidates \( *[\d.]+% of the index\)"
+    )
+
+  def test_bad_images(self) -> None:
+    with self.assertRaises(CommandError):
+      call_command('benchmark_similarity', '--images', '0')
+
+
+class RunAsgiTestCase(TestCase):
+  def test_runs_uvicorn(self) -> None:
+    with patch("uvicorn.run") as run:
+      call_command('run_asgi', '--port', '9000', '--workers', '3')
+    run.assert_called_once()
+    self.assertEqual(run.call_args.args, ('MemeCataloger.asgi:application',))
+    self.assertEqual(run.call_args.kwargs["port"], 9000)
+    self.assertEqual(run.call_args.kwargs["workers"], 3)
+    self.assertEqual(run.call_args.kwargs["lifespan"], "off")
+
+  def test_bad_workers(self) -> None:
+    with self.assertRaises(CommandError):
+      call_command('run_asgi', '--workers', '0')
+
+
+class ExportCatalogTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    for index in range(3):
+      Image.objects.create(source=f"export_test_{index}.png", owner=cls.test_user)
+
+  def run_command(self, *args) -> str:
+    output = StringIO()
+    call_command('export_catalog', *args, stdout=output)
+    return output.getvalue()
+
+  def test_export_to_stdout(self) -> None:
+    lines: list = self.run_command('--owner', str(self.test_user.id)) \
+      .splitlines()
+    self.assertEqual(len(lines), 4)
+    self.assertIn('"type":"user"', lines[0])
+    self.assertIn('"source":"/media/export_test_', lines[1])
+
+  def test_gzip_to_file(self) -> None:
+    plain: str = self.run_command()
+    directory: str = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, directory)
+    path: str = os.path.join(directory, "catalog.ndjson.gz")
+    self.run_command('--gzip', '--output', path)
+    with gzip.open(path, 'rt', encoding='utf-8') as export:
+      self.assertEqual(export.read(), plain)
+    self.assertIn("test_user_2", plain)
+    # compressed bytes are not written to the text standard output
+    with self.assertRaises(CommandError):
+      self.run_command('--gzip')
+
+  def test_unknown_owner(self) -> None:
+    with self.assertRaises(CommandError):
+      self.run_command('--owner', 'not-a-uuid')
+    with self.assertRaises(CommandError):
+      self.run_command('--owner', '00000000-0000-0000-0000-000000000000')
+
+
+class ImportCatalogTestCase(TestCase):
+  def setUp(self) -> None:
+    # keep stored files out of the real MEDIA_ROOT
+    self.media_root: str = tempfile.mkdtemp()
+    media_override = override_settings(MEDIA_ROOT=self.media_root)
+    media_override.enable()
+    self.addCleanup(media_override.disable)
+    self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+    self.work_dir: str = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+
+    self.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    self.tags: list = [
+      Tag.objects.create(name=name, owner=self.test_user)
+      for name in ["cats", "dogs"]
+    ]
+    self.images: list = []
+    for color in ["red", "blue"]:
+      image_file = BytesIO()
+      PillowImage.new("RGB", (30, 20), color).save(image_file, "PNG")
+      image: Image = Image.objects.create(
+        source=ContentFile(image_file.getvalue(), name=f"{color}.png"),
+        owner=self.test_user,
+        description=color,
+        sha256=hashlib.sha256(image_file.getvalue()).hexdigest()
+      )
+      ImageTag.objects.create(image=image, tag=self.tags[0])
+      self.images.append(image)
+
+  def run_command(self, *args) -> tuple:
+    output, errors = StringIO(), StringIO()
+    call_command(
+      'import_catalog', '--workers', '0', *args,
+      stdout=output, stderr=errors
+    )
+    return output.getvalue(), errors.getvalue()
+
+  def export(self, name: str = "catalog.ndjson") -> str:
+    path: str = os.path.join(self.work_dir, name)
+    call_command('export_catalog', '--output', path)
+    return path
+
+  def test_round_trip(self) -> None:
+    path: str = self.export()
+    AppUser.objects.all().delete()
+    output, _ = self.run_command('--catalog', path)
+    self.assertIn(
+      "Imported 1 user(s), 2 tag(s), 2 image(s), 2 image-tag(s)", output
+    )
+    # the same catalog, down to the ids
+    with open(path, 'rb') as original:
+      self.assertEqual(open(self.export("again.ndjson"), 'rb').read(),
+        original.read())
+    revision: CatalogRevision = CatalogRevision.objects.get(
+      owner=self.test_user.id
+    )
+    self.assertGreater(revision.revision, 0)
+    # bulk-created Images are indexed for search all the same
+    self.assertEqual(
+      [image.id for image in search.search("blue")], [self.images[1].id]
+    )
+
+  def test_duplicates_matched(self) -> None:
+    path: str = self.export()
+    # the same catalog under new ids: everything matches what is there
+    with open(path) as original:
+      text: str = original.read()
+    for row in [self.test_user, *self.tags, *self.images]:
+      text = text.replace(str(row.id), str(uuid.uuid4()))
+    renamed_path: str = os.path.join(self.work_dir, "renamed.ndjson")
+    with open(renamed_path, 'w') as renamed:
+      renamed.write(text)
+
+    output, _ = self.run_command('--catalog', renamed_path)
+    self.assertIn("Imported 0 user(s), 0 tag(s), 0 image(s), 0 image-tag(s)",
+      output)
+    self.assertIn("skipped 7 duplicate(s)", output)
+    self.assertEqual(ImageTag.objects.count(), 2)
+
+  def test_media_directory(self) -> None:
+    media: str = os.path.join(self.work_dir, "media")
+    os.makedirs(os.path.join(media, "nested"))
+    for name in ["a.png", "nested/b.png"]:
+      PillowImage.new("RGB", (12, 8), "green").save(os.path.join(media, name))
+    shutil.copy(self.images[0].source.path, os.path.join(media, "nested/c.png"))
+    with open(os.path.join(media, "notes.txt"), 'w') as notes:
+      notes.write("not an image")
+
+    # through worker processes
+    output, _ = self.run_command(
+      '--workers', '2', '--media', media, '--owner', 'test_user_1'
+    )
+    # b.png repeats a.png, and c.png an Image already in the catalog
+    self.assertIn("1 image(s)", output)
+    self.assertIn("skipped 2 duplicate(s)", output)
+    image: Image = Image.objects.get(owner=self.test_user, width=12)
+    self.assertEqual(image.mime_type, "image/png")
+    self.assertIsNotNone(image.perceptual_hash)
+    self.assertTrue(image.source.name.startswith("cas/"))
+    self.assertTrue(os.path.exists(image.source.path))
+
+  def test_media_root(self) -> None:
+    path: str = self.export()
+    AppUser.objects.all().delete()
+    # files are copied in from the exporting deployment's media
+    old_media: str = os.path.join(self.work_dir, "old_media")
+    shutil.move(self.media_root, old_media)
+    os.makedirs(self.media_root)
+    output, errors = self.run_command(
+      '--catalog', path, '--media-root', old_media
+    )
+    self.assertIn("2 image(s)", output)
+    self.assertEqual(errors, "")
+    for image in Image.objects.all():
+      self.assertTrue(os.path.exists(image.source.path))
+      self.assertEqual(image.width, 30)
+
+  def test_checkpoint_resumes(self) -> None:
+    path: str = self.export()
+    AppUser.objects.all().delete()
+    checkpoint: str = os.path.join(self.work_dir, "checkpoint.json")
+    # as if a run stopped after the user and tags (lines 1 to 3)
+    self.run_command('--catalog', path, '--batch-size', '1',
+      '--checkpoint', checkpoint)
+    with open(checkpoint) as file:
+      state: dict = json.load(file)
+    self.assertEqual(list(state["inputs"].values()), [7])
+    Image.objects.all().delete()
+    state["inputs"] = {key: 3 for key in state["inputs"]}
+    with open(checkpoint, 'w') as file:
+      json.dump(state, file)
+
+    output, _ = self.run_command('--catalog', path, '--checkpoint', checkpoint)
+    self.assertIn(
+      "Imported 0 user(s), 0 tag(s), 2 image(s), 2 image-tag(s)", output
+    )
+    # and a finished import has nothing left to do
+    output, _ = self.run_command('--catalog', path, '--checkpoint', checkpoint)
+    self.assertIn("skipped 0 duplicate(s)", output)
+
+  def test_checkpoint_journals_remaps(self) -> None:
+    path: str = self.export()
+    # the same catalog under new ids, matched to the rows already there
+    with open(path) as original:
+      text: str = original.read()
+    for row in [self.test_user, *self.tags]:
+      text = text.replace(str(row.id), str(uuid.uuid4()))
+    renamed_path: str = os.path.join(self.work_dir, "renamed.ndjson")
+    with open(renamed_path, 'w') as renamed:
+      renamed.write(text)
+    checkpoint: str = os.path.join(self.work_dir, "checkpoint.json")
+    self.run_command('--catalog', renamed_path, '--batch-size', '1',
+      '--checkpoint', checkpoint)
+    # the checkpoint holds offsets only; remaps are in the journal
+    with open(checkpoint) as file:
+      state: dict = json.load(file)
+    self.assertEqual(list(state), ["inputs"])
+    with open(f"{checkpoint}.remapped") as file:
+      self.assertEqual(len(file.readlines()), 3)
+
+    # resumed after the user and tags, the rest still refer to them
+    ImageTag.objects.all().delete()
+    state["inputs"] = {key: 3 for key in state["inputs"]}
+    with open(checkpoint, 'w') as file:
+      json.dump(state, file)
+    output, errors = self.run_command(
+      '--catalog', renamed_path, '--checkpoint', checkpoint
+    )
+    self.assertIn("2 image-tag(s)", output)
+    self.assertEqual(errors, "")
+
+  def test_tag_without_id(self) -> None:
+    path: str = os.path.join(self.work_dir, "tags.ndjson")
+    with open(path, 'w') as catalog:
+      for data in [
+        {"owner": str(self.test_user.id), "name": "birds"},
+        {"owner": str(self.test_user.id)},
+      ]:
+        catalog.write(json.dumps({"type": "tag", "data": data}) + "\n")
+    output, errors = self.run_command('--catalog', path)
+    self.assertIn("1 tag(s)", output)
+    self.assertIn("1 error(s)", output)
+    self.assertTrue(Tag.objects.filter(name="birds").exists())
+
+  def test_imagetag_across_owners(self) -> None:
+    other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    other_tag: Tag = Tag.objects.create(name="cats", owner=other_user)
+    path: str = os.path.join(self.work_dir, "imagetags.ndjson")
+    with open(path, 'w') as catalog:
+      for tag in [other_tag, self.tags[1]]:
+        catalog.write(json.dumps({"type": "image-tag", "data": {
+          "image": str(self.images[0].id), "tag": str(tag.id)
+        }}) + "\n")
+    output, errors = self.run_command('--catalog', path)
+    self.assertIn("1 image-tag(s)", output)
+    self.assertIn("Image and tag have different owners.", errors)
+    self.assertFalse(ImageTag.objects.filter(tag=other_tag).exists())
+
+  def test_conflicts_not_counted(self) -> None:
+    # a new name, under the id of a Tag already there: skipped by the
+    # database, so neither counted nor indexed as imported
+    path: str = os.path.join(self.work_dir, "tags.ndjson")
+    with open(path, 'w') as catalog:
+      catalog.write(json.dumps({"type": "tag", "data": {
+        "id": str(self.tags[0].id),
+        "owner": str(self.test_user.id),
+        "name": "birds"
+      }}) + "\n")
+    before: int = CatalogRevision.objects.get(owner=self.test_user).revision
+    output, _ = self.run_command('--catalog', path)
+    self.assertIn("Imported 0 user(s), 0 tag(s)", output)
+    self.assertEqual(
+      CatalogRevision.objects.get(owner=self.test_user).revision, before
+    )
+
+  def test_bad_input(self) -> None:
+    with self.assertRaises(CommandError):
+      self.run_command()
+    with self.assertRaises(CommandError):
+      self.run_command('--media', self.work_dir)  # no --owner
+    path: str = os.path.join(self.work_dir, "bad.ndjson")
+    with open(path, 'w') as bad:
+      bad.write('{"type": "user"\n')
+    with self.assertRaises(CommandError):
+      self.run_command('--catalog', path)
+
+
+class ConvertUuidKeysTestCase(TestCase):
+  def run_command(self, *args) -> str:
+    output = StringIO()
+    call_command('convert_uuid_keys', *args, stdout=output)
+    return output.getvalue()
+
+  def test_planned_conversion(self) -> None:
+    # the test database is not MySQL, but the plan can still be shown
+    output: str = self.run_command('--dry-run')
+    for table, column in [
+      ("api_image", "id"),
+      ("api_image", "owner_id"),
+      ("api_imagetag", "tag_id"),
+      ("api_catalogrevision", "owner_id")
+    ]:
+      self.assertIn(
+        f'UPDATE "{table}" SET "{column}" = UNHEX("{column}");',
+        output
+      )
+    self.assertIn('MODIFY "id" BINARY(16) NOT NULL;', output)
+    # foreign keys are dropped first, and added back last
+    lines: list = output.splitlines()
+    self.assertIn("DROP FOREIGN KEY", lines[0])
+    self.assertIn("ADD CONSTRAINT", lines[-1])
+
+  def test_planned_conversion_back(self) -> None:
+    output: str = self.run_command('--dry-run', '--to', 'char')
+    self.assertIn('UPDATE "api_tag" SET "id" = LOWER(HEX("id"));', output)
+    self.assertIn('MODIFY "id" CHAR(32) NOT NULL;', output)
+
+  def test_only_mysql_converted(self) -> None:
+    with self.assertRaises(CommandError):
+      self.run_command()
@@ -0,0 +1,163 @@
+"""Tests for the database connection pool in the api package.
+Test classes in this module check:
+  - reuse, bounds, checks and expiry of connections in ConnectionPool
+  - the pooled SQLite backend reusing connections across requests
+"""
+
+from django.test import SimpleTestCase
+from unittest.mock import patch
+import os
+import sqlite3
+import tempfile
+import threading
+from django.db import connection
+from django.db.utils import load_backend
+from api import db_pool
+from api.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+  def __init__(self) -> None:
+    self.closed: bool = False
+    self.healthy: bool = True
+
+  def close(self) -> None:
+    self.closed = True
+
+
+def check(fake: FakeConnection) -> None:
+  if not fake.healthy:
+    raise OSError("server has gone away")
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+  def setUp(self) -> None:
+    self.opened: list = []
+    self.pool = ConnectionPool(check, max_size=2, timeout=0.05)
+
+  def connect(self) -> FakeConnection:
+    fake = FakeConnection()
+    self.opened.append(fake)
+    return fake
+
+  def test_reuses_connections(self) -> None:
+    first, fresh = self.pool.acquire(self.connect)
+    self.assertTrue(fresh)
+    self.pool.release(first)
+    second, fresh = self.pool.acquire(self.connect)
+    self.assertFalse(fresh)
+    self.assertIs(second, first)
+    self.assertEqual(len(self.opened), 1)
+    self.assertEqual(self.pool.stats(), {'open': 1, 'idle': 0, 'in_use': 1})
+
+  def test_bounded(self) -> None:
+    self.pool.acquire(self.connect)
+    second, _ = self.pool.acquire(self.connect)
+    with self.assertRaises(PoolTimeout):
+      self.pool.acquire(self.connect)
+    # a thread waiting gets the connection handed back meanwhile
+    threading.Timer(0.01, self.pool.release, [second]).start()
+    self.pool.timeout = 5
+    third, fresh = self.pool.acquire(self.connect)
+    self.assertIs(third, second)
+    self.assertFalse(fresh)
+    self.assertEqual(len(self.opened), 2)
+
+  def test_failed_check_replaces_connection(self) -> None:
+    self.pool.check_after = 0
+    first, _ = self.pool.acquire(self.connect)
+    self.pool.release(first)
+    first.healthy = False
+    second, fresh = self.pool.acquire(self.connect)
+    self.assertTrue(fresh)
+    self.assertIsNot(second, first)
+    self.assertTrue(first.closed)
+    self.assertEqual(self.pool.stats()['open'], 1)
+
+  def test_recent_connections_not_checked(self) -> None:
+    first, _ = self.pool.acquire(self.connect)
+    self.pool.release(first)
+    first.healthy = False
+    self.assertIs(self.pool.acquire(self.connect)[0], first)
+
+  def test_expiry(self) -> None:
+    first, _ = self.pool.acquire(self.connect)
+    self.pool.release(first)
+    self.pool.max_idle = 0
+    second, fresh = self.pool.acquire(self.connect)
+    self.assertTrue(fresh)
+    self.assertTrue(first.closed)
+    # a connection past its lifetime is closed as it is handed back
+    self.pool.max_idle = 300
+    self.pool.max_lifetime = 0
+    self.pool.release(second)
+    self.assertTrue(second.closed)
+    self.assertEqual(self.pool.stats(), {'open': 0, 'idle': 0, 'in_use': 0})
+
+  def test_unclean_connections_closed(self) -> None:
+    first, _ = self.pool.acquire(self.connect)
+    self.pool.release(first, reusable=False)
+    self.assertTrue(first.closed)
+    self.assertTrue(self.pool.acquire(self.connect)[1])
+
+  def test_failed_connect_frees_room(self) -> None:
+    def refuse() -> FakeConnection:
+      raise OSError("connection refused")
+
+    for _ in range(3):
+      with self.assertRaises(OSError):
+        self.pool.acquire(refuse)
+    self.assertEqual(self.pool.stats()['open'], 0)
+
+  def test_fork_starts_empty(self) -> None:
+    first, _ = self.pool.acquire(self.connect)
+    self.pool.release(first)
+    with patch("os.getpid", return_value=os.getpid() + 1):
+      self.assertTrue(self.pool.acquire(self.connect)[1])
+    # the parent's connection is left open
+    self.assertFalse(first.closed)
+
+
+class PooledBackendTestCase(SimpleTestCase):
+  def setUp(self) -> None:
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.settings_dict: dict = {
+      **connection.settings_dict,
+      'ENGINE': 'api.backends.sqlite3',
+      'NAME': os.path.join(directory.name, 'pooled.sqlite3'),
+      'POOL': {'MAX_SIZE': 1}
+    }
+    self.addCleanup(db_pool.discard_pool, 'pooled')
+
+  def test_reuses_connections(self) -> None:
+    backend = load_backend('api.backends.sqlite3')
+    wrapper = backend.DatabaseWrapper(self.settings_dict, 'pooled')
+    opened: list = []
+    connect = sqlite3.dbapi2.connect
+
+    def counting_connect(*args, **kwargs):
+      opened.append(True)
+      return connect(*args, **kwargs)
+
+    with patch.object(backend.DatabaseWrapper.Database, 'connect', counting_connect):
+      for _ in range(3):
+        with wrapper.cursor() as cursor:
+          cursor.execute('SELECT 1')
+        wrapper.close()
+    self.assertEqual(len(opened), 1)
+    self.assertEqual(
+      db_pool.pool_for('pooled', {}, None).stats(),
+      {'open': 1, 'idle': 1, 'in_use': 0}
+    )
+
+  def test_transaction_not_reused(self) -> None:
+    backend = load_backend('api.backends.sqlite3')
+    wrapper = backend.DatabaseWrapper(self.settings_dict, 'pooled')
+    wrapper.ensure_connection()
+    wrapper.set_autocommit(False)
+    raw = wrapper.connection
+    wrapper.close()
+    wrapper.ensure_connection()
+    self.assertIsNot(wrapper.connection, raw)
+    wrapper.close()
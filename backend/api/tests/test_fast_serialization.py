@@ -0,0 +1,142 @@
+"""Tests for the list serialization fast path in the api package.
+Test classes in this module check:
+  - the fast path against the serializers, on awkward data
+  - the list views falling back to the serializers when they must
+"""
+
+from django.test import Client, RequestFactory, TestCase
+from unittest.mock import patch
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from django.core.cache import cache
+from api.fast_serialization import row_converter
+from api.models import AppUser, Image, ImageTag, Tag
+from api.serializers import ImageSerializer, ImageTagSerializer, TagSerializer
+from api.serializers import ImageWithTagsSerializer
+
+
+class RowConverterTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.images: list = [
+      Image.objects.create(
+        source=source,
+        owner=cls.test_user,
+        description=description,
+        width=width,
+        perceptual_hash=perceptual_hash
+      )
+      for source, description, width, perceptual_hash in [
+        ("cas/ab/cd/plain.png", "plain", 640, -(1 << 63)),
+        # names whose URL has to be quoted or resolved
+        ("with space.png", "café   line", None, None),
+        ("dir/./dots/../x%20y.png", "quote \" and \\ slash", 1, 0),
+        ("ümläut.png", "\x00 control \x1f", None, 1 << 62),
+        ("", "no source", None, None)
+      ]
+    ]
+    cls.tags: list = [
+      Tag.objects.create(name=name, owner=cls.test_user)
+      for name in ["plain", "  😀"]
+    ]
+    for image in cls.images[:3]:
+      for tag in cls.tags:
+        ImageTag.objects.create(image=image, tag=tag)
+
+  def setUp(self) -> None:
+    self.request = RequestFactory().get('/api/image/', SERVER_NAME='backend')
+    self.renderer = JSONRenderer()
+
+  def assert_same_output(self, serializer_class, read_raw: bool) -> None:
+    model = serializer_class.Meta.model
+    expected: bytes = self.renderer.render(serializer_class(
+      model.objects.order_by('pk'),
+      many=True,
+      context={'request': self.request}
+    ).data)
+    columns, convert = row_converter(serializer_class, self.request, read_raw)
+    found: bytes = self.renderer.render(
+      convert(model.objects.order_by('pk').values_list(*columns))
+    )
+    self.assertEqual(found, expected)
+
+  def test_same_output(self) -> None:
+    for serializer_class in [ImageSerializer, TagSerializer, ImageTagSerializer]:
+      for read_raw in [False, True]:
+        with self.subTest(serializer=serializer_class.__name__, raw=read_raw):
+          self.assert_same_output(serializer_class, read_raw)
+
+  def test_without_request(self) -> None:
+    # relative URLs, as serializers give without a request
+    self.request = None
+    self.assert_same_output(ImageSerializer, True)
+
+  def test_unsupported_fields(self) -> None:
+    class DescribedTagSerializer(TagSerializer):
+      description = serializers.SerializerMethodField()
+
+      def get_description(self, tag: Tag) -> str:
+        return tag.name.upper()
+
+    class OwnerNameSerializer(TagSerializer):
+      owner = serializers.CharField(source='owner.username')
+
+    self.assertIsNone(row_converter(DescribedTagSerializer))
+    self.assertIsNone(row_converter(OwnerNameSerializer))
+
+
+class FastListViewTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.test_tag: Tag = Tag.objects.create(name="test_tag", owner=cls.test_user)
+    for index in range(3):
+      image: Image = Image.objects.create(
+        source=f"fast_test_{index}.png",
+        owner=cls.test_user
+      )
+      ImageTag.objects.create(image=image, tag=cls.test_tag)
+
+  def setUp(self) -> None:
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    cache.clear()  # responses cached by earlier requests would skip the view
+
+  def get_both(self, url: str) -> tuple:
+    """Returns the responses to url with and without the fast path."""
+
+    fast = self.client.get(url)
+    cache.clear()
+    with patch("api.views.row_converter", return_value=None):
+      slow = self.client.get(url)
+    return fast, slow
+
+  def test_same_responses(self) -> None:
+    for url in [
+      '/api/image/?page_size=2',
+      '/api/tag/',
+      f'/api/image-tag/?owner={self.test_user.id}'
+    ]:
+      fast, slow = self.get_both(url)
+      self.assertEqual(fast.status_code, 200)
+      self.assertEqual(fast.content, slow.content)
+      self.assertEqual(fast["Content-Type"], slow["Content-Type"])
+
+  def test_pagination_links(self) -> None:
+    # the cursor is made from rows read by the fast path
+    first = self.client.get('/api/image/?page_size=2').json()
+    second = self.client.get(first["next"]).json()
+    self.assertEqual(len(second["results"]), 1)
+    fast, slow = self.get_both(first["next"])
+    self.assertEqual(fast.content, slow.content)
+
+  def test_fallback(self) -> None:
+    # Tags are embedded by a method field, which only the serializer has
+    self.assertIsNone(row_converter(ImageWithTagsSerializer))
+    response = self.client.get('/api/image/?expand=tags')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(
+      response.json()["results"][0]["tags"],
+      [{"id": str(self.test_tag.id), "name": "test_tag"}]
+    )
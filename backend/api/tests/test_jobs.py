@@ -0,0 +1,173 @@
+"""Tests for the background job queue in the api package.
+Test classes in this module check:
+  - queueing of jobs, including idempotent keys
+  - claiming and running of jobs, including retries with backoff
+  - the jobs queued for new Images, and their handler
+"""
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.conf import settings
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+from django.core.management import call_command
+from io import StringIO
+import hashlib
+import tempfile
+from PIL import Image as PillowImage
+from api import jobs
+from api.models import AppUser, Image, Job
+
+
+class JobQueueTestCase(TestCase):
+  def setUp(self) -> None:
+    self.calls: list = []
+    jobs.handler('test_job')(self.calls.append)
+    self.addCleanup(jobs._handlers.pop, 'test_job')
+
+  def test_enqueue_is_idempotent(self) -> None:
+    first_job: Job = jobs.enqueue('test_job', {'n': 1})
+    second_job: Job = jobs.enqueue('test_job', {'n': 1})
+    self.assertEqual(first_job.id, second_job.id)
+    self.assertEqual(Job.objects.filter(kind='test_job').count(), 1)
+    # a different payload is a different piece of work
+    jobs.enqueue('test_job', {'n': 2})
+    self.assertEqual(Job.objects.filter(kind='test_job').count(), 2)
+
+  def test_run_pending(self) -> None:
+    jobs.enqueue('test_job', {'n': 1})
+    jobs.enqueue('test_job', {'n': 2})
+    self.assertEqual(jobs.run_pending(), 2)
+    self.assertCountEqual(self.calls, [{'n': 1}, {'n': 2}])
+    self.assertFalse(Job.objects.exclude(status=Job.Status.DONE).exists())
+    # nothing left to do
+    self.assertEqual(jobs.run_pending(), 0)
+
+  def test_job_not_run_before_due(self) -> None:
+    jobs.enqueue(
+      'test_job',
+      {'n': 1},
+      run_after=timezone.now() + timedelta(minutes=5)
+    )
+    self.assertEqual(jobs.run_pending(), 0)
+
+  def test_job_claimed_once(self) -> None:
+    job: Job = jobs.enqueue('test_job', {'n': 1})
+    self.assertEqual(jobs.claim_next('worker-1').id, job.id)
+    # already running, so there is nothing for another worker
+    self.assertIsNone(jobs.claim_next('worker-2'))
+
+  def test_expired_lease_reclaimed(self) -> None:
+    job: Job = jobs.enqueue('test_job', {'n': 1})
+    jobs.claim_next('worker-1')
+    Job.objects.filter(id=job.id).update(
+      locked_at=timezone.now() - jobs.LEASE - timedelta(seconds=1)
+    )
+    reclaimed: Job = jobs.claim_next('worker-2')
+    self.assertEqual(reclaimed.id, job.id)
+    self.assertEqual(reclaimed.locked_by, 'worker-2')
+    self.assertEqual(reclaimed.attempts, 2)
+
+  def test_failed_job_retried_with_backoff(self) -> None:
+    def fail(payload: dict) -> None:
+      raise RuntimeError("something went wrong")
+    jobs.handler('failing_job')(fail)
+    self.addCleanup(jobs._handlers.pop, 'failing_job')
+
+    job: Job = jobs.enqueue('failing_job')
+    before_run = timezone.now()
+    self.assertEqual(jobs.run_pending(), 1)
+    job.refresh_from_db()
+    self.assertEqual(job.status, Job.Status.PENDING)
+    self.assertIn("something went wrong", job.last_error)
+    self.assertGreater(job.run_after, before_run)
+
+    # retry delays grow with each attempt, up to a limit
+    self.assertLess(jobs.retry_delay(1), jobs.retry_delay(3))
+    self.assertLessEqual(jobs.retry_delay(50), jobs.RETRY_MAX_DELAY)
+
+    # once out of attempts, the job is marked failed
+    Job.objects.filter(id=job.id).update(
+      attempts=jobs.MAX_ATTEMPTS - 1,
+      run_after=timezone.now()
+    )
+    jobs.run_pending()
+    job.refresh_from_db()
+    self.assertEqual(job.status, Job.Status.FAILED)
+
+  def test_run_workers_once(self) -> None:
+    jobs.enqueue('test_job', {'n': 1})
+    output = StringIO()
+    call_command('run_workers', '--once', stdout=output)
+    self.assertEqual(self.calls, [{'n': 1}])
+    self.assertIn("Ran 1 job(s).", output.getvalue())
+
+
+class ProcessImageJobTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.file_name: str = "job_test_file.png"
+    PillowImage.new("RGB", (1000, 500), color="green").save(
+      f"{settings.MEDIA_ROOT}/{cls.file_name}"
+    )
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    Path(f"{settings.MEDIA_ROOT}/{cls.file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self) -> None:
+    self.cache_dir = tempfile.TemporaryDirectory()
+    cache_settings = override_settings(THUMBNAIL_CACHE_ROOT=self.cache_dir.name)
+    cache_settings.enable()
+    self.addCleanup(cache_settings.disable)
+    self.addCleanup(self.cache_dir.cleanup)
+
+  def test_job_queued_for_new_image(self) -> None:
+    test_image: Image = Image.objects.create(
+      source=self.file_name,
+      owner=self.test_user
+    )
+    job: Job = Job.objects.get(key=f"process_image:{test_image.id}")
+    self.assertEqual(job.payload, {'image-id': str(test_image.id)})
+    # but not queued again when the image is edited
+    test_image.description = "edited"
+    test_image.save()
+    self.assertEqual(Job.objects.filter(kind='process_image').count(), 1)
+
+  def test_process_image(self) -> None:
+    test_image: Image = Image.objects.create(
+      source=self.file_name,
+      owner=self.test_user
+    )
+    jobs.run_pending()
+    test_image.refresh_from_db()
+    expected_hash: str = hashlib.sha256(
+      Path(f"{settings.MEDIA_ROOT}/{self.file_name}").read_bytes()
+    ).hexdigest()
+    self.assertEqual(test_image.sha256, expected_hash)
+    self.assertEqual((test_image.width, test_image.height), (1000, 500))
+    self.assertEqual(test_image.mime_type, "image/png")
+    self.assertIsNotNone(test_image.perceptual_hash)
+    self.assertEqual(
+      test_image.byte_size,
+      Path(f"{settings.MEDIA_ROOT}/{self.file_name}").stat().st_size
+    )
+    # the thumbnail is already rendered, ready for the image grid
+    self.assertTrue(list(Path(self.cache_dir.name).glob("??/*-w640.webp")))
+
+  def test_deleted_image_skipped(self) -> None:
+    test_image: Image = Image.objects.create(
+      source=self.file_name,
+      owner=self.test_user
+    )
+    test_image.delete()
+    with patch("api.tasks.get_variant") as get_variant:
+      jobs.run_pending()
+      get_variant.assert_not_called()
+    self.assertEqual(
+      Job.objects.get(kind='process_image').status,
+      Job.Status.DONE
+    )
@@ -0,0 +1,120 @@
+"""Tests for request metrics in the api package.
+Test classes in this module check:
+  - the Server-Timing header of each response
+  - the totals served at /metrics, per route
+  - leaving the middleware out when metrics are turned off
+"""
+
+from django.test import Client, TestCase, override_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import re
+from api import metrics
+from api.metrics import Histogram
+from api.models import AppUser, Tag
+
+
+class HistogramTestCase(TestCase):
+  def test_cumulative_buckets(self) -> None:
+    histogram = Histogram((1, 5))
+    for value in [0, 1, 2, 5, 9]:
+      histogram.observe(value)
+    self.assertEqual(histogram.lines('x', 'a="b"'), [
+      'x_bucket{a="b",le="1"} 2',
+      'x_bucket{a="b",le="5"} 4',
+      'x_bucket{a="b",le="+Inf"} 5',
+      'x_sum{a="b"} 17.0',
+      'x_count{a="b"} 5',
+    ])
+
+
+class RequestMetricsTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    for index in range(3):
+      Tag.objects.create(owner=cls.test_user, name=f"tag_{index}")
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    cache.clear()  # responses cached by earlier tests would skip the view
+    metrics.reset()
+    self.addCleanup(metrics.reset)
+
+  def test_server_timing(self) -> None:
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get('/api/tag/')
+    self.assertEqual(response.status_code, 200)
+    timing: str = response["Server-Timing"]
+    self.assertRegex(timing, r'^db;dur=[\d.]+;desc="(\d+) queries", ')
+    self.assertEqual(
+      int(re.search(r'desc="(\d+) queries"', timing).group(1)),
+      len(queries.captured_queries)
+    )
+    self.assertRegex(timing, r"serialize;dur=[\d.]+")
+    self.assertRegex(timing, r"total;dur=[\d.]+$")
+
+  def test_totals_per_route(self) -> None:
+    for _ in range(2):
+      self.client.get(f'/api/tag/?owner={self.test_user.id}')
+    size: int = len(self.client.get('/api/tag/').content)
+    self.client.get(f'/api/tag/{self.test_user.id}')  # no such Tag: 400
+    response = self.client.get('/metrics')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response["Content-Type"], metrics.EXPOSITION_CONTENT_TYPE)
+    body: str = response.content.decode()
+    self.assertIn(
+      'http_responses_total{route="/api/tag/",method="GET",status="200"} 3',
+      body
+    )
+    self.assertIn(
+      'http_responses_total{route="/api/tag/<uuid:tag_id>",method="GET",'
+      'status="400"} 1',
+      body
+    )
+    self.assertIn(
+      'http_request_duration_seconds_count{route="/api/tag/",method="GET"} 3',
+      body
+    )
+    self.assertIn(
+      'http_request_db_queries_bucket{route="/api/tag/",method="GET",le="+Inf"} 3',
+      body
+    )
+    self.assertRegex(
+      body,
+      r'http_request_db_seconds_total\{route="/api/tag/",method="GET"\} [\d.e-]+'
+    )
+    # sizes are summed over the three requests, one of them measured here
+    total: int = int(re.search(
+      r'http_response_size_bytes_sum\{route="/api/tag/",method="GET"\} (\d+)',
+      body
+    ).group(1))
+    self.assertGreater(total, size)
+
+  def test_streamed_size_counted(self) -> None:
+    response = self.client.get(f'/api/export?owner={self.test_user.id}')
+    sent: int = len(b"".join(response.streaming_content))
+    body: str = self.client.get('/metrics').content.decode()
+    self.assertIn(
+      f'http_response_size_bytes_sum{{route="/api/export",method="GET"}} '
+      f'{float(sent)}',
+      body
+    )
+
+  def test_unmatched(self) -> None:
+    self.client.get('/no/such/page')
+    self.assertIn(
+      'http_responses_total{route="unmatched",method="GET",status="404"} 1',
+      self.client.get('/metrics').content.decode()
+    )
+
+  def test_bad_method(self) -> None:
+    self.assertEqual(self.client.post('/metrics').status_code, 405)
+
+  @override_settings(API_METRICS=False)
+  def test_turned_off(self) -> None:
+    response = Client().get('/api/tag/')
+    self.assertNotIn("Server-Timing", response)
+    self.assertNotIn("http_responses_total{", metrics.exposition())
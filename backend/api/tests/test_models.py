@@ -3,12 +3,25 @@ Test classes in this module check their target model for:
   - successful creation of a test object
   - a valid UUID assigned to the test object
   - any custom fields on the model
+QueryPlanTestCase checks that hot lookups are answered from indexes.
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.core.files.base import ContentFile
+from unittest.mock import Mock
+from pathlib import Path
+import hashlib
 import re
-from api.models import AppUser, Image, Tag, ImageTag
+import shutil
+import tempfile
+import threading
+from api.models import AppUser, Image, Tag, ImageTag, CatalogRevision
+from api.fields import CompactUUIDField, uuid7
+from api import revisions
+from django.db import connection
 from django.db.utils import IntegrityError
+import json
+import uuid
 
 
 class AppUserTestCase(TestCase):
@@ -75,6 +88,135 @@ class ImageTestCase(TestCase):
     self.assertEqual(test_image.description, description_string)
 
 
+class ContentAddressedSourceTestCase(TestCase):
+  def setUp(self) -> None:
+    # keep stored files out of the real MEDIA_ROOT
+    self.media_root: str = tempfile.mkdtemp()
+    media_override = override_settings(MEDIA_ROOT=self.media_root)
+    media_override.enable()
+    self.addCleanup(media_override.disable)
+    self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+    self.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    self.content: bytes = b"not really a meme"
+
+  def test_source_named_by_content(self) -> None:
+    test_image: Image = Image.objects.create(
+      source=ContentFile(self.content, name="Funny Meme.PNG"),
+      owner=self.test_user
+    )
+    sha256: str = hashlib.sha256(self.content).hexdigest()
+    self.assertEqual(
+      test_image.source.name,
+      f"cas/{sha256[:2]}/{sha256[2:4]}/{sha256}.png"
+    )
+    self.assertEqual(Path(test_image.source.path).read_bytes(), self.content)
+
+  def test_identical_uploads_share_file(self) -> None:
+    first: Image = Image.objects.create(
+      source=ContentFile(self.content, name="first.png"),
+      owner=self.test_user
+    )
+    second: Image = Image.objects.create(
+      source=ContentFile(self.content, name="second.png"),
+      owner=self.test_user
+    )
+    self.assertEqual(first.source.name, second.source.name)
+    stored: list = [
+      path for path in Path(self.media_root).rglob("*") if path.is_file()
+    ]
+    self.assertEqual(len(stored), 1)  # one file, two Images
+
+  def test_different_uploads_kept_apart(self) -> None:
+    first: Image = Image.objects.create(
+      source=ContentFile(self.content, name="first.png"),
+      owner=self.test_user
+    )
+    second: Image = Image.objects.create(
+      source=ContentFile(b"a different meme", name="first.png"),
+      owner=self.test_user
+    )
+    self.assertNotEqual(first.source.name, second.source.name)
+
+
+  def test_concurrent_saves(self) -> None:
+    # threads of one process saving the same content each write a
+    # temporary file of their own
+    storage = Image._meta.get_field('source').storage
+    content: bytes = self.content * 100000
+    name: str = storage.content_name("meme.png", ContentFile(content))
+    errors: list = []
+    start = threading.Barrier(8)
+
+    def save() -> None:
+      start.wait()
+      try:
+        storage._save(name, ContentFile(content))
+      except Exception as error:
+        errors.append(error)
+
+    threads: list = [threading.Thread(target=save) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(errors, [])
+    path: Path = Path(storage.path(name))
+    self.assertEqual(path.read_bytes(), content)
+    self.assertEqual(path.stat().st_mode & 0o777, 0o644)
+    self.assertEqual(list(path.parent.glob("*.tmp")), [])
+
+
+class CompactUUIDKeyTestCase(TestCase):
+  """Checks the time-ordered keys and binary storage used when
+  settings.COMPACT_UUID_KEYS is enabled (see api.fields)."""
+
+  def test_uuid7_format(self) -> None:
+    key = uuid7()
+    self.assertEqual(key.version, 7)
+    self.assertEqual(key.variant, uuid.RFC_4122)
+
+  def test_uuid7_time_ordered(self) -> None:
+    # strictly increasing, even when made within the same millisecond
+    keys: list = [uuid7() for _ in range(1000)]
+    self.assertEqual(keys, sorted(keys))
+    self.assertEqual(len(set(keys)), len(keys))
+    self.assertEqual(str(keys), str(sorted(keys, key=str)))
+
+  def test_keys_random_by_default(self) -> None:
+    test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    self.assertEqual(test_user.id.version, 4)
+
+  @override_settings(COMPACT_UUID_KEYS=True)
+  def test_keys_time_ordered_when_enabled(self) -> None:
+    test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    self.assertEqual(test_user.id.version, 7)
+    images: list = [
+      Image.objects.create(source=f"key_test_{index}.png", owner=test_user)
+      for index in range(5)
+    ]
+    self.assertEqual(
+      list(Image.objects.order_by("id")),
+      images
+    )
+
+  @override_settings(COMPACT_UUID_KEYS=True)
+  def test_binary_storage_on_mysql(self) -> None:
+    field = CompactUUIDField()
+    mysql = Mock(vendor="mysql")
+    key = uuid7()
+    self.assertEqual(field.db_type(mysql), "binary(16)")
+    self.assertEqual(field.get_db_prep_value(key, mysql), key.bytes)
+    self.assertEqual(field.get_db_prep_value(str(key), mysql), key.bytes)
+    self.assertEqual(field.from_db_value(key.bytes, None, mysql), key)
+
+  def test_char_storage_otherwise(self) -> None:
+    field = CompactUUIDField()
+    mysql = Mock(vendor="mysql", features=Mock(has_native_uuid_field=False))
+    key = uuid7()
+    self.assertEqual(field.get_db_prep_value(key, mysql), key.hex)
+    self.assertEqual(field.get_internal_type(), "UUIDField")
+
+
 class TagTestCase(TestCase):
   def setUp(self) -> None:
     test_user: AppUser = AppUser.objects.create(username="test_user_1")
@@ -129,3 +271,130 @@ class ImageTagTestCase(TestCase):
       str(test_imagetag.id)
     )
     self.assertTrue(is_uuid)
+
+  def test_imagetag_unique(self) -> None:
+    with self.assertRaises(IntegrityError):
+      ImageTag.objects.create(image=self.test_image, tag=self.test_tag)
+
+
+class CatalogRevisionTestCase(TestCase):
+  def setUp(self) -> None:
+    self.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+
+  def current_revision(self) -> int:
+    return CatalogRevision.objects.get(owner=self.test_user).revision
+
+  def test_revision_created_with_user(self) -> None:
+    self.assertEqual(self.current_revision(), 0)
+
+  def test_revision_bumped_by_changes(self) -> None:
+    test_image: Image = Image.objects.create(
+      source="test.png",
+      owner=self.test_user
+    )
+    test_tag: Tag = Tag.objects.create(name="test_tag", owner=self.test_user)
+    test_imagetag: ImageTag = ImageTag.objects.create(
+      image=test_image,
+      tag=test_tag
+    )
+    self.assertEqual(self.current_revision(), 3)
+    test_imagetag.delete()
+    self.assertEqual(self.current_revision(), 4)
+
+  def test_revision_bumped_once_in_batch(self) -> None:
+    test_image: Image = Image.objects.create(
+      source="test.png",
+      owner=self.test_user
+    )
+    test_tag: Tag = Tag.objects.create(name="test_tag", owner=self.test_user)
+    ImageTag.objects.create(image=test_image, tag=test_tag)
+    other_tag: Tag = Tag.objects.create(name="other_tag", owner=self.test_user)
+    ImageTag.objects.create(image=test_image, tag=other_tag)
+    before: int = self.current_revision()
+    # the Tag, and the ImageTag deleted with it, send a signal each
+    with revisions.batch(), self.assertNumQueries(5):
+      test_tag.delete()
+      self.assertEqual(self.current_revision(), before)
+    self.assertEqual(self.current_revision(), before + 1)
+    # the owner of a Tag given need not be looked up
+    with revisions.batch({other_tag.id: self.test_user.id}), \
+        self.assertNumQueries(3):
+      other_tag.delete()
+    self.assertEqual(self.current_revision(), before + 2)
+
+  def test_batch_with_hashes(self) -> None:
+    with revisions.batch():
+      Image.objects.create(source="test.png", owner=self.test_user)
+    revision: CatalogRevision = CatalogRevision.objects.get(owner=self.test_user)
+    self.assertEqual((revision.revision, revision.hashes), (1, 1))
+
+  def test_revision_kept_by_hashes(self) -> None:
+    # hashes are derived from the media file, not catalog data
+    test_image: Image = Image.objects.create(
+      source="test.png",
+      owner=self.test_user
+    )
+    test_image.sha256 = "0" * 64
+    test_image.perceptual_hash = 0
+    test_image.save(update_fields=["sha256", "perceptual_hash"])
+    self.assertEqual(self.current_revision(), 1)
+    test_image.description = "a test"
+    test_image.save(update_fields=["description", "sha256"])
+    self.assertEqual(self.current_revision(), 2)
+
+
+class QueryPlanTestCase(TestCase):
+  """Checks, with EXPLAIN, that the lookups api.views relies on are
+  answered from indexes rather than by scanning whole tables.
+  Only SQLite and MySQL plans are understood; other databases skip."""
+
+  def full_scans(self, queryset) -> list:
+    """Returns the tables (or indexes) the query reads in full."""
+
+    if connection.vendor == "sqlite":
+      # SEARCH uses an index to find rows; SCAN reads every one
+      plan: str = queryset.explain()
+      scans: list = re.findall(r"\bSCAN (\w+)", plan)
+      if "TEMP B-TREE" in plan:
+        scans.append("sort")  # ordered without an index
+      return scans
+    if connection.vendor == "mysql":
+      scans = []
+
+      def walk(node) -> None:
+        if isinstance(node, dict):
+          if node.get("access_type") == "ALL":
+            scans.append(node.get("table_name"))
+          for value in node.values():
+            walk(value)
+        elif isinstance(node, list):
+          for value in node:
+            walk(value)
+
+      walk(json.loads(queryset.explain(format="json")))
+      return scans
+    self.skipTest(f"query plans not checked on {connection.vendor}")
+
+  def test_owner_image_listing(self) -> None:
+    queryset = Image.objects.filter(owner_id=uuid.uuid4()) \
+      .order_by("-uploaded_at", "-id")[:50]
+    self.assertEqual(self.full_scans(queryset), [])
+
+  def test_tag_by_name(self) -> None:
+    queryset = Tag.objects.filter(owner_id=uuid.uuid4(), name="funny")
+    self.assertEqual(self.full_scans(queryset), [])
+
+  def test_images_of_tag(self) -> None:
+    queryset = ImageTag.objects.filter(tag_id=uuid.uuid4()) \
+      .values_list("image_id", flat=True)
+    self.assertEqual(self.full_scans(queryset), [])
+
+  def test_tags_of_image(self) -> None:
+    queryset = ImageTag.objects.filter(image_id=uuid.uuid4())
+    self.assertEqual(self.full_scans(queryset), [])
+
+  def test_owner_imagetags(self) -> None:
+    # as read to build the tag index (see api.tag_index)
+    queryset = ImageTag.objects.filter(tag__owner_id=uuid.uuid4()) \
+      .values_list("tag_id", "image_id")
+    self.assertEqual(self.full_scans(queryset), [])
@@ -0,0 +1,90 @@
+"""Tests for watching the SQL of each request in the api package.
+The views below are served by this module as a URLconf of its own.
+Test classes in this module check:
+  - the shapes queries are compared by
+  - views over their query budget failing, or being logged
+  - warnings of repeated (N+1) and slow queries
+  - every view in api.urls declaring a budget
+"""
+
+from django.test import Client, TestCase, override_settings
+from django.http import HttpResponse
+from django.urls import path
+from api import urls as api_urls
+from api.models import AppUser
+from api.query_watch import QueryBudgetExceeded, query_budget, query_shape
+
+
+def user_count_view(request) -> HttpResponse:
+  # one query per "times"
+  for _ in range(int(request.GET.get('times', 1))):
+    AppUser.objects.filter(username="test_user_1").exists()
+  return HttpResponse(status=200)
+
+
+def unbudgeted_view(request) -> HttpResponse:
+  # budgets belong to the view function, wherever it is routed
+  return user_count_view(request)
+
+
+urlpatterns = [
+  path('budget-3', query_budget(3)(user_count_view)),
+  path('no-budget', unbudgeted_view),
+]
+
+
+@override_settings(ROOT_URLCONF='api.tests.test_query_watch')
+class QueryWatchTestCase(TestCase):
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+
+  def test_query_shape(self) -> None:
+    self.assertEqual(
+      query_shape('SELECT 1 FROM t WHERE a IN (%s, %s, %s) AND b = \'it\'\'s\''),
+      query_shape('SELECT 2 FROM t WHERE a IN (%s) AND b = \'x\''),
+    )
+    self.assertNotEqual(
+      query_shape('SELECT a FROM t'), query_shape('SELECT b FROM t')
+    )
+
+  def test_within_budget(self) -> None:
+    self.assertEqual(self.client.get('/budget-3?times=3').status_code, 200)
+
+  def test_over_budget_fails(self) -> None:
+    with self.assertRaises(QueryBudgetExceeded) as raised:
+      self.client.get('/budget-3?times=4')
+    self.assertIn(
+      "GET /budget-3 ran 4 queries, over its budget of 3", str(raised.exception)
+    )
+    # each query is listed
+    self.assertIn("4. SELECT", str(raised.exception))
+
+  @override_settings(QUERY_WATCH_STRICT=False)
+  def test_over_budget_logged(self) -> None:
+    with self.assertLogs('api.query_watch', 'WARNING') as logs:
+      response = self.client.get('/budget-3?times=4')
+    self.assertEqual(response.status_code, 200)
+    self.assertIn("over its budget of 3", logs.output[0])
+
+  def test_no_budget(self) -> None:
+    self.assertEqual(self.client.get('/no-budget?times=4').status_code, 200)
+
+  def test_repeated_queries(self) -> None:
+    with self.assertLogs('api.query_watch', 'WARNING') as logs:
+      self.client.get('/no-budget?times=5')
+    self.assertEqual(len(logs.output), 1)
+    self.assertIn("GET /no-budget ran the same query 5 times (N+1?)", logs.output[0])
+
+  @override_settings(QUERY_WATCH_SLOW_MS=0)
+  def test_slow_queries(self) -> None:
+    with self.assertLogs('api.query_watch', 'WARNING') as logs:
+      self.client.get('/no-budget?times=2')
+    self.assertEqual(len(logs.output), 2)
+    self.assertIn("GET /no-budget ran a query taking", logs.output[0])
+
+  def test_api_views_declare_budgets(self) -> None:
+    for pattern in api_urls.urlpatterns:
+      self.assertIsInstance(
+        getattr(pattern.callback, 'query_budget', None), int, str(pattern)
+      )
@@ -0,0 +1,106 @@
+"""Tests for routing reads to replica databases in the api package.
+Two SQLite databases stand in for the primary ("default") and a
+replica ("replica"); rows are written to the replica directly, so
+which one a view read from shows in what it returns.
+Test classes in this module check:
+  - the read-only views reading from the replica, when there is one
+  - clients pinned to the primary after changing something
+  - writes always going to the primary
+"""
+
+from django.test import Client, TestCase, override_settings
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from pathlib import Path
+import time
+from api.models import AppUser, Image, Tag
+from api.routing import PIN_COOKIE, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTestCase(TestCase):
+  databases = {'default', 'replica'}
+
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    Tag.objects.create(owner=cls.test_user, name="primary_tag")
+    cls.file_name: str = "routing_test_file.webp"
+    with open(f"{settings.MEDIA_ROOT}/{cls.file_name}", "wb") as file:
+      file.write(b"not really a webp, but it will do")
+    # not replicated yet
+    cls.new_image: Image = Image.objects.create(
+      source=cls.file_name,
+      owner=cls.test_user
+    )
+    # the replica, as replication would leave it (bar the new Image);
+    # bulk_create sends no signals, which would write to the primary
+    AppUser.objects.using('replica').bulk_create([
+      AppUser(id=cls.test_user.id, username=cls.test_user.username)
+    ])
+    Tag.objects.using('replica').bulk_create([
+      Tag(owner_id=cls.test_user.id, name="replica_tag")
+    ])
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    Path(f"{settings.MEDIA_ROOT}/{cls.file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    cache.clear()  # responses cached by earlier tests would skip the view
+    self.url: str = f'/api/tag/?owner={self.test_user.id}'
+
+  def tag_names(self) -> list:
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    return [tag["name"] for tag in response.json()]
+
+  def test_lists_read_from_replica(self) -> None:
+    self.assertEqual(self.tag_names(), ["replica_tag"])
+
+  def test_image_looked_up_on_replica(self) -> None:
+    response = self.client.get(f'/api/image/{self.new_image.id}')
+    self.assertEqual(response.status_code, 404)
+
+  def test_without_replicas(self) -> None:
+    with override_settings(DATABASE_REPLICAS=[]):
+      self.assertEqual(self.tag_names(), ["primary_tag"])
+
+  def test_pinned_after_change(self) -> None:
+    response = self.client.post(
+      '/api/tag/new',
+      {'tag-name': "new_tag", 'user-id': str(self.test_user.id)}
+    )
+    self.assertIn(PIN_COOKIE, response.cookies)
+    self.assertEqual(
+      sorted(self.tag_names()), ["new_tag", "primary_tag"]
+    )
+    response = self.client.get(f'/api/image/{self.new_image.id}')
+    self.assertEqual(response.status_code, 200)
+    # reads do not pin
+    self.assertNotIn(PIN_COOKIE, response.cookies)
+
+  def test_failed_change_does_not_pin(self) -> None:
+    response = self.client.post('/api/tag/new', {'tag-name': "new_tag"})
+    self.assertEqual(response.status_code, 400)
+    self.assertNotIn(PIN_COOKIE, response.cookies)
+    self.assertEqual(self.tag_names(), ["replica_tag"])
+
+  def test_pin_expires(self) -> None:
+    self.client.cookies[PIN_COOKIE] = f"{time.time() - 1:.3f}"
+    self.assertEqual(self.tag_names(), ["replica_tag"])
+    self.client.cookies[PIN_COOKIE] = "not a time"
+    self.assertEqual(self.tag_names(), ["replica_tag"])
+
+  def test_writes_go_to_primary(self) -> None:
+    request = Client().get('/').wsgi_request
+    with replica_reads(request):
+      self.assertEqual(router.db_for_read(Tag), 'replica')
+      self.assertEqual(router.db_for_write(Tag), 'default')
+      # and reads after a write see it
+      self.assertEqual(router.db_for_read(Tag), 'default')
+    self.assertEqual(router.db_for_read(Tag), 'default')
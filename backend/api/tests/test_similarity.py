@@ -0,0 +1,115 @@
+"""Tests for near-duplicate search in the api package.
+Test classes in this module check:
+  - lookups in the hash index against a brute-force scan, and the
+    share of the index they check
+  - the caching of each owner's index, and its rebuilding as the
+    owner's hashes change
+"""
+
+from django.test import TestCase
+import random
+from api import similarity
+from api.similarity import HashIndex, hamming_distance
+from api.models import AppUser, Image, Tag
+
+
+class HashIndexTestCase(TestCase):
+  def setUp(self) -> None:
+    # a fixed seed keeps failures reproducible
+    generator = random.Random(8)
+    self.hashes: list = [
+      generator.getrandbits(64) - (1 << 63) for _ in range(2000)
+    ]
+    # plant some near duplicates, a few bits off an existing hash
+    for index in range(0, 200, 10):
+      flipped: int = self.hashes[index]
+      for bit in generator.sample(range(64), generator.randint(0, 5)):
+        flipped ^= 1 << bit
+      self.hashes.append(flipped)
+    self.index = HashIndex()
+    for position, value in enumerate(self.hashes):
+      self.index.add(value, position)
+
+  def test_matches_brute_force(self) -> None:
+    self.assertEqual(len(self.index), len(self.hashes))
+    for target in self.hashes[:200:10]:
+      for max_distance in [0, 3, 6, 10]:
+        expected: list = sorted(
+          (hamming_distance(target, value), index)
+          for index, value in enumerate(self.hashes)
+          if hamming_distance(target, value) <= max_distance
+        )
+        found: list = sorted(self.index.search(target, max_distance))
+        self.assertEqual(found, expected)
+
+  def test_nearest_first(self) -> None:
+    distances: list = [
+      distance for distance, _ in self.index.search(self.hashes[0], 10)
+    ]
+    self.assertEqual(distances, sorted(distances))
+
+  def test_few_candidates(self) -> None:
+    # a 16-bit band of random hashes matches 1 in 65536 others; within
+    # distance 10, each band is looked up within 2 bits (137 values)
+    for target in self.hashes[:200:10]:
+      candidates: set = self.index.candidates(target, 10)
+      self.assertLess(len(candidates), len(self.hashes) // 20)
+
+  def test_signed_and_unsigned_agree(self) -> None:
+    # hashes are stored signed; the sign bit is just another bit
+    self.assertEqual(hamming_distance(-1, (1 << 64) - 1), 0)
+    self.assertEqual(hamming_distance(-1, 0), 64)
+    self.assertEqual(hamming_distance(-(1 << 63), 0), 1)
+
+
+class OwnerIndexTestCase(TestCase):
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    Image.objects.create(
+      source="index_test_1.png",
+      owner=cls.test_user,
+      perceptual_hash=0
+    )
+    Image.objects.create(
+      source="index_test_2.png",
+      owner=cls.other_user,
+      perceptual_hash=0
+    )
+
+  def setUp(self) -> None:
+    similarity._indexes.clear()
+
+  def test_index_per_owner(self) -> None:
+    index: HashIndex = similarity.owner_index(self.test_user.id)
+    self.assertEqual(len(index), 1)
+
+  def test_index_cached(self) -> None:
+    index: HashIndex = similarity.owner_index(self.test_user.id)
+    self.assertIs(similarity.owner_index(self.test_user.id), index)
+    # Tags play no part in it
+    Tag.objects.create(owner=self.test_user, name="test_tag")
+    self.assertIs(similarity.owner_index(self.test_user.id), index)
+
+  def test_index_rebuilt_on_change(self) -> None:
+    index: HashIndex = similarity.owner_index(self.test_user.id)
+    Image.objects.create(
+      source="index_test_3.png",
+      owner=self.test_user,
+      perceptual_hash=1
+    )
+    rebuilt: HashIndex = similarity.owner_index(self.test_user.id)
+    self.assertIsNot(rebuilt, index)
+    self.assertEqual(len(rebuilt), 2)
+
+  def test_index_rebuilt_on_hashing(self) -> None:
+    unhashed: Image = Image.objects.create(
+      source="index_test_3.png",
+      owner=self.test_user
+    )
+    index: HashIndex = similarity.owner_index(self.test_user.id)
+    self.assertEqual(len(index), 1)
+    unhashed.perceptual_hash = 1
+    unhashed.save(update_fields=["perceptual_hash"])
+    self.assertEqual(len(similarity.owner_index(self.test_user.id)), 2)
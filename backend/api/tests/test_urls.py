@@ -4,11 +4,30 @@ Most test classes in this module check their target URL for:
   - expected data
 """
 
-from django.test import Client, TestCase
+from django.test import AsyncClient, AsyncRequestFactory, Client, RequestFactory
+from django.test import TestCase, override_settings
 from api.models import AppUser, Image, Tag, ImageTag
+from api import tag_index, tag_suggestions, thumbnails
+from api import media, revisions
+from api.media import dhash
 from django.conf import settings
-from unittest.mock import Mock
+from django.core.cache import cache
+from django.db import connection
+from unittest.mock import Mock, patch
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+import gzip
+import hashlib
+import json
+import random
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from PIL import Image as PillowImage
+from PIL import ImageOps
 
 
 class UrlUserListTestCase(TestCase):
@@ -69,7 +88,7 @@ class UrlImageListTestCase(TestCase):
   
   def test_image_data_is_as_expected(self):
     # There is only one image in the test database; grab it's data
-    test_image_data = self.response.json()[0]
+    test_image_data = self.response.json()['results'][0]
     self.assertEqual(
       test_image_data["source"],
       'http://testserver/media/test.png')
@@ -81,13 +100,88 @@ class UrlImageListTestCase(TestCase):
       test_image_data["description"],
       "this is the test image description"
     )
+    # File metadata is exposed, though not yet known for this image
+    for field in ["sha256", "width", "height", "byte_size", "mime_type"]:
+      self.assertIn(field, test_image_data)
     # And also check ID? -\(?)/-
   
   def test_no_unexpected_data(self):
     # Know how I said earlier that there's only one image?
     # Well, if there's more than one, we have a problem.
     with self.assertRaises(IndexError):
-      self.response.json()[1]
+      self.response.json()['results'][1]
+    # And with only one image, there are no other pages either
+    self.assertIsNone(self.response.json()['next'])
+    self.assertIsNone(self.response.json()['previous'])
+
+
+class UrlImageListPaginationTestCase(TestCase):
+  """Tests cursor pagination of the image list.
+  Pages should come newest-first, with no image skipped or repeated,
+  whichever direction the client walks in."""
+
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    start: datetime = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    # Five images, two of which share an upload time to exercise
+    # the id tie-breaker
+    upload_times: list = [
+      start,
+      start + timedelta(minutes=1),
+      start + timedelta(minutes=1),
+      start + timedelta(minutes=2),
+      start + timedelta(minutes=3)
+    ]
+    for index, upload_time in enumerate(upload_times):
+      Image.objects.create(
+        source=f"test_{index}.png",
+        owner=cls.test_user,
+        uploaded_at=upload_time
+      )
+    cls.expected_order: list = [
+      str(image.id) for image in
+      Image.objects.order_by('-uploaded_at', '-id')
+    ]
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+
+  def test_pages_walk_forward(self):
+    seen: list = []
+    url: str = '/api/image/?page_size=2'
+    while url:
+      data: dict = self.client.get(url).json()
+      self.assertLessEqual(len(data['results']), 2)
+      seen += [image['id'] for image in data['results']]
+      url = data['next']
+    self.assertEqual(seen, self.expected_order)
+
+  def test_pages_walk_backward(self):
+    # Walk to the last page, then back again using the previous links
+    data: dict = self.client.get('/api/image/?page_size=2').json()
+    while data['next']:
+      data = self.client.get(data['next']).json()
+    seen: list = [image['id'] for image in data['results']]
+    while data['previous']:
+      data = self.client.get(data['previous']).json()
+      seen = [image['id'] for image in data['results']] + seen
+    self.assertEqual(seen, self.expected_order)
+
+  def test_first_page_has_no_previous(self):
+    data: dict = self.client.get('/api/image/?page_size=2').json()
+    self.assertIsNone(data['previous'])
+    self.assertIsNotNone(data['next'])
+
+  def test_page_size_is_capped(self):
+    response = self.client.get('/api/image/?page_size=100000')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(len(response.json()['results']), 5)
+
+  def test_reject_invalid_cursor(self):
+    response = self.client.get('/api/image/?cursor=not-a-real-cursor')
+    self.assertEqual(response.status_code, 404)
 
 
 class UrlTagListTestCase(TestCase):
@@ -279,5 +373,1322 @@ class UrlImageTestCase(TestCase):
     b'650384c0d0a0055000000c4401e320500000070bf17f57c9f041' \
     b'2003c078000100c28064000a24b0e52a0002000000004600'
     # content of the page should simply be the test image
-    self.assertEqual(expected_data, self.response.content)
+    # (streamed in chunks, so join them back up to compare)
+    content: bytes = b"".join(self.response.streaming_content)
+    self.assertEqual(expected_data, content)
+
+  def test_content_type_is_detected(self):
+    # The test file is not really a webp image, so there are no magic
+    # numbers to find; the file extension should be used instead
+    self.assertEqual(self.response["Content-Type"], "image/webp")
+
+  def test_advertises_range_support(self):
+    self.assertEqual(self.response["Accept-Ranges"], "bytes")
+
+  def test_range_request(self):
+    response = self.client.get(
+      f'/api/image/{self.test_image.id}',
+      headers={"Range": "bytes=0-9"}
+    )
+    self.assertEqual(response.status_code, 206)
+    self.assertEqual(b"".join(response.streaming_content), b"52494646be")
+    self.assertEqual(response["Content-Length"], "10")
+    self.assertEqual(
+      response["Content-Range"],
+      f"bytes 0-9/{len(self.mock_file.src)}"
+    )
+
+  def test_open_ended_and_suffix_range_requests(self):
+    size: int = len(self.mock_file.src)
+    # From byte 100 to the end of the file
+    response = self.client.get(
+      f'/api/image/{self.test_image.id}',
+      headers={"Range": "bytes=100-"}
+    )
+    self.assertEqual(response.status_code, 206)
+    self.assertEqual(
+      b"".join(response.streaming_content),
+      self.mock_file.src[100:]
+    )
+    self.assertEqual(response["Content-Range"], f"bytes 100-{size - 1}/{size}")
+    # The last 4 bytes of the file
+    response = self.client.get(
+      f'/api/image/{self.test_image.id}',
+      headers={"Range": "bytes=-4"}
+    )
+    self.assertEqual(response.status_code, 206)
+    self.assertEqual(b"".join(response.streaming_content), b"4600")
+
+  def test_unsatisfiable_range_request(self):
+    size: int = len(self.mock_file.src)
+    response = self.client.get(
+      f'/api/image/{self.test_image.id}',
+      headers={"Range": f"bytes={size}-"}
+    )
+    self.assertEqual(response.status_code, 416)
+    self.assertEqual(response["Content-Range"], f"bytes */{size}")
+
+  def test_missing_image(self):
+    # use a random valid UUID to match URL pattern
+    response = self.client.get('/api/image/31b4354d-9dcb-40bc-8230-8b83bd8ff863')
+    self.assertEqual(response.status_code, 404)
+
+
+class UrlImageContentTypeTestCase(TestCase):
+  """Tests that /image/[id] labels files by their content,
+  rather than by their (possibly misleading) file extension."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    # A real PNG image, saved with a .jpg extension
+    cls.file_name: str = "actually_a_png.jpg"
+    PillowImage.new("RGB", (4, 4), color="red").save(
+      f"{settings.MEDIA_ROOT}/{cls.file_name}",
+      format="PNG"
+    )
+    cls.test_image: Image = Image.objects.create(
+      source=cls.file_name,
+      owner=cls.test_user
+    )
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    Path(f"{settings.MEDIA_ROOT}/{cls.file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def test_content_type_is_detected(self):
+    response = Client().get(f'/api/image/{self.test_image.id}')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response["Content-Type"], "image/png")
+
+
+
+class UrlImageConditionalTestCase(TestCase):
+  """Tests conditional GET on the /image/[id] path.
+  The ETag is the content hash of the file; presenting it again
+  should skip sending the file entirely."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.file_name: str = "conditional_test_file.webp"
+    cls.file_content: bytes = b"not really a webp, but it will do"
+    with open(f"{settings.MEDIA_ROOT}/{cls.file_name}", "wb") as file:
+      file.write(cls.file_content)
+    cls.test_image: Image = Image.objects.create(
+      source=cls.file_name,
+      owner=cls.test_user
+    )
+    cls.expected_etag: str = f'"{hashlib.sha256(cls.file_content).hexdigest()}"'
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    Path(f"{settings.MEDIA_ROOT}/{cls.file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.url: str = f'/api/image/{self.test_image.id}'
+
+  def test_etag_is_content_hash(self):
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response["ETag"], self.expected_etag)
+    # and the hash is stored, so the file need not be hashed again
+    self.test_image.refresh_from_db()
+    self.assertEqual(f'"{self.test_image.sha256}"', self.expected_etag)
+
+  def test_matching_etag_not_modified(self):
+    response = self.client.get(
+      self.url,
+      headers={"If-None-Match": self.expected_etag}
+    )
+    self.assertEqual(response.status_code, 304)
+    self.assertEqual(response.content, b"")
+    self.assertEqual(response["ETag"], self.expected_etag)
+
+  def test_stale_etag_gets_file(self):
+    response = self.client.get(
+      self.url,
+      headers={"If-None-Match": '"some-old-hash"'}
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(
+      b"".join(response.streaming_content),
+      self.file_content
+    )
+
+  def test_if_range(self):
+    # Range honored while the ETag still matches...
+    response = self.client.get(
+      self.url,
+      headers={"Range": "bytes=0-2", "If-Range": self.expected_etag}
+    )
+    self.assertEqual(response.status_code, 206)
+    self.assertEqual(b"".join(response.streaming_content), b"not")
+    # ...but the whole file is sent if it has changed since
+    response = self.client.get(
+      self.url,
+      headers={"Range": "bytes=0-2", "If-Range": '"some-old-hash"'}
+    )
+    self.assertEqual(response.status_code, 200)
+
+
+class UrlListConditionalTestCase(TestCase):
+  """Tests conditional GET on the image, tag and image-tag lists.
+  Validators change whenever the (owner's) catalog does, and
+  presenting current validators should skip serialization."""
+
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.test_image: Image = Image.objects.create(
+      source="test.png",
+      owner=cls.test_user
+    )
+    cls.test_tag: Tag = Tag.objects.create(
+      name="test_tag",
+      owner=cls.test_user
+    )
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.urls: list = ['/api/image/', '/api/tag/', '/api/image-tag/']
+    cache.clear()  # responses cached by earlier tests would skip the view
+
+  def test_validators_present(self):
+    for url in self.urls:
+      response = self.client.get(url)
+      self.assertEqual(response.status_code, 200)
+      self.assertTrue(response["ETag"].startswith('W/"'))
+      self.assertIn("Last-Modified", response)
+      self.assertIn("no-cache", response["Cache-Control"])
+
+  def test_matching_etag_not_modified(self):
+    for url in self.urls:
+      etag: str = self.client.get(url)["ETag"]
+      # Only the revision lookup should run; no listing or serializing
+      with self.assertNumQueries(1):
+        response = self.client.get(url, headers={"If-None-Match": etag})
+      self.assertEqual(response.status_code, 304)
+      self.assertEqual(response.content, b"")
+
+  def test_if_modified_since(self):
+    last_modified: str = self.client.get('/api/tag/')["Last-Modified"]
+    response = self.client.get(
+      '/api/tag/',
+      headers={"If-Modified-Since": last_modified}
+    )
+    self.assertEqual(response.status_code, 304)
+
+  def test_change_invalidates_etag(self):
+    etags: list = [self.client.get(url)["ETag"] for url in self.urls]
+    ImageTag.objects.create(image=self.test_image, tag=self.test_tag)
+    for url, etag in zip(self.urls, etags):
+      response = self.client.get(url, headers={"If-None-Match": etag})
+      self.assertEqual(response.status_code, 200)
+      self.assertNotEqual(response["ETag"], etag)
+
+  def test_owner_scoped_validators(self):
+    # Changes to one owner's catalog leave other owners' lists current
+    url: str = f'/api/tag/?owner={self.other_user.id}'
+    etag: str = self.client.get(url)["ETag"]
+    Tag.objects.create(name="another_tag", owner=self.test_user)
+    response = self.client.get(url, headers={"If-None-Match": etag})
+    self.assertEqual(response.status_code, 304)
+
+  def test_owner_filter(self):
+    Tag.objects.create(name="other_tag", owner=self.other_user)
+    response = self.client.get(f'/api/tag/?owner={self.other_user.id}')
+    self.assertEqual(
+      [tag["name"] for tag in response.json()],
+      ["other_tag"]
+    )
+    response = self.client.get('/api/tag/?owner=not-a-uuid')
+    self.assertEqual(response.status_code, 400)
+
+
+class UrlListCacheTestCase(TestCase):
+  """Tests the response cache of the image, tag and image-tag lists.
+  Repeated requests should be answered from the cache, without listing
+  or serializing anything, until the (owner's) catalog changes."""
+
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.test_image: Image = Image.objects.create(
+      source="test.png",
+      owner=cls.test_user
+    )
+    cls.test_tag: Tag = Tag.objects.create(
+      name="test_tag",
+      owner=cls.test_user
+    )
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.urls: list = ['/api/image/', '/api/tag/', '/api/image-tag/']
+    cache.clear()
+
+  def test_hit_skips_view(self):
+    for url in self.urls:
+      first = self.client.get(url)
+      # Only the revision lookup should run; no listing or serializing
+      with self.assertNumQueries(1), \
+          patch("api.views.generics.ListAPIView.list") as mock_list:
+        second = self.client.get(url)
+      mock_list.assert_not_called()
+      self.assertEqual(second.status_code, 200)
+      self.assertEqual(second.content, first.content)
+      self.assertEqual(second["Content-Type"], first["Content-Type"])
+      self.assertEqual(second["ETag"], first["ETag"])
+
+  def test_change_invalidates(self):
+    contents: list = [self.client.get(url).content for url in self.urls]
+    ImageTag.objects.create(image=self.test_image, tag=self.test_tag)
+    Tag.objects.create(name="another_tag", owner=self.test_user)
+    Image.objects.create(source="another.png", owner=self.test_user)
+    for url, content in zip(self.urls, contents):
+      self.assertNotEqual(self.client.get(url).content, content)
+    self.assertEqual(len(self.client.get('/api/tag/').json()), 2)
+
+  def test_delete_invalidates(self):
+    ImageTag.objects.create(image=self.test_image, tag=self.test_tag)
+    self.assertEqual(len(self.client.get('/api/image-tag/').json()), 1)
+    ImageTag.objects.all().delete()
+    self.assertEqual(self.client.get('/api/image-tag/').json(), [])
+
+  def test_keyed_by_query(self):
+    Tag.objects.create(name="other_tag", owner=self.other_user)
+    everyone = self.client.get('/api/tag/')
+    one_owner = self.client.get(f'/api/tag/?owner={self.other_user.id}')
+    self.assertEqual(len(everyone.json()), 2)
+    self.assertEqual(
+      [tag["name"] for tag in one_owner.json()],
+      ["other_tag"]
+    )
+
+  def test_owner_scoped(self):
+    # Changes to one owner's catalog leave other owners' lists cached
+    url: str = f'/api/tag/?owner={self.other_user.id}'
+    self.client.get(url)
+    Tag.objects.create(name="another_tag", owner=self.test_user)
+    with self.assertNumQueries(1):
+      self.client.get(url)
+
+
+@override_settings(THUMBNAIL_CACHE_MAX_BYTES=1024 * 1024)
+class UrlThumbnailTestCase(TestCase):
+  """Tests for the /image/[id]/thumb path.
+  Expected to serve resized variants of the image, rendering each
+  only once and keeping the cache of them within its size bound."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.file_name: str = "thumbnail_test_file.png"
+    PillowImage.new("RGB", (800, 600), color="blue").save(
+      f"{settings.MEDIA_ROOT}/{cls.file_name}"
+    )
+    cls.test_image: Image = Image.objects.create(
+      source=cls.file_name,
+      owner=cls.test_user
+    )
+    # Not an image Pillow can read, like a video would be
+    cls.video_name: str = "thumbnail_test_file.mp4"
+    with open(f"{settings.MEDIA_ROOT}/{cls.video_name}", "wb") as file:
+      file.write(b"definitely not a video either")
+    cls.test_video: Image = Image.objects.create(
+      source=cls.video_name,
+      owner=cls.test_user
+    )
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    Path(f"{settings.MEDIA_ROOT}/{cls.file_name}").unlink(missing_ok=True)
+    Path(f"{settings.MEDIA_ROOT}/{cls.video_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.url: str = f'/api/image/{self.test_image.id}/thumb'
+    # Keep each test's variants in a cache of its own
+    self.cache_dir = tempfile.TemporaryDirectory()
+    cache_settings = override_settings(THUMBNAIL_CACHE_ROOT=self.cache_dir.name)
+    cache_settings.enable()
+    self.addCleanup(cache_settings.disable)
+    self.addCleanup(self.cache_dir.cleanup)
+    # Forget the cache size measured by other tests
+    thumbnails._cache_size = None
+
+  def get_thumbnail(self, query: str) -> PillowImage.Image:
+    response = self.client.get(f'{self.url}?{query}')
+    self.assertEqual(response.status_code, 200)
+    return PillowImage.open(BytesIO(b"".join(response.streaming_content)))
+
+  def test_resized_variant(self):
+    # 300 is rounded up to the nearest cached width, 320
+    thumbnail: PillowImage.Image = self.get_thumbnail("w=300&fmt=webp")
+    self.assertEqual(thumbnail.format, "WEBP")
+    self.assertEqual(thumbnail.size, (320, 240))
+    thumbnail = self.get_thumbnail("w=128&fmt=jpeg")
+    self.assertEqual(thumbnail.format, "JPEG")
+    self.assertEqual(thumbnail.size, (128, 96))
+
+  def test_no_upscaling(self):
+    thumbnail: PillowImage.Image = self.get_thumbnail("w=3000&fmt=png")
+    self.assertEqual(thumbnail.size, (800, 600))
+
+  def test_variant_rendered_once(self):
+    with patch.object(thumbnails, "_render", wraps=thumbnails._render) as render:
+      self.get_thumbnail("w=320")
+      self.get_thumbnail("w=320")
+      self.assertEqual(render.call_count, 1)
+
+  def test_concurrent_misses_collapsed(self):
+    calls: list = []
+
+    def slow_render(*args):
+      calls.append(args)
+      time.sleep(0.2)
+      return real_render(*args)
+
+    real_render = thumbnails._render
+    sha256: str = hashlib.sha256(
+      Path(f"{settings.MEDIA_ROOT}/{self.file_name}").read_bytes()
+    ).hexdigest()
+    with patch.object(thumbnails, "_render", side_effect=slow_render):
+      threads: list = [
+        threading.Thread(
+          target=thumbnails.get_variant,
+          args=(f"{settings.MEDIA_ROOT}/{self.file_name}", sha256, 320, "webp")
+        )
+        for _ in range(4)
+      ]
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+    self.assertEqual(len(calls), 1)
+
+  def test_concurrent_renders(self):
+    # renders of one variant that do meet (as from processes without a
+    # file lock) each write a temporary file of their own
+    source_path: str = f"{settings.MEDIA_ROOT}/{self.file_name}"
+    path: Path = thumbnails.variant_path("0" * 64, 320, "png")
+    errors: list = []
+    start = threading.Barrier(4)
+
+    def render() -> None:
+      start.wait()
+      try:
+        thumbnails._render(source_path, path, 320, "png")
+      except Exception as error:
+        errors.append(error)
+
+    threads: list = [threading.Thread(target=render) for _ in range(4)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(errors, [])
+    self.assertEqual(PillowImage.open(path).size, (320, 240))
+    self.assertEqual(list(path.parent.glob(".*")), [])
+
+  def test_least_recently_used_evicted(self):
+    sizes: list = [64, 128, 256]
+    for width in sizes:
+      self.get_thumbnail(f"w={width}&fmt=png")
+      time.sleep(0.01)  # keep last-used times distinct
+    # use the first variant again, so the second is least recently used
+    self.get_thumbnail("w=64&fmt=png")
+    variants: list = sorted(Path(self.cache_dir.name).glob("??/*"))
+    total: int = sum(variant.stat().st_size for variant in variants)
+    # shrink the bound so the next render forces an eviction
+    with override_settings(THUMBNAIL_CACHE_MAX_BYTES=total):
+      self.get_thumbnail("w=320&fmt=png")
+    remaining: list = [variant.name for variant in Path(self.cache_dir.name).glob("??/*")]
+    self.assertFalse(any("-w128." in name for name in remaining))
+    self.assertTrue(any("-w320." in name for name in remaining))
+
+  def test_matching_etag_not_modified(self):
+    etag: str = self.client.get(f'{self.url}?w=320')["ETag"]
+    with patch("api.views.get_variant") as get_variant:
+      response = self.client.get(
+        f'{self.url}?w=320',
+        headers={"If-None-Match": etag}
+      )
+      get_variant.assert_not_called()
+    self.assertEqual(response.status_code, 304)
+
+  def test_reject_malformed_request(self):
+    for query in ["w=wide", "w=-5", "fmt=bmp"]:
+      response = self.client.get(f'{self.url}?{query}')
+      self.assertEqual(response.status_code, 400)
+
+  def test_reject_non_images(self):
+    response = self.client.get(f'/api/image/{self.test_video.id}/thumb')
+    self.assertEqual(response.status_code, 415)
+
+  def test_reject_decompression_bombs(self):
+    # images too large to decode safely are refused as unreadable
+    with patch("PIL.Image.MAX_IMAGE_PIXELS", 1):
+      response = self.client.get(f'{self.url}?w=160')
+    self.assertEqual(response.status_code, 415)
+
+
+class UrlSimilarTestCase(TestCase):
+  """Tests for the /image/[id]/similar path.
+  Expected to list the owner's other Images whose perceptual hashes
+  are within max_distance of the requested Image's, nearest first."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.file_names: list = [
+      "similar_test_original.png",
+      "similar_test_copy.jpg",
+      "similar_test_different.png",
+      "similar_test_video.mp4"
+    ]
+    original = PillowImage.radial_gradient("L").resize((200, 150))
+    original.save(f"{settings.MEDIA_ROOT}/{cls.file_names[0]}")
+    # a smaller, lossy re-encoding of the original
+    original.resize((160, 120)).save(
+      f"{settings.MEDIA_ROOT}/{cls.file_names[1]}",
+      quality=60
+    )
+    ImageOps.mirror(PillowImage.linear_gradient("L").rotate(90)).save(
+      f"{settings.MEDIA_ROOT}/{cls.file_names[2]}"
+    )
+    with open(f"{settings.MEDIA_ROOT}/{cls.file_names[3]}", "wb") as file:
+      file.write(b"definitely not a video")
+
+    cls.original, cls.copy, cls.different, cls.video = [
+      Image.objects.create(source=file_name, owner=cls.test_user)
+      for file_name in cls.file_names
+    ]
+    # the same file in another catalog should never be listed
+    cls.other_owners_copy: Image = Image.objects.create(
+      source=cls.file_names[1],
+      owner=cls.other_user
+    )
+    # as the process_image job would; the original is left unhashed
+    for image in [cls.copy, cls.different, cls.other_owners_copy]:
+      image.perceptual_hash = dhash(image.source.path)
+      image.save()
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    for file_name in cls.file_names:
+      Path(f"{settings.MEDIA_ROOT}/{file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.url: str = f'/api/image/{self.original.id}/similar'
+
+  def test_near_duplicate_found(self):
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    results: list = response.json()
+    self.assertEqual([result["id"] for result in results], [str(self.copy.id)])
+    self.assertLessEqual(results[0]["distance"], 4)
+
+  def test_different_image_not_found(self):
+    # half of the hash bits differ: far beyond any distance allowed
+    response = self.client.get(
+      f'/api/image/{self.different.id}/similar?max_distance=16'
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json(), [])
+
+  def test_hash_computed_on_demand(self):
+    # Images hashed by no job yet are hashed when first asked about
+    self.client.get(self.url)
+    self.original.refresh_from_db()
+    self.assertIsNotNone(self.original.perceptual_hash)
+
+  def test_hashing_leaves_revision(self):
+    # a read that stores a hash changes nothing clients have a copy of
+    before: int = revisions.revision_of(self.test_user.id)
+    self.client.get(self.url)
+    self.assertEqual(revisions.revision_of(self.test_user.id), before)
+
+  def test_index_follows_catalog_changes(self):
+    self.assertEqual(len(self.client.get(self.url).json()), 1)
+    self.copy.delete()
+    self.assertEqual(self.client.get(self.url).json(), [])
+
+  def test_bad_requests(self):
+    for query in ["max_distance=-1", "max_distance=17", "max_distance=near"]:
+      response = self.client.get(f'{self.url}?{query}')
+      self.assertEqual(response.status_code, 400)
+    response = self.client.post(self.url)
+    self.assertEqual(response.status_code, 405)
+
+  def test_not_an_image(self):
+    response = self.client.get(f'/api/image/{self.video.id}/similar')
+    self.assertEqual(response.status_code, 415)
+
+  def test_missing_image(self):
+    response = self.client.get(
+      '/api/image/00000000-0000-4000-8000-000000000000/similar'
+    )
+    self.assertEqual(response.status_code, 404)
+
+
+class UrlImageTagSearchTestCase(TestCase):
+  """Tests for the tags, exclude and mode parameters of the /image/ path.
+  Expected to list the Images tagged with all (or any) of the given
+  Tags and none of the excluded ones, from an index kept in step with
+  ImageTags created and deleted through the API."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.funny: Tag = Tag.objects.create(owner=cls.test_user, name="funny")
+    cls.cats: Tag = Tag.objects.create(owner=cls.test_user, name="cats")
+    cls.old: Tag = Tag.objects.create(owner=cls.test_user, name="old")
+    # Images tagged: both, funny only, cats and old, nothing
+    cls.images: list = [
+      Image.objects.create(source=f"search_test_{index}.png", owner=cls.test_user)
+      for index in range(4)
+    ]
+    for image, tags in zip(
+      cls.images,
+      [[cls.funny, cls.cats], [cls.funny], [cls.cats, cls.old], []]
+    ):
+      for tag in tags:
+        ImageTag.objects.create(image=image, tag=tag)
+    # A tag of the same name, in another catalog
+    cls.other_funny: Tag = Tag.objects.create(owner=cls.other_user, name="funny")
+    cls.other_image: Image = Image.objects.create(
+      source="search_test_other.png",
+      owner=cls.other_user
+    )
+    ImageTag.objects.create(image=cls.other_image, tag=cls.other_funny)
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    tag_index._indexes.clear()
+
+  def search(self, query: str) -> set:
+    response = self.client.get(f'/api/image/?owner={self.test_user.id}&{query}')
+    self.assertEqual(response.status_code, 200)
+    return {image["id"] for image in response.json()["results"]}
+
+  def expected(self, *indexes) -> set:
+    return {str(self.images[index].id) for index in indexes}
+
+  def test_all_tags(self):
+    self.assertEqual(self.search("tags=funny,cats"), self.expected(0))
+    self.assertEqual(self.search("tags=funny,cats&mode=all"), self.expected(0))
+
+  def test_any_tags(self):
+    self.assertEqual(self.search("tags=funny,old&mode=any"), self.expected(0, 1, 2))
+
+  def test_exclude(self):
+    self.assertEqual(self.search("tags=cats&exclude=old"), self.expected(0))
+    self.assertEqual(self.search("exclude=funny"), self.expected(2, 3))
+
+  def test_tag_ids(self):
+    self.assertEqual(
+      self.search(f"tags={self.cats.id}&exclude={str(self.funny.id).upper()}"),
+      self.expected(2)
+    )
+
+  def test_unknown_tag(self):
+    self.assertEqual(self.search("tags=funny,dogs"), set())
+    self.assertEqual(self.search("tags=funny,dogs&mode=any"), self.expected(0, 1))
+
+  def test_without_owner(self):
+    # each catalog is searched for its own "funny" Tag, by the database
+    # rather than through an index per catalog
+    response = self.client.get('/api/image/?tags=funny')
+    found: set = {image["id"] for image in response.json()["results"]}
+    self.assertEqual(found, self.expected(0, 1) | {str(self.other_image.id)})
+    self.assertFalse(tag_index._indexes)
+
+  def test_without_owner_as_with(self):
+    # the database answers as each owner's index does
+    for query in [
+      "tags=funny,cats", "tags=funny,old&mode=any", "tags=cats&exclude=old",
+      f"tags={self.cats.id}&exclude={self.funny.id}", "tags=funny,dogs"
+    ]:
+      response = self.client.get(f'/api/image/?{query}')
+      found: set = {
+        image["id"] for image in response.json()["results"]
+        if image["owner"] == str(self.test_user.id)
+      }
+      self.assertEqual(found, self.search(query), query)
+
+
+  def test_exclude_without_owner(self):
+    response = self.client.get('/api/image/?exclude=funny')
+    found: set = {image["id"] for image in response.json()["results"]}
+    self.assertEqual(found, self.expected(2, 3))
+    self.assertFalse(tag_index._indexes)
+
+  def test_pages(self):
+    # walk forward a page at a time, then back, across both catalogs
+    listed: list = [
+      str(image.id) for image in
+      Image.objects.order_by('-uploaded_at', '-id')
+      if image.id != self.images[3].id and image.id != self.images[2].id
+    ]
+    url: str = '/api/image/?tags=funny&page_size=1'
+    pages: list = []
+    while url:
+      page: dict = self.client.get(url).json()
+      self.assertEqual(len(page["results"]), 1)
+      pages.append(page)
+      url = page["next"]
+    self.assertEqual([page["results"][0]["id"] for page in pages], listed)
+    back: dict = self.client.get(pages[-1]["previous"]).json()
+    self.assertEqual(back["results"], pages[-2]["results"])
+
+  def test_bad_mode(self):
+    response = self.client.get('/api/image/?tags=funny&mode=most')
+    self.assertEqual(response.status_code, 400)
+
+  def test_index_updated_in_place(self):
+    self.assertEqual(self.search("tags=old"), self.expected(2))
+    index: tag_index.TagIndex = tag_index.owner_index(self.test_user.id)
+
+    self.client.post('/api/image-tag/new', {
+      "user-id": f"{self.test_user.id}",
+      "image-id": f"{self.images[3].id}",
+      "tag-id": f"{self.old.id}"
+    })
+    self.assertEqual(self.search("tags=old"), self.expected(2, 3))
+    imagetag: ImageTag = ImageTag.objects.get(image=self.images[2], tag=self.old)
+    self.client.delete(f'/api/image-tag/{imagetag.id}')
+    self.assertEqual(self.search("tags=old"), self.expected(3))
+    # neither change needed the index to be rebuilt
+    self.assertIs(tag_index.owner_index(self.test_user.id), index)
+
+  def test_index_rebuilt_on_other_changes(self):
+    self.assertEqual(self.search("tags=old"), self.expected(2))
+    ImageTag.objects.create(image=self.images[0], tag=self.old)
+    self.assertEqual(self.search("tags=old"), self.expected(0, 2))
+
+  def test_index_rebuilt_after_existing_tagging(self):
+    # tagging an Image with a Tag it has changes nothing, so must not
+    # pass off another change as applied to the index
+    self.assertEqual(self.search("tags=old"), self.expected(2))
+    ImageTag.objects.create(image=self.images[0], tag=self.old)
+    response = self.client.post('/api/image-tag/new', {
+      "user-id": f"{self.test_user.id}",
+      "image-id": f"{self.images[2].id}",
+      "tag-id": f"{self.old.id}"
+    })
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(self.search("tags=old"), self.expected(0, 2))
+
+
+class UrlImageListExpandTestCase(TestCase):
+  """Tests for the expand parameter of the /image/ path.
+  Expected to embed the Tags of each Image, in a number of queries
+  that does not depend on how many Images are listed."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.tags: list = [
+      Tag.objects.create(owner=cls.test_user, name=name)
+      for name in ["b-tag", "a-tag"]
+    ]
+    for index in range(30):
+      image: Image = Image.objects.create(
+        source=f"expand_test_{index}.png",
+        owner=cls.test_user
+      )
+      for tag in cls.tags[:index % 3]:
+        ImageTag.objects.create(image=image, tag=tag)
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    cache.clear()  # responses cached by earlier tests would skip the view
+
+  def test_tags_embedded(self):
+    response = self.client.get('/api/image/?expand=tags&page_size=30')
+    self.assertEqual(response.status_code, 200)
+    for image in response.json()["results"]:
+      expected: list = [
+        {"id": str(imagetag.tag.id), "name": imagetag.tag.name}
+        for imagetag in ImageTag.objects.filter(image_id=image["id"])
+        .order_by("tag__name")
+      ]
+      self.assertEqual(image["tags"], expected)
+
+  def test_not_embedded_by_default(self):
+    response = self.client.get('/api/image/')
+    self.assertNotIn("tags", response.json()["results"][0])
+
+  def test_constant_queries(self):
+    # revision check, page, and the Tags of the whole page
+    with self.assertNumQueries(3):
+      self.client.get('/api/image/?expand=tags&page_size=2')
+    with self.assertNumQueries(3):
+      self.client.get('/api/image/?expand=tags&page_size=30')
+
+  def test_unknown_expansion(self):
+    response = self.client.get('/api/image/?expand=owner')
+    self.assertEqual(response.status_code, 400)
+
+
+class UrlExportTestCase(TestCase):
+  """Tests for the /export path.
+  Expected to stream every record of the catalog as NDJSON, optionally
+  compressed, reading rows in batches."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.tags: list = [
+      Tag.objects.create(owner=cls.test_user, name=f"export_tag_{index}")
+      for index in range(3)
+    ]
+    cls.images: list = [
+      Image.objects.create(
+        source=f"export_test_{index}.png",
+        owner=cls.test_user,
+        description="line\nbreak" if index == 0 else ""
+      )
+      for index in range(5)
+    ]
+    for image in cls.images:
+      ImageTag.objects.create(image=image, tag=cls.tags[0])
+    Tag.objects.create(owner=cls.other_user, name="other_tag")
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.url: str = f'/api/export?owner={self.test_user.id}'
+
+  def records(self, content: bytes) -> list:
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+  def test_streams_catalog(self):
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.streaming)
+    self.assertEqual(response["Content-Type"], "application/x-ndjson")
+    self.assertIn("attachment", response["Content-Disposition"])
+    records: list = self.records(b"".join(response.streaming_content))
+    self.assertEqual(
+      [record["type"] for record in records],
+      ["user"] + ["tag"] * 3 + ["image"] * 5 + ["image-tag"] * 5
+    )
+    # records are presented as the list endpoints present them
+    tags: list = self.client.get(f'/api/tag/?owner={self.test_user.id}').json()
+    self.assertCountEqual(
+      [record["data"] for record in records if record["type"] == "tag"],
+      tags
+    )
+    self.assertNotIn("other_tag", str(records))
+
+  def test_all_catalogs(self):
+    response = self.client.get('/api/export')
+    records: list = self.records(b"".join(response.streaming_content))
+    self.assertEqual(
+      len([record for record in records if record["type"] == "user"]), 2
+    )
+    self.assertIn("other_tag", str(records))
+
+  def test_batched_reads(self):
+    # every row is exported when read a few at a time
+    with patch("api.export.CHUNK_SIZE", 2), \
+        patch("api.export.OUTPUT_CHUNK_BYTES", 1):
+      response = self.client.get(self.url)
+      chunks: list = list(response.streaming_content)
+    self.assertEqual(len(chunks), 14)  # one chunk per record, here
+    self.assertEqual(len(self.records(b"".join(chunks))), 14)
+
+  def test_no_transaction_held(self):
+    # a slow reader must not keep a transaction open between batches
+    with patch("api.export.CHUNK_SIZE", 2), \
+        patch("api.export.OUTPUT_CHUNK_BYTES", 1):
+      response = self.client.get(self.url)
+      depth: int = len(connection.atomic_blocks)
+      for _ in response.streaming_content:
+        self.assertEqual(len(connection.atomic_blocks), depth)
+
+  def test_gzip(self):
+    plain: bytes = b"".join(self.client.get(self.url).streaming_content)
+    response = self.client.get(f'{self.url}&compress=gzip')
+    self.assertEqual(response["Content-Type"], "application/gzip")
+    self.assertTrue(response["Content-Disposition"].endswith('.ndjson.gz"'))
+    self.assertEqual(
+      gzip.decompress(b"".join(response.streaming_content)),
+      plain
+    )
+
+  def test_bad_requests(self):
+    self.assertEqual(self.client.get('/api/export?format=csv').status_code, 400)
+    self.assertEqual(
+      self.client.get('/api/export?compress=zip').status_code,
+      400
+    )
+    self.assertEqual(
+      self.client.get('/api/export?owner=not-a-uuid').status_code,
+      400
+    )
+    self.assertEqual(
+      self.client.get(f'/api/export?owner={uuid.uuid4()}').status_code,
+      404
+    )
+    self.assertEqual(self.client.post('/api/export').status_code, 405)
+
+
+class UrlTagDownloadTestCase(TestCase):
+  """Tests for the /tag/[id]/download.zip path.
+  Expected to stream an uncompressed ZIP archive of the files of every
+  Image with the Tag, a block at a time."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.test_tag: Tag = Tag.objects.create(name="cats", owner=cls.test_user)
+    cls.other_tag: Tag = Tag.objects.create(name="dogs", owner=cls.test_user)
+    cls.file_names: list = [
+      "download_test_1.jpg", "download_test_2.PNG", "download_test_3.gif",
+      "download_test_missing.png"
+    ]
+    cls.contents: dict = {}
+    cls.images: list = []
+    for index, file_name in enumerate(cls.file_names):
+      content: bytes = bytes([index]) * (1000 * (index + 1))
+      if "missing" not in file_name:
+        with open(f"{settings.MEDIA_ROOT}/{file_name}", "wb") as file:
+          file.write(content)
+      image: Image = Image.objects.create(source=file_name, owner=cls.test_user)
+      cls.contents[image.id] = content
+      cls.images.append(image)
+    # all but the third are tagged
+    for image in cls.images[:2] + cls.images[3:]:
+      ImageTag.objects.create(image=image, tag=cls.test_tag)
+    ImageTag.objects.create(image=cls.images[2], tag=cls.other_tag)
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    for file_name in cls.file_names:
+      Path(f"{settings.MEDIA_ROOT}/{file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.url: str = f'/api/tag/{self.test_tag.id}/download.zip'
+
+  def test_archive(self):
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.streaming)
+    self.assertEqual(response["Content-Type"], "application/zip")
+    self.assertIn('filename="cats.zip"', response["Content-Disposition"])
+
+    archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+    self.assertIsNone(archive.testzip())
+    # the missing file is left out; names keep (lowercased) extensions
+    self.assertEqual(
+      archive.namelist(),
+      [f"{self.images[0].id}.jpg", f"{self.images[1].id}.png"]
+    )
+    for image in self.images[:2]:
+      info = archive.getinfo(f"{image.id}{Path(image.source.name).suffix.lower()}")
+      self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+      self.assertEqual(archive.read(info), self.contents[image.id])
+
+  def test_streamed_in_blocks(self):
+    with patch("api.media.MEDIA_BLOCK_SIZE", 256):
+      response = self.client.get(self.url)
+      chunks: list = list(response.streaming_content)
+    self.assertGreater(len(chunks), 10)
+    # a block of file data, plus at most a header or directory
+    self.assertLessEqual(max(len(chunk) for chunk in chunks), 256 + 512)
+
+  def test_unknown_tag(self):
+    response = self.client.get(f'/api/tag/{uuid.uuid4()}/download.zip')
+    self.assertEqual(response.status_code, 404)
+
+  def test_method_not_allowed(self):
+    self.assertEqual(self.client.post(self.url).status_code, 405)
+
+
+class UrlImageSearchTestCase(TestCase):
+  """Tests for the /image/search path.
+  Expected to return the Images whose descriptions match a query, best
+  matches first, a page at a time."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.images: dict = {
+      description: Image.objects.create(
+        source=f"search_test_{index}.png",
+        owner=cls.test_user,
+        description=description
+      )
+      for index, description in enumerate([
+        "A cat asleep on a keyboard",
+        "Cat, cat and more cats: the category of cats",
+        "A dog chasing a catapult",
+        "Café au lait",
+        "Nothing to see here"
+      ])
+    }
+    cls.other_image: Image = Image.objects.create(
+      source="search_test_other.png",
+      owner=cls.other_user,
+      description="Another cat"
+    )
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+
+  def search(self, query: str, **params) -> list:
+    response = self.client.get('/api/image/search', {'q': query, **params})
+    self.assertEqual(response.status_code, 200)
+    return [image["description"] for image in response.json()["results"]]
+
+  def test_ranked_prefix_matches(self):
+    found: list = self.search("cat", owner=self.test_user.id)
+    # "cat" starts "cats", "category" and "catapult" as well
+    self.assertEqual(found[0], "Cat, cat and more cats: the category of cats")
+    self.assertEqual(set(found), {
+      "A cat asleep on a keyboard",
+      "Cat, cat and more cats: the category of cats",
+      "A dog chasing a catapult"
+    })
+
+  def test_every_word_matched(self):
+    self.assertEqual(
+      self.search("keyb CAT", owner=self.test_user.id),
+      ["A cat asleep on a keyboard"]
+    )
+    self.assertEqual(self.search("cat giraffe"), [])
+
+  def test_owner_scoping(self):
+    self.assertEqual(self.search("another"), ["Another cat"])
+    self.assertEqual(self.search("another", owner=self.test_user.id), [])
+    self.assertEqual(len(self.search("cat")), 4)
+
+  def test_diacritics(self):
+    self.assertEqual(self.search("cafe"), ["Café au lait"])
+
+  def test_query_syntax_ignored(self):
+    # operators of either index's syntax are read as plain words
+    self.assertEqual(self.search('"cat" OR -dog* NOT (keyboard'), [])
+    self.assertEqual(self.search("asleep AND"), [])
+    self.assertEqual(self.search("+asleep*"), ["A cat asleep on a keyboard"])
+
+  def test_index_follows_changes(self):
+    image: Image = self.images["Nothing to see here"]
+    image.description = "A cat after all"
+    image.save()
+    self.assertEqual(self.search("after"), ["A cat after all"])
+    self.assertEqual(self.search("nothing"), [])
+    # saving other fields leaves the entry as it is
+    image.width = 10
+    image.save(update_fields=["width"])
+    self.assertEqual(self.search("after"), ["A cat after all"])
+    image.delete()
+    self.assertEqual(self.search("after"), [])
+
+  def test_pagination(self):
+    response = self.client.get('/api/image/search', {'q': 'a', 'page_size': 2})
+    expected: list = self.search("a")
+    self.assertEqual(len(expected), 5)
+    found: list = []
+    while True:
+      data: dict = response.json()
+      self.assertLessEqual(len(data["results"]), 2)
+      found += [image["description"] for image in data["results"]]
+      if data["next"] is None:
+        break
+      response = self.client.get(data["next"])
+    self.assertEqual(found, expected)
+
+  def test_bad_requests(self):
+    for params in [
+      {}, {'q': '  ?! '}, {'q': 'cat', 'owner': 'nope'},
+      {'q': 'cat', 'page_size': '0'}, {'q': 'cat', 'page_size': '501'}
+    ]:
+      with self.subTest(params=params):
+        response = self.client.get('/api/image/search', params)
+        self.assertEqual(response.status_code, 400)
+    response = self.client.get('/api/image/search', {'q': 'cat', 'cursor': 'x'})
+    self.assertEqual(response.status_code, 404)
+    response = self.client.post('/api/image/search', {'q': 'cat'})
+    self.assertEqual(response.status_code, 405)
+
+
+class UrlTagSuggestTestCase(TestCase):
+  """Tests for the /tag/suggest path.
+  Expected to list an owner's Tags starting with a prefix, the most
+  used first, from an index kept in step with Tags and ImageTags
+  changed through the API."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.other_user: AppUser = AppUser.objects.create(username="test_user_2")
+    cls.tags: dict = {
+      name: Tag.objects.create(owner=cls.test_user, name=name)
+      for name in ["cats", "Catapult", "caterpillar", "dogs", "Ça va"]
+    }
+    Tag.objects.create(owner=cls.other_user, name="cats and dogs")
+    cls.images: list = [
+      Image.objects.create(source=f"suggest_test_{index}.png", owner=cls.test_user)
+      for index in range(3)
+    ]
+    # used by: cats 3, caterpillar 2, dogs 1, Catapult and Ça va none
+    for name, count in [("cats", 3), ("caterpillar", 2), ("dogs", 1)]:
+      for image in cls.images[:count]:
+        ImageTag.objects.create(image=image, tag=cls.tags[name])
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    tag_suggestions._indexes.clear()
+
+  def suggest(self, prefix: str, **params) -> list:
+    response = self.client.get(
+      '/api/tag/suggest',
+      {'owner': self.test_user.id, 'prefix': prefix, **params}
+    )
+    self.assertEqual(response.status_code, 200)
+    return [(tag["name"], tag["count"]) for tag in response.json()]
+
+  def test_ranked_by_use(self):
+    self.assertEqual(
+      self.suggest("cat"),
+      [("cats", 3), ("caterpillar", 2), ("Catapult", 0)]
+    )
+    self.assertEqual(self.suggest("cat", limit=2), [("cats", 3), ("caterpillar", 2)])
+    response = self.client.get(
+      '/api/tag/suggest', {'owner': self.test_user.id, 'prefix': 'dog'}
+    )
+    self.assertEqual(
+      response.json(),
+      [{"id": str(self.tags["dogs"].id), "name": "dogs", "count": 1}]
+    )
+
+  def test_case_ignored(self):
+    self.assertEqual(self.suggest("CATA"), [("Catapult", 0)])
+    self.assertEqual(self.suggest("ça"), [("Ça va", 0)])
+
+  def test_every_tag(self):
+    self.assertEqual(
+      self.suggest(""),
+      [("cats", 3), ("caterpillar", 2), ("dogs", 1), ("Catapult", 0), ("Ça va", 0)]
+    )
+    self.assertEqual(self.suggest("x"), [])
+
+  def test_matches_brute_force(self):
+    # every way of finding matches gives what a full sort would
+    generator = random.Random(4)
+    tags: list = [
+      (uuid.uuid4(), "".join(generator.choices("abC", k=generator.randint(1, 4))),
+        generator.randint(0, 3))
+      for _ in range(300)
+    ]
+    index = tag_suggestions.TagSuggestions(0, tags)
+    for prefix in ["", "a", "ab", "C", "abc", "bbbb", "z"]:
+      for limit in [1, 10, 50]:
+        expected: list = sorted(
+          (tag for tag in tags if tag[1].casefold().startswith(prefix.casefold())),
+          key=lambda tag: (-tag[2], tag[1].casefold(), tag[0])
+        )[:limit]
+        with self.subTest(prefix=prefix, limit=limit):
+          self.assertEqual(
+            index.matching(prefix, limit), [tag[0] for tag in expected]
+          )
+
+  def test_index_updated_in_place(self):
+    self.assertEqual(self.suggest("d"), [("dogs", 1)])
+    index = tag_suggestions.owner_suggestions(self.test_user.id)
+
+    response = self.client.post('/api/tag/new', {
+      "user-id": f"{self.test_user.id}",
+      "tag-name": "Ducks"
+    })
+    ducks_id: str = json.loads(response.content)["tag-id"]
+    self.assertEqual(self.suggest("d"), [("dogs", 1), ("Ducks", 0)])
+    self.client.post('/api/image-tag/new', {
+      "user-id": f"{self.test_user.id}",
+      "image-id": f"{self.images[0].id}",
+      "tag-id": ducks_id
+    })
+    self.client.post('/api/image-tag/new', {
+      "user-id": f"{self.test_user.id}",
+      "image-id": f"{self.images[1].id}",
+      "tag-id": ducks_id
+    })
+    self.assertEqual(self.suggest("d"), [("Ducks", 2), ("dogs", 1)])
+    imagetag: ImageTag = ImageTag.objects.get(tag_id=ducks_id, image=self.images[0])
+    self.client.delete(f'/api/image-tag/{imagetag.id}')
+    self.client.put(
+      f'/api/tag/{ducks_id}',
+      json.dumps({"tag-name": "geese"}),
+      content_type="application/json"
+    )
+    self.assertEqual(self.suggest("d"), [("dogs", 1)])
+    self.assertEqual(self.suggest("g"), [("geese", 1)])
+    self.client.delete(f'/api/tag/{self.tags["Catapult"].id}')
+    self.assertEqual(self.suggest("cata"), [])
+    # deleting a used Tag deletes its ImageTags too, in one revision
+    self.client.delete(f'/api/tag/{self.tags["caterpillar"].id}')
+    self.assertEqual(self.suggest("cat"), [("cats", 3)])
+    # none of the changes needed the index to be rebuilt
+    self.assertIs(tag_suggestions.owner_suggestions(self.test_user.id), index)
+
+  def test_index_updated_by_bulk_tagging(self):
+    self.assertEqual(self.suggest("d"), [("dogs", 1)])
+    index = tag_suggestions.owner_suggestions(self.test_user.id)
+    response = self.client.post('/api/image-tag/bulk', json.dumps({
+      "user-id": f"{self.test_user.id}",
+      "image-ids": [f"{image.id}" for image in self.images],
+      "add-tag-ids": [f"{self.tags['dogs'].id}", f"{self.tags['Ça va'].id}"],
+      "remove-tag-ids": [f"{self.tags['cats'].id}"]
+    }), content_type="application/json")
+    self.assertEqual(json.loads(response.content), {"added": 5, "removed": 3})
+    self.assertEqual(
+      self.suggest(""),
+      [("dogs", 3), ("Ça va", 3), ("caterpillar", 2), ("Catapult", 0), ("cats", 0)]
+    )
+    self.assertIs(tag_suggestions.owner_suggestions(self.test_user.id), index)
+
+  def test_index_rebuilt_on_other_changes(self):
+    self.assertEqual(self.suggest("dog"), [("dogs", 1)])
+    ImageTag.objects.create(image=self.images[1], tag=self.tags["dogs"])
+    Tag.objects.create(owner=self.test_user, name="dogma")
+    with patch("api.tag_suggestions.REVISION_TTL", 0):
+      self.assertEqual(self.suggest("dog"), [("dogs", 2), ("dogma", 0)])
+
+  def test_revision_checked_once_per_ttl(self):
+    self.suggest("d")
+    # within the TTL, a keystroke reads nothing
+    with self.assertNumQueries(0):
+      tag_suggestions.suggest(self.test_user.id, "do")
+    # then the revision is read, and the index kept if it is current
+    index = tag_suggestions.owner_suggestions(self.test_user.id)
+    with patch("api.tag_suggestions.REVISION_TTL", 0):
+      with self.assertNumQueries(1):
+        tag_suggestions.suggest(self.test_user.id, "dog")
+      self.assertIs(tag_suggestions.owner_suggestions(self.test_user.id), index)
+
+  def test_bad_requests(self):
+    for params in [
+      {}, {'owner': 'nope'}, {'owner': self.test_user.id, 'limit': '0'},
+      {'owner': self.test_user.id, 'limit': '51'}
+    ]:
+      with self.subTest(params=params):
+        response = self.client.get('/api/tag/suggest', params)
+        self.assertEqual(response.status_code, 400)
+    response = self.client.post('/api/tag/suggest', {'owner': self.test_user.id})
+    self.assertEqual(response.status_code, 405)
+
+
+class UrlAsgiStreamingTestCase(TestCase):
+  """Tests for streamed responses when served over ASGI.
+  Expected to stream media, exports and ZIP downloads from asynchronous
+  iterators, so the event loop sends them without buffering."""
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.test_tag: Tag = Tag.objects.create(name="cats", owner=cls.test_user)
+    cls.file_name: str = "asgi_test.bin"
+    cls.content: bytes = bytes(range(256)) * 1000
+    with open(f"{settings.MEDIA_ROOT}/{cls.file_name}", "wb") as file:
+      file.write(cls.content)
+    cls.test_image: Image = Image.objects.create(
+      source=cls.file_name,
+      owner=cls.test_user
+    )
+    ImageTag.objects.create(image=cls.test_image, tag=cls.test_tag)
+
+  @classmethod
+  def tearDownClass(cls) -> None:
+    Path(f"{settings.MEDIA_ROOT}/{cls.file_name}").unlink(missing_ok=True)
+    return super().tearDownClass()
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/async/
+    self.async_client = AsyncClient()
+
+  async def read(self, response) -> list:
+    self.assertTrue(response.is_async)
+    return [chunk async for chunk in response.streaming_content]
+
+  async def test_media_file(self):
+    with patch("api.media.MEDIA_BLOCK_SIZE", 1000):
+      response = await self.async_client.get(f'/api/image/{self.test_image.id}')
+      chunks: list = await self.read(response)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(len(chunks), 256)
+    self.assertEqual(b"".join(chunks), self.content)
+    self.assertEqual(response["Content-Length"], str(len(self.content)))
+
+  async def test_image_range(self):
+    response = await self.async_client.get(
+      f'/api/image/{self.test_image.id}',
+      headers={"Range": "bytes=1000-1999"}
+    )
+    self.assertEqual(response.status_code, 206)
+    self.assertEqual(b"".join(await self.read(response)), self.content[1000:2000])
+
+  async def test_image_not_modified(self):
+    response = await self.async_client.get(f'/api/image/{self.test_image.id}')
+    await self.read(response)
+    response = await self.async_client.get(
+      f'/api/image/{self.test_image.id}',
+      headers={"If-None-Match": response["ETag"]}
+    )
+    self.assertEqual(response.status_code, 304)
+
+  async def test_missing_image(self):
+    response = await self.async_client.get(f'/api/image/{uuid.uuid4()}')
+    self.assertEqual(response.status_code, 404)
+
+  async def test_export(self):
+    response = await self.async_client.get(f'/api/export?owner={self.test_user.id}')
+    lines: list = b"".join(await self.read(response)).decode().splitlines()
+    self.assertEqual(
+      [json.loads(line)["type"] for line in lines],
+      ["user", "tag", "image", "image-tag"]
+    )
+
+  async def test_tag_download(self):
+    response = await self.async_client.get(f'/api/tag/{self.test_tag.id}/download.zip')
+    archive = zipfile.ZipFile(BytesIO(b"".join(await self.read(response))))
+    self.assertEqual(archive.read(f"{self.test_image.id}.bin"), self.content)
 
+  def test_wsgi_unchanged(self):
+    # served over WSGI, files are still left to wsgi.file_wrapper
+    path: str = f"{settings.MEDIA_ROOT}/{self.file_name}"
+    response = media.file_response(RequestFactory().get('/'), path)
+    self.assertFalse(response.is_async)
+    self.assertIsNotNone(response.file_to_stream)
+    response.close()
+    response = media.file_response(AsyncRequestFactory().get('/'), path)
+    self.assertTrue(response.is_async)
+    response.close()
@@ -9,7 +9,8 @@ Most test classes in this module check their target view for:
 
 from django.test import Client, TestCase
 import json
-from api.models import AppUser, Image, Tag, ImageTag
+from api.models import AppUser, Image, Tag, ImageTag, CatalogRevision
+from api import tag_index
 
 
 class ExistingTagViewTestCase(TestCase):
@@ -381,3 +382,195 @@ class NewImageTagViewTestCase(TestCase):
     # check object actually created in backend
     self.assertEqual(new_imagetag.image.id, self.test_image.id)
     self.assertEqual(new_imagetag.tag.id, self.test_tag.id)
+
+  def test_POST_request_repeated(self):
+    client: Client = self.client
+    target_url: str = "/api/image-tag/new"
+
+    post_request_data: dict = {
+      "user-id": f"{self.test_user.id}",
+      "tag-id": f"{self.test_tag.id}",
+      "image-id": f"{self.test_image.id}"
+    }
+    first_response = client.post(target_url, post_request_data)
+    second_response = client.post(target_url, post_request_data)
+    # the image is only tagged once, and both responses refer to it
+    self.assertEqual(second_response.status_code, 200)
+    self.assertEqual(ImageTag.objects.count(), 1)
+    self.assertEqual(
+      json.loads(first_response.content),
+      json.loads(second_response.content)
+    )
+
+
+class BulkImageTagViewTestCase(TestCase):
+  """Tests the bulk_imagetag_view, including GET and POST methods.
+
+  GET: return required details for a bulk tagging request.
+  POST: add and remove many ImageTags at once.
+  """
+
+  @classmethod
+  def setUpTestData(cls) -> None:
+    cls.test_user: AppUser = AppUser.objects.create(username="test_user_1")
+    cls.test_images: list = [
+      Image.objects.create(source=f"bulk_test_{index}.png", owner=cls.test_user)
+      for index in range(20)
+    ]
+    cls.test_tags: list = [
+      Tag.objects.create(name=f"bulk_tag_{index}", owner=cls.test_user)
+      for index in range(3)
+    ]
+    cls.test_user_2: AppUser = AppUser.objects.create(username="other_user")
+    cls.other_image: Image = Image.objects.create(
+      source="bulk_test_other.png",
+      owner=cls.test_user_2
+    )
+
+  def setUp(self):
+    # https://docs.djangoproject.com/en/5.2/topics/testing/tools/#the-test-client
+    self.client = Client()
+    self.target_url: str = "/api/image-tag/bulk"
+
+  def post_json(self, data: dict):
+    return self.client.post(
+      self.target_url,
+      json.dumps(data),
+      content_type="application/json"
+    )
+
+  def request_data(self, images: list, add: list = [], remove: list = []) -> dict:
+    return {
+      "user-id": f"{self.test_user.id}",
+      "image-ids": [f"{image.id}" for image in images],
+      "add-tag-ids": [f"{tag.id}" for tag in add],
+      "remove-tag-ids": [f"{tag.id}" for tag in remove]
+    }
+
+  def test_reject_disallowed_method(self):
+    """Allowed methods are tested separately."""
+
+    expected_message: bytes = \
+      b"This resource requires GET or POST method."
+    response = self.client.delete(self.target_url)
+    self.assertEqual(response.status_code, 405)
+    self.assertEqual(response.content, expected_message)
+
+  def test_respond_to_GET_request(self):
+    response = self.client.get(self.target_url)
+    self.assertEqual(response.status_code, 200)
+    self.assertIn(b"image-ids", response.content)
+
+  def test_reject_malformed_request(self):
+    for data in [
+      {"some-data": "random"},
+      {"user-id": f"{self.test_user.id}", "image-ids": ["not-a-uuid"]},
+      # adding and removing the same tag at once
+      self.request_data(
+        self.test_images, add=self.test_tags[:1], remove=self.test_tags[:1]
+      )
+    ]:
+      response = self.post_json(data)
+      self.assertEqual(response.status_code, 400)
+    response = self.client.post(
+      self.target_url,
+      "not json",
+      content_type="application/json"
+    )
+    self.assertEqual(response.status_code, 400)
+
+  def test_user_ownership(self):
+    data: dict = self.request_data(
+      self.test_images + [self.other_image], add=self.test_tags
+    )
+    response = self.post_json(data)
+    self.assertEqual(response.status_code, 403)
+    # nothing is tagged unless everything can be
+    self.assertFalse(ImageTag.objects.exists())
+
+    data = self.request_data(self.test_images, add=self.test_tags)
+    data["user-id"] = f"{self.test_user_2.id}"
+    self.assertEqual(self.post_json(data).status_code, 403)
+    data["user-id"] = "00000000-0000-4000-8000-000000000000"
+    self.assertEqual(self.post_json(data).status_code, 401)
+
+  def test_add_tags(self):
+    response = self.post_json(
+      self.request_data(self.test_images, add=self.test_tags[:2])
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(json.loads(response.content), {"added": 40, "removed": 0})
+    self.assertEqual(ImageTag.objects.count(), 40)
+
+  def test_add_tags_by_form(self):
+    response = self.client.post(self.target_url, {
+      "user-id": f"{self.test_user.id}",
+      "image-ids": [f"{image.id}" for image in self.test_images[:2]],
+      "add-tag-ids": [f"{self.test_tags[0].id}"]
+    })
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(ImageTag.objects.count(), 2)
+
+  def test_existing_tags_not_duplicated(self):
+    ImageTag.objects.create(image=self.test_images[0], tag=self.test_tags[0])
+    response = self.post_json(
+      self.request_data(self.test_images, add=self.test_tags[:1])
+    )
+    self.assertEqual(json.loads(response.content)["added"], 19)
+    self.assertEqual(
+      ImageTag.objects.filter(image=self.test_images[0]).count(), 1
+    )
+
+  def test_add_and_remove_tags(self):
+    for image in self.test_images:
+      ImageTag.objects.create(image=image, tag=self.test_tags[0])
+    response = self.post_json(self.request_data(
+      self.test_images[:5], add=self.test_tags[1:], remove=self.test_tags[:1]
+    ))
+    self.assertEqual(json.loads(response.content), {"added": 10, "removed": 5})
+    self.assertEqual(ImageTag.objects.filter(tag=self.test_tags[0]).count(), 15)
+    self.assertEqual(
+      set(ImageTag.objects.filter(image=self.test_images[0])
+        .values_list("tag", flat=True)),
+      {self.test_tags[1].id, self.test_tags[2].id}
+    )
+
+  def test_constant_queries(self):
+    # the same number of queries, however many images are tagged:
+    # one check, then the writes and revision bump in a savepoint (the
+    # delete reads the rows it removes, to send their signals)
+    self.post_json(self.request_data(self.test_images, add=self.test_tags[1:2]))
+    tag_index._indexes.clear()
+    data: dict = self.request_data(
+      self.test_images[:2], add=self.test_tags[:1], remove=self.test_tags[1:2]
+    )
+    with self.assertNumQueries(8):
+      self.post_json(data)
+    data = self.request_data(
+      self.test_images, add=self.test_tags[2:], remove=self.test_tags[1:2]
+    )
+    with self.assertNumQueries(8):
+      self.post_json(data)
+
+  def test_revision_bumped_once(self):
+    before: int = CatalogRevision.objects.get(owner=self.test_user).revision
+    self.post_json(self.request_data(self.test_images, add=self.test_tags))
+    after: int = CatalogRevision.objects.get(owner=self.test_user).revision
+    self.assertEqual(after, before + 1)
+    # removing sends a signal per ImageTag, bumped once between them
+    self.post_json(self.request_data(self.test_images, remove=self.test_tags))
+    removed: int = CatalogRevision.objects.get(owner=self.test_user).revision
+    self.assertEqual(removed, after + 1)
+
+  def test_tag_index_updated(self):
+    tag_index._indexes.clear()
+    index = tag_index.owner_index(self.test_user.id)
+    self.post_json(self.request_data(self.test_images[:3], add=self.test_tags[:1]))
+    self.assertIs(tag_index.owner_index(self.test_user.id), index)
+    found = Image.objects.filter(
+      tag_index.search([f"{self.test_tags[0].id}"], [])
+    )
+    self.assertEqual(
+      {image.id for image in found},
+      {image.id for image in self.test_images[:3]}
+    )
@@ -0,0 +1,263 @@
+"""Builds and caches resized variants (thumbnails) of images.
+Used by api.views to serve thumbnails of Image objects.
+
+Variants are rendered with Pillow on first request and kept in a
+content-addressed disk cache under settings.THUMBNAIL_CACHE_ROOT,
+named by the SHA-256 of the original plus the size and format of the
+variant.  Identical originals therefore share their variants, and a
+variant never needs invalidating: new content means a new name.
+
+The cache is bounded by settings.THUMBNAIL_CACHE_MAX_BYTES.  Variants
+are touched whenever they are served, and the least recently used are
+evicted once the cache grows past its bound.
+
+Concurrent requests for the same missing variant are collapsed into a
+single render: within a process by an in-flight table, and across
+processes (where available) by a striped file lock.
+
+Functions
+---------
+
+snap_width
+    Rounds a requested width up to one of the widths that are cached.
+
+variant_path
+    Returns the cache path for a variant of an original.
+
+get_variant
+    Returns the path to a variant, rendering it first if necessary.
+"""
+
+import os
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from django.conf import settings
+from PIL import Image as PillowImage
+from PIL import ImageOps
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# Widths variants are rendered at; requests are rounded up to one of
+# these so that arbitrary widths cannot flood the cache
+THUMBNAIL_WIDTHS: tuple = (
+    64, 128, 256, 320, 384, 640, 750, 828, 1080, 1200, 1920, 2048, 3840
+)
+
+# Supported formats: format query parameter -> (Pillow format, MIME type)
+THUMBNAIL_FORMATS: dict = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png')
+}
+
+# Number of lock files shared by all variants for cross-process locking
+LOCK_STRIPES: int = 64
+
+# Evict down to this fraction of the bound, so eviction is not re-run
+# on every render once the cache is full
+EVICTION_TARGET: float = 0.9
+
+_inflight_lock = threading.Lock()
+_inflight: dict = {}
+_cache_size_lock = threading.Lock()
+_cache_size: int | None = None
+
+
+def snap_width(width: int) -> int:
+    """Rounds width up to the nearest of THUMBNAIL_WIDTHS.
+    Widths beyond the largest are clamped to it.
+    """
+
+    for candidate in THUMBNAIL_WIDTHS:
+        if candidate >= width:
+            return candidate
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def variant_path(sha256: str, width: int, fmt: str) -> Path:
+    """Returns the cache path of a variant of the original with the given
+    content hash.  Variants are sharded by the first two hex digits of
+    the hash, to keep directories small.
+    """
+
+    root = Path(settings.THUMBNAIL_CACHE_ROOT)
+    return root / sha256[:2] / f'{sha256}-w{width}.{fmt}'
+
+
+def get_variant(source_path: str, sha256: str, width: int, fmt: str) -> Path:
+    """Returns the path to a variant of the image at source_path.
+    The variant is rendered (and the cache trimmed) if not yet cached.
+    Raises PIL.UnidentifiedImageError if the original is not an image.
+    """
+
+    path: Path = variant_path(sha256, width, fmt)
+    if _touch(path):
+        return path
+
+    with _single_flight(str(path)) as leader:
+        # followers wait for the leader, then find its render in place
+        if not leader and _touch(path):
+            return path
+        with _file_lock(str(path)):
+            # another process may have rendered it while we waited
+            if _touch(path):
+                return path
+            size: int = _render(source_path, path, width, fmt)
+
+    _record_growth(size)
+    return path
+
+
+def _touch(path: Path) -> bool:
+    """Marks a cached variant as recently used.
+    Returns False if it is not cached.
+    """
+
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _render(source_path: str, path: Path, width: int, fmt: str) -> int:
+    """Renders a variant of source_path to path; returns its size.
+    Originals narrower than width are not scaled up.
+    """
+
+    pillow_format, _ = THUMBNAIL_FORMATS[fmt]
+    with PillowImage.open(source_path) as original:
+        # respect camera orientation, as browsers do for the original
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            height: int = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), PillowImage.Resampling.LANCZOS)
+        if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode == 'P':
+            image = image.convert('RGBA')
+
+        # write to a temporary file first, so that readers never see
+        # a partially written variant; its name is unique, so that
+        # renders in other threads or processes never share it (and
+        # starts with a dot, so that eviction passes it over)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary_name = tempfile.mkstemp(
+            dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp'
+        )
+        temporary_path = Path(temporary_name)
+        try:
+            with open(descriptor, 'wb') as file:
+                image.save(file, format=pillow_format)
+            # mkstemp creates files readable by their owner only
+            if settings.FILE_UPLOAD_PERMISSIONS is not None:
+                os.chmod(temporary_path, settings.FILE_UPLOAD_PERMISSIONS)
+            os.replace(temporary_path, path)
+        finally:
+            temporary_path.unlink(missing_ok=True)
+    return path.stat().st_size
+
+
+@contextmanager
+def _single_flight(key: str):
+    """Yields True to the first thread to ask for key, which should do
+    the work; other threads asking meanwhile wait for it to finish,
+    then are yielded False.
+    """
+
+    with _inflight_lock:
+        done: threading.Event | None = _inflight.get(key)
+        leader: bool = done is None
+        if leader:
+            done = _inflight[key] = threading.Event()
+
+    if not leader:
+        done.wait()
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        done.set()
+
+
+@contextmanager
+def _file_lock(key: str):
+    """Holds one of LOCK_STRIPES exclusive file locks, chosen by key,
+    so that only one process renders a given variant at a time.
+    """
+
+    if fcntl is None:
+        yield
+        return
+
+    lock_dir = Path(settings.THUMBNAIL_CACHE_ROOT) / 'locks'
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    stripe: int = zlib.crc32(key.encode()) % LOCK_STRIPES
+    with open(lock_dir / f'{stripe}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _record_growth(size: int) -> None:
+    """Adds a new variant to the running cache size; evicts the least
+    recently used variants if that takes the cache past its bound.
+    """
+
+    global _cache_size
+    max_bytes: int = settings.THUMBNAIL_CACHE_MAX_BYTES
+    with _cache_size_lock:
+        if _cache_size is None:
+            _cache_size = sum(size for _, size, _ in _cached_variants())
+        else:
+            _cache_size += size
+        if _cache_size > max_bytes:
+            _cache_size = _evict(int(max_bytes * EVICTION_TARGET))
+
+
+def _cached_variants() -> list:
+    """Lists (path, size, last used) for every cached variant."""
+
+    variants: list = []
+    root = Path(settings.THUMBNAIL_CACHE_ROOT)
+    for shard in root.glob('??'):
+        for entry in os.scandir(shard):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            variants.append((entry.path, stat.st_size, stat.st_mtime))
+    return variants
+
+
+def _evict(target_bytes: int) -> int:
+    """Deletes the least recently used variants until the cache holds at
+    most target_bytes; returns the resulting size of the cache.
+    (The size is re-measured, as other processes share the cache.)
+    """
+
+    variants: list = sorted(_cached_variants(), key=lambda variant: variant[2])
+    total: int = sum(size for _, size, _ in variants)
+    for path, size, _ in variants:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
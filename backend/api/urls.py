@@ -3,29 +3,54 @@
 The following URLs provide API-delivered data:
  - user/
  - image/
+ - image/search
+ - image/[id]/thumb
+ - image/[id]/similar
  - tag/
+ - tag/suggest
+ - tag/[id]/download.zip
  - image-tag/
+ - image-tag/bulk
+ - export
 """
 
 from django.urls import path
+from .query_watch import query_budget
 from .views import AppUserListView, ImageListView, TagListView, ImageTagListView
-from .views import user_view, image_view
-from .views import existing_tag_view, new_tag_view
-from .views import existing_imagetag_view, new_imagetag_view
+from .views import user_view, image_view, thumbnail_view, similar_view
+from .views import existing_tag_view, new_tag_view, tag_download_view
+from .views import tag_suggest_view
+from .views import existing_imagetag_view, new_imagetag_view, bulk_imagetag_view
+from .views import export_view, search_view
 
+# Each view declares the most SQL queries it may run per request, as
+# the tests exercise it; a view going over fails its tests (see
+# api.query_watch).  Streamed responses count only the queries run
+# before streaming starts.
 app_name = 'api'
 urlpatterns = [
-    path('user/', AppUserListView.as_view()),
-    path('user/<uuid:user_id>', user_view),
+    path('user/', query_budget(1)(AppUserListView.as_view())),
+    path('user/<uuid:user_id>', query_budget(0)(user_view)),
     
-    path('image/', ImageListView.as_view()),
-    path('image/<uuid:image_id>', image_view),
+    # searching by tag within a catalog may first build its index
+    path('image/', query_budget(6)(ImageListView.as_view())),
+    path('image/search', query_budget(1)(search_view)),
+    path('image/<uuid:image_id>', query_budget(3)(image_view)),
+    path('image/<uuid:image_id>/thumb', query_budget(3)(thumbnail_view)),
+    path('image/<uuid:image_id>/similar', query_budget(6)(similar_view)),
 
-    path('tag/', TagListView.as_view()),
-    path('tag/<uuid:tag_id>', existing_tag_view),
-    path('tag/new', new_tag_view),
+    path('tag/', query_budget(2)(TagListView.as_view())),
+    # deleting a Tag deletes its ImageTags too, in one transaction
+    path('tag/<uuid:tag_id>', query_budget(8)(existing_tag_view)),
+    path('tag/<uuid:tag_id>/download.zip', query_budget(1)(tag_download_view)),
+    path('tag/new', query_budget(4)(new_tag_view)),
+    path('tag/suggest', query_budget(2)(tag_suggest_view)),
 
-    path('image-tag/', ImageTagListView.as_view()),
-    path('image-tag/<uuid:imagetag_id>', existing_imagetag_view),
-    path('image-tag/new', new_imagetag_view)
+    path('image-tag/', query_budget(2)(ImageTagListView.as_view())),
+    path('image-tag/<uuid:imagetag_id>', query_budget(4)(existing_imagetag_view)),
+    path('image-tag/new', query_budget(6)(new_imagetag_view)),
+    # each cached index updated in place reads the catalog revision
+    path('image-tag/bulk', query_budget(9)(bulk_imagetag_view)),
+
+    path('export', query_budget(1)(export_view))
 ]
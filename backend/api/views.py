@@ -9,16 +9,43 @@ Classes
     For example, ImageView exposes data from class api.models.Image.
     Includes: AppUserView, ImageView, TagView, ImageTagView.
 
+CatalogListMixin
+    Adds owner filtering and conditional GET to catalog list views.
+
 """
 
 import json
+from collections import Counter
+from pathlib import Path
 from uuid import UUID
+from asgiref.sync import sync_to_async
 from rest_framework import generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from .models import AppUser, Image, Tag, ImageTag
+from . import export, metrics, revisions, routing, search, tag_index
+from . import tag_suggestions
+from .conditional import condition_on_catalog, owner_from_request
+from .fast_serialization import row_converter
+from .media import dhash, file_response, file_sha256, zip_chunks
+from .media import stream_chunks, stream_file
+from .pagination import KeysetPagination
+from .similarity import DEFAULT_MAX_DISTANCE, MAX_DISTANCE_LIMIT
+from .similarity import similar_images
+from .thumbnails import THUMBNAIL_FORMATS, get_variant, snap_width
 from .serializers import \
     AppUserSerializer, ImageSerializer, TagSerializer, ImageTagSerializer
-from django.http import HttpResponse
+from .serializers import ImageWithTagsSerializer
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from PIL import UnidentifiedImageError
+from PIL.Image import DecompressionBombError
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 # noinspection PyUnresolvedReferences
 from django.db.models.query import QuerySet  # for TypeHints
 
@@ -40,18 +67,149 @@ class AppUserListView(generics.ListCreateAPIView):
         return response
 
 
-class ImageListView(generics.ListAPIView):
+class CatalogListMixin:
+    """Adds owner filtering and conditional GET to catalog list views.
+    Lists may be narrowed to one owner's catalog with the "owner" query
+    parameter.  Responses carry a weak ETag and Last-Modified derived
+    from the catalog revision (see api.conditional), so clients can
+    revalidate their copy without the list being serialized again.
+    Rendered responses are cached until the catalog changes (see
+    api.response_cache).  Lists are read from a replica database where
+    there is one (see api.routing).
+
+    Lists whose serializer has only plain model fields are read with
+    values_list and converted without building model instances (see
+    api.fast_serialization); the JSON rendered is the same either way.
+
+    Attributes
+    ----------
+    owner_field: str
+        Lookup from the listed model to its owning AppUser.
+    """
+
+    owner_field: str = 'owner'
+
+    def get_queryset(self) -> QuerySet:
+        queryset: QuerySet = super().get_queryset()
+        try:
+            owner_id: UUID | None = owner_from_request(self.request)
+        except ValueError:
+            raise ValidationError({'owner': 'Must be a valid UUID.'})
+        if owner_id is not None:
+            queryset = queryset.filter(**{self.owner_field: owner_id})
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        # lists only read, so are read from a replica (see api.routing);
+        # the revision they are validated against too
+        with routing.replica_reads(request):
+            return self.get_current(request, *args, **kwargs)
+
+    @condition_on_catalog
+    def get_current(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        fast_path: tuple | None = row_converter(
+            self.get_serializer_class(),
+            request,
+            read_raw=self.paginator is None
+        )
+        if fast_path is None:
+            with metrics.serializing():
+                return super().list(request, *args, **kwargs)
+
+        columns, convert = fast_path
+        # the paginator reads the sort key of rows by attribute name
+        rows: QuerySet = self.filter_queryset(self.get_queryset()) \
+            .values_list(*columns, named=self.paginator is not None)
+        page: list | None = self.paginate_queryset(rows)
+        with metrics.serializing():
+            data: list = convert(page if page is not None else rows)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class ImageListView(CatalogListMixin, generics.ListAPIView):
     """ImageView
     Exposes API-delivered Image information.
     See api.models.Image for details.
+
+    Results are paginated newest-first by cursor;
+    see api.pagination.KeysetPagination for details.
+
+    Images may be searched by tag with the following query parameters,
+    each taking a comma-separated list of Tag ids or names:
+
+    tags: Images must have all of these Tags (or any, by mode).
+    exclude: Images must have none of these Tags.
+    mode: "all" (default) or "any", for how tags are combined.
+
+    Searches are answered from an in-memory index, a page at a time;
+    see api.tag_index.
+
+    With expand=tags, each Image is listed with the id and name of each
+    of its Tags.  These are fetched for the whole page at once, so the
+    number of queries does not grow with the page size.
     """
 
     queryset: QuerySet = Image.objects.all()
     serializer_class = ImageSerializer
     renderer_classes = [JSONRenderer]
+    pagination_class = KeysetPagination
+
+    # Related data that may be asked for with the "expand" parameter
+    expansions: tuple = ('tags',)
+
+    def get_expansions(self) -> set:
+        expand: set = {
+            name for name in self.request.query_params.get('expand', '').split(',')
+            if name
+        }
+        if not expand <= set(self.expansions):
+            raise ValidationError(
+                {'expand': f"Must be among {', '.join(self.expansions)}."}
+            )
+        return expand
+
+    def get_serializer_class(self):
+        if 'tags' in self.get_expansions():
+            return ImageWithTagsSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self) -> QuerySet:
+        queryset: QuerySet = super().get_queryset()
+        if 'tags' in self.get_expansions():
+            queryset = queryset.prefetch_related(Prefetch(
+                'imagetag_set',
+                queryset=ImageTag.objects.select_related('tag')
+            ))
+
+        params = self.request.query_params
+        if 'tags' not in params and 'exclude' not in params:
+            return queryset
+
+        mode: str = params.get('mode', 'all')
+        if mode not in tag_index.SEARCH_MODES:
+            raise ValidationError(
+                {'mode': f"Must be one of {', '.join(tag_index.SEARCH_MODES)}."}
+            )
+        # only the page asked for is looked up in the index
+        reverse, position, limit = \
+            self.paginator.read_window(self.request, Image)
+        return queryset.filter(tag_index.search(
+            [term for term in params.get('tags', '').split(',') if term],
+            [term for term in params.get('exclude', '').split(',') if term],
+            mode,
+            owner_from_request(self.request),  # validated by super()
+            after=position,
+            reverse=reverse,
+            limit=limit
+        ))
 
 
-class TagListView(generics.ListAPIView):
+class TagListView(CatalogListMixin, generics.ListAPIView):
     """TagView
     Exposes API-delivered Tag information.
     See api.models.Tag for details.
@@ -62,7 +220,7 @@ class TagListView(generics.ListAPIView):
     renderer_classes = [JSONRenderer]
 
 
-class ImageTagListView(generics.ListAPIView):
+class ImageTagListView(CatalogListMixin, generics.ListAPIView):
     """ImageTagView
     Exposes API-delivered ImageTag information.
     See api.models.ImageTag for details.
@@ -71,6 +229,65 @@ class ImageTagListView(generics.ListAPIView):
     queryset: QuerySet = ImageTag.objects.all()
     serializer_class = ImageTagSerializer
     renderer_classes = [JSONRenderer]
+    owner_field = 'tag__owner'
+
+
+def store_hashes(image: Image, **hashes) -> None:
+    """Stores hashes found on first use on the row of image.
+    Hashes are derived from the media file, not catalog data, so they
+    are stored without signals: the catalog revision, and with it the
+    ETags and caches validated against it, is left as it was.  The row
+    is written on the primary by name, so the rest of the request's
+    reads stay on their replica (see api.routing).  A new perceptual
+    hash bumps only the owner's hash revision (see api.similarity).
+    """
+
+    Image.objects.using(DEFAULT_DB_ALIAS).filter(pk=image.pk).update(**hashes)
+    if 'perceptual_hash' in hashes:
+        revisions.bump_hashes(image.owner_id)
+
+
+def content_hash(image: Image) -> str:
+    """Returns the SHA-256 of the media file of image.
+    Hashes the file (once) for Images created before hashes were stored.
+    """
+
+    if not image.sha256:
+        image.sha256 = file_sha256(image.source.path)
+        store_hashes(image, sha256=image.sha256)
+    return image.sha256
+
+
+def perceptual_hash(image: Image) -> int:
+    """Returns the perceptual hash of the media file of image.
+    Hashes the file (once) for Images hashed before these were stored.
+    Raises PIL.UnidentifiedImageError if the media is not an image.
+    """
+
+    if image.perceptual_hash is None:
+        image.perceptual_hash = dhash(image.source.path)
+        store_hashes(image, perceptual_hash=image.perceptual_hash)
+    return image.perceptual_hash
+
+
+def count_owned(user_id: UUID, image_ids, tag_ids) -> tuple | None:
+    """Returns (images, tags): how many of image_ids and of tag_ids the
+    AppUser with user_id owns, or None if there is no such AppUser.
+    Checks the AppUser and both sets of ids in a single query.
+    """
+
+    def owned(model) -> Coalesce:
+        ids = image_ids if model is Image else tag_ids
+        return Coalesce(Subquery(
+            model.objects.filter(owner_id=OuterRef('pk'), id__in=ids)
+            .order_by().values('owner_id')
+            .annotate(count=Count('pk')).values('count')
+        ), 0)
+
+    return AppUser.objects.filter(id=user_id).annotate(
+        images=owned(Image),
+        tags=owned(Tag)
+    ).values_list('images', 'tags').first()
 
 
 def user_view(_, **user_id) -> HttpResponse:
@@ -80,14 +297,277 @@ def user_view(_, **user_id) -> HttpResponse:
         "<div>This page hasn't really been implemented for anything yet.</div>"
     )
 
-def image_view(_, **image_id) -> HttpResponse:
-    requested_image: Image = Image.objects.get(id=image_id['image_id'])
+async def image_view(request, image_id) -> HttpResponse:
+    """Serves the media file of the Image specified by request.image_id.
+
+    The file is streamed from disk rather than loaded into memory, is
+    labeled with its detected MIME type, and HTTP Range requests are
+    honored (so videos can seek).  See api.media for details.
+
+    Responses carry a strong ETag made from the content hash of the file,
+    so a client presenting it in If-None-Match gets a 304 response
+    without the file being touched at all.
+
+    The view is asynchronous: served over ASGI, the file is sent by the
+    event loop, a block at a time, and a slow client holds no thread
+    while it downloads.  File I/O is done in worker threads.
+
+    The Image is looked up on a replica database where there is one
+    (see api.routing).
+    """
+
+    try:
+        with routing.replica_reads(request):
+            requested_image: Image = await Image.objects.aget(id=image_id)
+        file_path: str = requested_image.source.path
+        sha256: str = requested_image.sha256 \
+            or await sync_to_async(content_hash)(requested_image)
+        etag: str = f'"{sha256}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = await sync_to_async(
+                file_response, thread_sensitive=False
+            )(request, file_path, etag=etag)
+    except (Image.DoesNotExist, FileNotFoundError):
+        return HttpResponse(status=404)
+
+    if response.status_code in (200, 206, 304):
+        response.headers['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+    return response
+
+def thumbnail_view(request, image_id) -> HttpResponse:
+    """Serves a resized variant of the Image specified by request.image_id.
+    Accepts the following query parameters:
+
+    w: width in pixels (default 320); rounded up to a width that is cached.
+    fmt: format of the variant, one of webp (default), jpeg or png.
 
+    Variants are rendered on first request and cached on disk after;
+    see api.thumbnails for details.  As with image_view, responses carry
+    a strong ETag, checked before any rendering or file I/O.
+    """
+
+    # validate method is GET (or HEAD)
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    # validate request is properly formed
+    try:
+        width: int = int(request.GET.get('w', 320))
+        if width <= 0:
+            raise ValueError
+        width = snap_width(width)
+        fmt: str = request.GET.get('fmt', 'webp')
+        _, content_type = THUMBNAIL_FORMATS[fmt]
+    except (ValueError, KeyError):
+        return HttpResponse(
+            status=400,
+            content="Requires w: positive integer width, " \
+            f"and fmt: one of {', '.join(THUMBNAIL_FORMATS)}"
+        )
+
+    try:
+        requested_image: Image = Image.objects.get(id=image_id)
+        file_path: str = requested_image.source.path
+        sha256: str = content_hash(requested_image)
+        etag: str = f'"{sha256}-w{width}.{fmt}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            variant_path = get_variant(file_path, sha256, width, fmt)
+            response = stream_file(request, FileResponse(
+                open(variant_path, 'rb'),
+                content_type=content_type
+            ))
+    except (Image.DoesNotExist, FileNotFoundError):
+        return HttpResponse(status=404)
+    except (UnidentifiedImageError, DecompressionBombError):
+        # videos and other media that Pillow cannot (or will not) read
+        return HttpResponse(status=415)
+
+    response.headers['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+def similar_view(request, image_id) -> HttpResponse:
+    """Lists the near duplicates of the Image specified by request.image_id:
+    other Images of the same owner whose perceptual hashes differ from
+    its own in at most max_distance bits.  Accepts the query parameter:
+
+    max_distance: integer from 0 to 16 (default 10).
+
+    Responds with the matching Images, each with its "distance", nearest
+    first.  Lookups use an in-memory index; see api.similarity.
+    """
+
+    # validate method is GET (or HEAD)
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    # validate request is properly formed
+    try:
+        max_distance: int = int(
+            request.GET.get('max_distance', DEFAULT_MAX_DISTANCE)
+        )
+        if not 0 <= max_distance <= MAX_DISTANCE_LIMIT:
+            raise ValueError
+    except ValueError:
+        return HttpResponse(
+            status=400,
+            content="Requires max_distance: integer from 0 to " \
+            f"{MAX_DISTANCE_LIMIT}"
+        )
+
+    try:
+        requested_image: Image = Image.objects.get(id=image_id)
+        perceptual_hash(requested_image)
+    except (Image.DoesNotExist, FileNotFoundError):
+        return HttpResponse(status=404)
+    except UnidentifiedImageError:
+        # videos and other media that Pillow cannot read
+        return HttpResponse(status=415)
+
+    matches: list = similar_images(requested_image, max_distance)
+    found: dict = Image.objects.in_bulk([image_id for _, image_id in matches])
+    response_data: list = []
+    for distance, match_id in matches:
+        if match_id in found:  # unless deleted since the index was built
+            image_data: dict = dict(ImageSerializer(found[match_id]).data)
+            image_data["distance"] = distance
+            response_data.append(image_data)
     return HttpResponse(
-        requested_image.source,
-        content_type="image/png"
+        status=200,
+        content_type="application/json",
+        content=JSONRenderer().render(response_data)
     )
 
+
+def search_view(request) -> HttpResponse:
+    """Searches the descriptions of Images for the words of a query;
+    see api.search.  Accepts the query parameters:
+
+    q: the text to search for (required).  Each word matches words it
+       is the start of, and Images must match every word.
+    owner: id of the AppUser whose Images to search (default: all).
+    page_size: integer from 1 to 500 (default 50).
+    cursor: position to read on from, as given by "next".
+
+    Responds with {"next": URL of the following page, or null,
+    "results": [...]}, best matches first.
+    """
+
+    # validate method is GET
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    # validate request is properly formed
+    query: str = request.GET.get('q', '')
+    if not search.query_terms(query):
+        return HttpResponse(status=400, content="Requires q: words to search for")
+    try:
+        owner_id: UUID | None = owner_from_request(request)
+    except ValueError:
+        return HttpResponse(status=400, content="owner must be a valid UUID")
+    try:
+        page_size: int = int(
+            request.GET.get('page_size', KeysetPagination.page_size)
+        )
+        if not 1 <= page_size <= KeysetPagination.max_page_size:
+            raise ValueError
+    except ValueError:
+        return HttpResponse(
+            status=400,
+            content="Requires page_size: integer from 1 to " \
+            f"{KeysetPagination.max_page_size}"
+        )
+    after: tuple | None = None
+    if request.GET.get('cursor'):
+        try:
+            after = search.decode_cursor(request.GET['cursor'])
+        except ValueError:
+            return HttpResponse(status=404, content="Invalid cursor.")
+
+    # fetch one extra match to find out whether there is another page
+    matches: list = search.search(query, owner_id, after, page_size + 1)
+    next_link: str | None = None
+    if len(matches) > page_size:
+        matches = matches[:page_size]
+        next_link = replace_query_param(
+            request.build_absolute_uri(),
+            'cursor',
+            search.encode_cursor(matches[-1])
+        )
+    return HttpResponse(
+        status=200,
+        content_type="application/json",
+        content=JSONRenderer().render({
+            "next": next_link,
+            "results": ImageSerializer(
+                matches, many=True, context={'request': request}
+            ).data
+        })
+    )
+
+
+def export_view(request) -> HttpResponse:
+    """Streams a catalog as newline-delimited JSON; see api.export for
+    the records it holds.  Accepts the query parameters:
+
+    owner: id of the AppUser whose catalog to export (default: all).
+    format: "ndjson" (the default, and only format so far).
+    compress: "gzip" to compress the export as it is streamed.
+
+    Rows are read and sent in batches, so exports of any size are
+    served in constant memory.
+    """
+
+    # validate method is GET
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    # validate request is properly formed
+    export_format: str = request.GET.get('format', 'ndjson')
+    compress: str = request.GET.get('compress', '')
+    if export_format not in export.EXPORT_FORMATS or compress not in ['', 'gzip']:
+        return HttpResponse(
+            status=400,
+            content="Requires format: ndjson; accepts compress: gzip"
+        )
+    try:
+        owner_id: UUID | None = owner_from_request(request)
+    except ValueError:
+        return HttpResponse(status=400, content="owner must be a valid UUID")
+    if owner_id is not None and not AppUser.objects.filter(id=owner_id).exists():
+        return HttpResponse(status=404)
+
+    chunks = export.ndjson_chunks(export.export_records(owner_id, request))
+    filename: str = f"catalog-{owner_id or 'all'}.ndjson"
+    if compress:
+        chunks = export.gzip_chunks(chunks)
+        filename += '.gz'
+    response = StreamingHttpResponse(
+        stream_chunks(request, chunks),
+        content_type='application/gzip' if compress else 'application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename="{filename}"'
+    return response
+
+
 def existing_tag_view(request, tag_id) -> HttpResponse:
     """Handles requests meant to manipulate existing Tag objects.
     Accepts the following methods:
@@ -121,7 +601,7 @@ def existing_tag_view(request, tag_id) -> HttpResponse:
             response_data = {
                 "tag-id": f"{target_tag.id}",
                 "tag-name": f"{target_tag.name}",
-                "tag-owner": f"{target_tag.owner.id}"
+                "tag-owner": f"{target_tag.owner_id}"
             }
             return HttpResponse(
                 status=200,
@@ -137,8 +617,13 @@ def existing_tag_view(request, tag_id) -> HttpResponse:
         except Tag.DoesNotExist:
             return HttpResponse(status=400)
 
-        # carry out deletion and inform client
-        target_tag.delete()
+        # carry out deletion, bumping the revision once for the Tag and
+        # the ImageTags deleted with it, and inform client
+        with transaction.atomic(), revisions.batch(
+            tag_owners={target_tag.id: target_tag.owner_id}
+        ):
+            target_tag.delete()
+        tag_suggestions.record_tag(target_tag.owner_id, tag_id, None)
         response_data: dict = {"tag-id": f"{tag_id}"}
         return HttpResponse(
             status=200,
@@ -156,6 +641,7 @@ def existing_tag_view(request, tag_id) -> HttpResponse:
     # update tag name as specified and inform client
     target_tag.name = new_tag_name
     target_tag.save()
+    tag_suggestions.record_tag(target_tag.owner_id, target_tag.id, new_tag_name)
     response_data = {
         "tag-id": f"{tag_id}",
         "tag-name": f"{target_tag.name}"
@@ -166,6 +652,105 @@ def existing_tag_view(request, tag_id) -> HttpResponse:
         content=json.dumps(response_data)
     )
 
+def tag_suggest_view(request) -> HttpResponse:
+    """Suggests the Tags of an owner whose names start with a prefix,
+    for type-ahead.  Accepts the query parameters:
+
+    owner: id of the AppUser whose Tags to suggest (required).
+    prefix: the start of the Tag name, in any case (default: empty,
+        suggesting from every Tag).
+    limit: integer from 1 to 50 (default 10).
+
+    Responds with the matching Tags, each with its "id", "name" and
+    "count" of Images, the most used first.  Lookups use an in-memory
+    index; see api.tag_suggestions.
+    """
+
+    # validate method is GET
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    # validate request is properly formed
+    try:
+        owner_id: UUID | None = owner_from_request(request)
+        if owner_id is None:
+            raise ValueError
+    except ValueError:
+        return HttpResponse(status=400, content="Requires owner: valid UUID")
+    try:
+        limit: int = int(
+            request.GET.get('limit', tag_suggestions.DEFAULT_LIMIT)
+        )
+        if not 1 <= limit <= tag_suggestions.MAX_LIMIT:
+            raise ValueError
+    except ValueError:
+        return HttpResponse(
+            status=400,
+            content="Requires limit: integer from 1 to " \
+            f"{tag_suggestions.MAX_LIMIT}"
+        )
+
+    suggestions: list = tag_suggestions.suggest(
+        owner_id,
+        request.GET.get('prefix', ''),
+        limit
+    )
+    return HttpResponse(
+        status=200,
+        content_type="application/json",
+        content=json.dumps([
+            {"id": f"{tag_id}", "name": name, "count": count}
+            for tag_id, name, count in suggestions
+        ])
+    )
+
+def tag_download_view(request, tag_id) -> HttpResponse:
+    """Streams a ZIP archive of the media files of every Image tagged
+    with the Tag specified by request.tag_id, oldest first.
+
+    The archive is built as it is sent, a block of a file at a time
+    (see api.media.zip_chunks), so tag sets of any size are served
+    without being held in memory or written to disk.
+    """
+
+    # validate method is GET
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    try:
+        target_tag: Tag = Tag.objects.get(id=tag_id)
+    except Tag.DoesNotExist:
+        return HttpResponse(status=404)
+
+    images = Image.objects.filter(imagetag__tag_id=tag_id) \
+        .order_by('uploaded_at', 'id') \
+        .values_list('id', 'source', 'uploaded_at')
+    storage = Image._meta.get_field('source').storage
+
+    def entries():
+        for image_id, source, uploaded_at in images.iterator(chunk_size=500):
+            yield (
+                f"{image_id}{Path(source).suffix.lower()}",
+                storage.path(source),
+                uploaded_at
+            )
+
+    response = StreamingHttpResponse(
+        stream_chunks(request, zip_chunks(entries())),
+        content_type='application/zip'
+    )
+    response.headers['Content-Disposition'] = content_disposition_header(
+        as_attachment=True,
+        filename=f"{target_tag.name}.zip"
+    )
+    return response
+
 def new_tag_view(request) -> HttpResponse:
     """Handles requests to create a new Tag object.
     Accepts the following methods:
@@ -211,7 +796,7 @@ def new_tag_view(request) -> HttpResponse:
     
     # if passed all checks, create Tag as specified
     new_tag: Tag = Tag.objects.create(owner=requesting_user, name=tag_name)
-    new_tag.save()
+    tag_suggestions.record_tag(requesting_user.id, new_tag.id, tag_name)
     response_data = {
         "tag-id": f"{new_tag.id}",
         "tag-name": new_tag.name
@@ -250,7 +835,9 @@ def existing_imagetag_view(request, imagetag_id) -> HttpResponse:
     # validate user owns specified resource
     ... # more robust checks to come later
     try:
-        target_imagetag: ImageTag = ImageTag.objects.get(id=imagetag_id)
+        # the owner of the Tag is needed on deletion
+        target_imagetag: ImageTag = ImageTag.objects \
+            .select_related('tag').get(id=imagetag_id)
     except ImageTag.DoesNotExist:
         return HttpResponse(status=403)
     
@@ -258,8 +845,8 @@ def existing_imagetag_view(request, imagetag_id) -> HttpResponse:
     if request.method == "GET":
         response_data = {
             "imagetag-id": f"{target_imagetag.id}",
-            "image-id": f"{target_imagetag.image.id}",
-            "tag-id": f"{target_imagetag.tag.id}"
+            "image-id": f"{target_imagetag.image_id}",
+            "tag-id": f"{target_imagetag.tag_id}"
         }
         return HttpResponse(
             status=200,
@@ -268,6 +855,16 @@ def existing_imagetag_view(request, imagetag_id) -> HttpResponse:
     
     # carry out DELETE requests and confirm to client
     target_imagetag.delete()
+    tag_index.record_tagging(
+        target_imagetag.tag.owner_id,
+        [target_imagetag.image_id],
+        remove_tag_ids=[target_imagetag.tag_id]
+    )
+    tag_suggestions.record_usage(
+        target_imagetag.tag.owner_id,
+        target_imagetag.tag_id,
+        -1
+    )
     response_data = {
         "imagetag-id": f"{imagetag_id}"
     }
@@ -323,31 +920,186 @@ def new_imagetag_view(request) -> HttpResponse:
     # validate that requesting user owns specified resources
     try:
         user_id: UUID = request.POST['user-id']
-        requesting_user: AppUser = AppUser.objects.get(id=user_id)
-        user_images: QuerySet = Image.objects.filter(owner=requesting_user)
-        user_tags: QuerySet = Tag.objects.filter(owner=requesting_user)
-        if not user_images.filter(id=image_id):
-            raise Image.DoesNotExist
-        if not user_tags.filter(id=tag_id):
-            raise Tag.DoesNotExist
-    except (Image.DoesNotExist, Tag.DoesNotExist):
-        return HttpResponse(status=403)
+        owned: tuple | None = count_owned(user_id, [image_id], [tag_id])
     except KeyError:
         return HttpResponse(status=400)
-    except AppUser.DoesNotExist:
+    if owned is None:
         return HttpResponse(status=401)
+    if owned != (1, 1):
+        return HttpResponse(status=403)
 
-    # if passed all checks, create ImageTag as specified
-    target_image: Image = Image.objects.get(id=image_id)
-    target_tag: Tag = Tag.objects.get(id=tag_id)
-    new_imagetag: ImageTag = ImageTag.objects.create(
-        image=target_image,
-        tag=target_tag
-    )
-    new_imagetag.save()
+    # if passed all checks, create ImageTag as specified (unless the
+    # image already has the tag); both objects are known to exist, so
+    # there is no need to fetch them again, and the ImageTag is looked
+    # up only if it already exists
+    try:
+        with transaction.atomic():
+            new_imagetag: ImageTag = ImageTag.objects.create(
+                image_id=image_id,
+                tag_id=tag_id
+            )
+        created: bool = True
+    except IntegrityError:
+        new_imagetag = ImageTag.objects.get(image_id=image_id, tag_id=tag_id)
+        created = False
+    # only a new ImageTag bumped the revision, as recording it assumes
+    if created:
+        tag_index.record_tagging(
+            UUID(user_id),
+            [UUID(image_id)],
+            add_tag_ids=[UUID(tag_id)]
+        )
+        tag_suggestions.record_usage(UUID(user_id), UUID(tag_id), 1)
     response_data: dict = {"imagetag-id": f"{new_imagetag.id}"}
 
     return HttpResponse(
         status=200,
         content=json.dumps(response_data)
     )
+
+def bulk_imagetag_view(request) -> HttpResponse:
+    """Handles requests to tag or untag many Images at once.
+    Accepts the following methods:
+
+    GET: return required details for a bulk tagging request.
+    POST: apply each of add-tag-ids to, and remove each of remove-tag-ids
+        from, each of image-ids; data may be sent as JSON or as a form
+        (with list items as repeated keys).
+
+    Ownership of all Images and Tags is checked with a single query,
+    and the changes are made in a single transaction: either every
+    ImageTag asked for is added and removed, or none is.
+    """
+
+    # validate method is GET or POST
+    if request.method not in ["GET", "POST"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET or POST method."
+        )
+
+    # validate user auth
+    ...  # auth not yet implemented
+
+    required_data: str = "Requires POST request with data:" \
+        "{" \
+        "  user-id: uuid of resource owner," \
+        "  image-ids: list of uuids of images to tag or untag," \
+        "  add-tag-ids: list of uuids of tags to apply to the images," \
+        "  remove-tag-ids: list of uuids of tags to remove from the images " \
+        "}"
+
+    # respond to GET requests with details required for bulk tagging
+    if request.method == "GET":
+        return HttpResponse(required_data)
+
+    # validate request is properly formed
+    try:
+        if request.content_type == "application/json":
+            request_data: dict = json.loads(request.body)
+        else:
+            request_data = {
+                "user-id": request.POST["user-id"],
+                "image-ids": request.POST.getlist("image-ids"),
+                "add-tag-ids": request.POST.getlist("add-tag-ids"),
+                "remove-tag-ids": request.POST.getlist("remove-tag-ids")
+            }
+        user_id = UUID(str(request_data["user-id"]))
+        image_ids: set = {
+            UUID(str(item)) for item in request_data["image-ids"]
+        }
+        add_tag_ids: set = {
+            UUID(str(item)) for item in request_data.get("add-tag-ids", [])
+        }
+        remove_tag_ids: set = {
+            UUID(str(item)) for item in request_data.get("remove-tag-ids", [])
+        }
+        if add_tag_ids & remove_tag_ids:
+            raise ValueError  # both adding and removing a tag
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return HttpResponse(status=400, content=required_data)
+
+    # validate that requesting user owns specified resources
+    tag_ids: set = add_tag_ids | remove_tag_ids
+    owned: tuple | None = count_owned(user_id, image_ids, tag_ids)
+    if owned is None:
+        return HttpResponse(status=401)
+    if owned != (len(image_ids), len(tag_ids)):
+        return HttpResponse(status=403)
+
+    # if passed all checks, apply all changes together
+    added: int = 0
+    removed: int = 0
+    usage: Counter = Counter()  # ImageTags added less removed, by Tag
+    # deleting ImageTags sends a signal per row, each bumping the
+    # revision; batched, the revision is bumped once for the lot
+    with transaction.atomic(), revisions.batch(
+        tag_owners={tag_id: user_id for tag_id in tag_ids}
+    ):
+        # pairs already tagged are left out of those added, so only new
+        # ones are counted (the unique constraint would otherwise skip
+        # them silently), and are the ones removed
+        existing: set = set()
+        if tag_ids and image_ids:
+            existing = set(ImageTag.objects.filter(
+                image_id__in=image_ids,
+                tag_id__in=tag_ids
+            ).values_list("image_id", "tag_id"))
+        if add_tag_ids and image_ids:
+            new_imagetags: list = [
+                ImageTag(image_id=image_id, tag_id=tag_id)
+                for image_id in image_ids
+                for tag_id in add_tag_ids
+                if (image_id, tag_id) not in existing
+            ]
+            ImageTag.objects.bulk_create(
+                new_imagetags,
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+            added = len(new_imagetags)
+            usage.update(imagetag.tag_id for imagetag in new_imagetags)
+        unwanted: list = [
+            tag_id for _, tag_id in existing if tag_id in remove_tag_ids
+        ]
+        if unwanted:
+            removed, _ = ImageTag.objects.filter(
+                image_id__in=image_ids,
+                tag_id__in=remove_tag_ids
+            ).delete()
+            usage.subtract(unwanted)
+        if added:
+            revisions.bump(user_id)  # bulk_create sends no signals
+
+    if added or removed:
+        tag_index.record_tagging(
+            user_id,
+            image_ids,
+            add_tag_ids=add_tag_ids,
+            remove_tag_ids=remove_tag_ids
+        )
+        tag_suggestions.record_usages(user_id, {
+            tag_id: change for tag_id, change in usage.items() if change
+        })
+    response_data: dict = {"added": added, "removed": removed}
+    return HttpResponse(
+        status=200,
+        content=json.dumps(response_data)
+    )
+
+def metrics_view(request) -> HttpResponse:
+    """Serves the request metrics of this process in the Prometheus text
+    format, for scraping; see api.metrics for what is recorded.
+    """
+
+    # validate method is GET
+    if request.method not in ["GET", "HEAD"]:
+        return HttpResponse(
+            status=405,
+            content="This resource requires GET method."
+        )
+
+    return HttpResponse(
+        metrics.exposition(),
+        content_type=metrics.EXPOSITION_CONTENT_TYPE
+    )
@@ -0,0 +1,21 @@
+'use server';
+
+import axios from 'axios';
+
+import ImagePage from '@/interfaces/ImagePage';
+
+
+/* Runs on the Next.js server, which (unlike the browser)
+ * can reach the backend container by its service name.
+ * Only the opaque cursor is accepted from the client,
+ * so this cannot be used to fetch arbitrary URLs. */
+export default async function fetchImagePage(
+  cursor: string | null = null
+): Promise<ImagePage> {
+
+  axios.defaults.baseURL = 'http://backend:8000';
+  const response = await axios.get('/api/image/', {
+    params: cursor ? {cursor: cursor} : {}
+  });
+  return response.data;
+};
@@ -0,0 +1,54 @@
+'use client';
+
+import { useEffect, useRef, useState } from 'react';
+
+import Thumbnail from './Thumbnail';
+import fetchImagePage from '@/app/_actions/fetchImagePage';
+import Image from '@/interfaces/Image';
+import ImagePage from '@/interfaces/ImagePage';
+import '@/app/_styles/ImageList.css';
+
+
+function cursorFrom(pageUrl: string | null): string | null {
+  return pageUrl ? new URL(pageUrl).searchParams.get('cursor') : null;
+};
+
+export default function ImageGrid({firstPage} : {firstPage: ImagePage}) {
+
+  const [images, setImages] = useState<Image[]>(firstPage.results);
+  const [nextCursor, setNextCursor] = useState(cursorFrom(firstPage.next));
+  const [loading, setLoading] = useState(false);
+  const sentinel = useRef<HTMLDivElement>(null);
+
+  // Fetch the next page whenever the sentinel below the grid scrolls into view
+  useEffect(() => {
+    if (!nextCursor || loading || !sentinel.current) return;
+
+    const observer = new IntersectionObserver(async (entries) => {
+      if (!entries[0].isIntersecting) return;
+      observer.disconnect();
+      setLoading(true);
+      try {
+        const page: ImagePage = await fetchImagePage(nextCursor);
+        setImages((loaded) => [...loaded, ...page.results]);
+        setNextCursor(cursorFrom(page.next));
+      } finally {
+        setLoading(false);
+      };
+    }, {rootMargin: '100%'});
+
+    observer.observe(sentinel.current);
+    return () => observer.disconnect();
+  }, [nextCursor, loading]);
+
+  return (
+    <>
+      <div className='image-grid-container'>
+        {images.map((image) => 
+          <Thumbnail image={image} key={image.id}/>
+        )}
+      </div>
+      <div ref={sentinel}/>
+    </>
+  );
+};
@@ -1,21 +1,15 @@
-import axios from 'axios';
-
-import Thumbnail from './Thumbnail';
-import Image from '@/interfaces/Image';
-import '@/app/_styles/ImageList.css';
+import ImageGrid from './ImageGrid';
+import fetchImagePage from '@/app/_actions/fetchImagePage';
+import ImagePage from '@/interfaces/ImagePage';
 
 
 export default async function ImageList() {
 
-  axios.defaults.baseURL = 'http://backend:8000';
-  const response = await axios.get('/api/image/');
-  const imageList: Image[] = response.data;
+  // Render the first page on the server;
+  // ImageGrid fetches the rest as the user scrolls.
+  const firstPage: ImagePage = await fetchImagePage();
 
   return (
-    <div className='image-grid-container'>
-      {imageList.map((image) => 
-        <Thumbnail image={image} key={image.id}/>
-      )}
-    </div>
+    <ImageGrid firstPage={firstPage}/>
   );  
 };
@@ -1,5 +1,6 @@
 import { default as NextJsImage } from "next/image";
 
+import thumbnailLoader from "@/app/_loaders/thumbnailLoader";
 import Image from "@/interfaces/Image";
 import '@/app/_styles/Thumbnail.css';
 
@@ -25,10 +26,12 @@ export default function Thumbnail({image} : {image: Image}){
         <a href={"http://127.0.0.1:3000/image/" + image.id}>
           <NextJsImage
             className="thumbnail-img"
-            src={image.source}
+            loader={thumbnailLoader}
+            src={`/api/image/${image.id}/thumb`}
             alt=""
-            width={1000}
-            height={1000}
+            width={image.width ?? 1000}
+            height={image.height ?? 1000}
+            sizes="19vw"
           />
         </a>
       </div>
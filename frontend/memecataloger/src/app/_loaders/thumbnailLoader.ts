@@ -0,0 +1,13 @@
+import { ImageLoaderProps } from 'next/image';
+
+
+/* Points next/image at the backend's thumbnail endpoint, which renders
+ * (and caches) a variant at each requested width, rather than having
+ * the Next.js optimizer fetch and resize the full original.
+ * Like the links in Thumbnail, this should use next/headers to get the
+ * host rather than a hard-coded 127.0.0.1; pending E2E testing setup. */
+export default function thumbnailLoader(
+  {src, width} : ImageLoaderProps
+): string {
+  return `http://127.0.0.1:8000${src}?w=${width}&fmt=webp`;
+};
@@ -1,8 +1,17 @@
 import { UUID } from 'crypto';
+import Tag from './Tag';
 
 
 export default interface Image {
   id: UUID,
   source: string,
-  description: string
+  description: string,
+  // File metadata; null until the backend has processed the file
+  width?: number | null,
+  height?: number | null,
+  byte_size?: number | null,
+  mime_type?: string,
+  sha256?: string,
+  // Only listed when requested with ?expand=tags
+  tags?: Tag[]
 };
@@ -0,0 +1,8 @@
+import Image from './Image';
+
+
+export default interface ImagePage {
+  next: string | null,
+  previous: string | null,
+  results: Image[]
+};